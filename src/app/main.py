@@ -1,51 +1,361 @@
-from fastapi import FastAPI, UploadFile
+from fastapi import FastAPI, Request, UploadFile
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from torchvision import transforms
-from PIL import Image
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List
+from zipfile import ZipFile
+import json
+import threading
+import time
 import torch
 from src.components.models_architecture import InceptBaseModel
+from src.components.image_io import IMAGE_EXTENSIONS, INPUT_SIZE, open_image, serving_transform
+from src.components.inference_engine import BatchingConfig, BatchingEngine, EngineClosedError
+from src.components.metrics import MetricsConfig, MetricsRegistry
+from src.components.model_quantization import QuantizationConfig
+from src.components.model_registry import ModelRegistry, RegistryConfig
+from src.components.prediction_cache import PredictionCache, PredictionCacheConfig
+from src.components.tiled_inference import TiledInference
+from src.logger import logging
 from src.utils import get_latest_best_model
 import os 
 from fastapi import HTTPException, status
 
 app = FastAPI()
+tiler = TiledInference()
+cache_config = PredictionCacheConfig()
+prediction_cache = PredictionCache(cache_config.MAX_ENTRIES, cache_config.MAX_BYTES)
+metrics = MetricsRegistry(enabled=MetricsConfig().ENABLED)
+request_counter = metrics.counter("http_requests_total", "HTTP requests served.", ["method", "path", "status"])
+request_histogram = metrics.histogram("http_request_duration_seconds", "Time to the start of the HTTP response.", ["path"])
+decode_histogram = metrics.histogram("predict_decode_seconds", "Time to decode an uploaded image.")
+preprocess_histogram = metrics.histogram("predict_preprocess_seconds", "Time to resize an image and convert it to a tensor.")
+metrics.gauge("prediction_cache_entries", "Predictions in the cache.", lambda: prediction_cache.stats()["entries"])
+metrics.gauge("prediction_cache_hits", "Prediction cache hits since start-up.", lambda: prediction_cache.hits)
+metrics.gauge("prediction_cache_misses", "Prediction cache misses since start-up.", lambda: prediction_cache.misses)
+swap_counter = metrics.counter("model_swaps_total", "Hot model swaps attempted.", ["result"])
+swap_status = {"swaps": 0, "last_error": None}
+stop_watching = threading.Event()
+
+# Artifact directory of every MODEL_FORMAT, relative to the project root
+MODEL_DIRS = {"float": "artifacts/model", "int8": "artifacts/model_int8", "torchscript": "artifacts/model_torchscript"}
+WARMUP_RUNS = 2
+# Model, device and path loaded before the worker process started, see use_preloaded_model
+preloaded_model = None
+
+@dataclass
+class ActiveModel:
+    """The model serving predictions. A hot swap replaces the whole object, so requests never see a mix of two models."""
+    version: str
+    model_path: str
+    device: torch.device
+    engine: BatchingEngine
+    loaded_at: str
+
+
+def get_model_dir(model_format):
+    parent_dir = os.path.abspath(os.path.join(os.getcwd(), os.pardir))
+    grandparent_dir = os.path.abspath(os.path.join(parent_dir, os.pardir))
+    return os.path.join(grandparent_dir, MODEL_DIRS[model_format])
+
+def load_artifact(model_format, model_path, device=None):
+    """Load a model artifact in eval mode.
+
+    Args:
+        model_format (str): 'float', 'int8', 'torchscript' or 'random'.
+        model_path (str): Path of the artifact, None for 'random'.
+        device (torch.device, optional): Device of the float and random models, defaults to CUDA when available.
+            The int8 and TorchScript models always run on CPU.
+
+    Returns:
+        tuple: The model and the device it runs on.
+    """
+    # MODEL_FORMAT=int8 serves the artifact written by src/pipelines/quantize_pipeline.py
+    if model_format == "int8":
+        # Quantized kernels only run on CPU
+        device = torch.device("cpu")
+        torch.backends.quantized.engine = QuantizationConfig().BACKEND
+        model = torch.jit.load(model_path, map_location=device)
+    # MODEL_FORMAT=torchscript serves the frozen artifact written by src/pipelines/export_pipeline.py
+    elif model_format == "torchscript":
+        device = torch.device("cpu")
+        model = torch.jit.optimize_for_inference(torch.jit.load(model_path, map_location=device))
+    # MODEL_FORMAT=random serves an untrained model, for load tests without a checkpoint or network access
+    elif model_format == "random":
+        model = InceptBaseModel(pretrained=False)
+        device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        model.to(device)
+    else:
+        # The checkpoint holds the whole model, so the pretrained ImageNet weights are not fetched
+        device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        model = InceptBaseModel.from_state_dict(torch.load(model_path, map_location=device)).to(device)
+    return model.eval(), device
+
+def use_preloaded_model(model, device, model_path):
+    """Serve an already loaded model instead of loading one at start-up.
+
+    Set by `src/app/serve.py` in every worker it forks, so the workers share the weights loaded by the launcher.
+    """
+    global preloaded_model
+    preloaded_model = (model, device, model_path)
+
+def start_model(model_format, model_path, loaded=None):
+    """Load a model, warm it up and start its batching engine.
+
+    Args:
+        model_format (str): Format of the artifact.
+        model_path (str): Path of the artifact, None for 'random'.
+        loaded (tuple, optional): The model and its device when already loaded, e.g. by the prefork launcher.
+    """
+    model, device = loaded or load_artifact(model_format, model_path)
+    # The first forward passes allocate buffers and run the TorchScript profiling executor; do them before serving
+    with torch.no_grad():
+        for _ in range(WARMUP_RUNS):
+            model(torch.zeros(1, 3, *INPUT_SIZE, device=device))
+    # Identifies the loaded model in prediction cache keys; a new checkpoint invalidates cached predictions
+    if model_path is None:
+        version = "{}/{}".format(model_format, os.getpid())
+    else:
+        version = "{}/{}@{}".format(model_format, os.path.basename(model_path), int(os.path.getmtime(model_path)))
+    batching_config = BatchingConfig()
+    engine = BatchingEngine(model, device, batching_config.MAX_BATCH_SIZE, batching_config.MAX_WAIT_MS, metrics)
+    return ActiveModel(version, model_path, device, engine, datetime.now().isoformat(timespec="seconds"))
+
+def swap_model(model_path):
+    """Serve the model at `model_path`, replacing the active one without dropping requests.
+
+    The new model is loaded and warmed up while the active one keeps serving. Requests that already hold the old
+    model finish on it: its engine scores every image queued before it is closed, and images submitted after are
+    retried on the new model (see `score_with_active_model`).
+    """
+    global active_model
+    logging.info(f"Loading model '{model_path}'")
+    new_model = start_model(model_format, model_path)
+    old_model, active_model = active_model, new_model
+    prediction_cache.set_model_version(new_model.version)
+    old_model.engine.close()
+    logging.info(f"Swapped model '{old_model.version}' for '{new_model.version}'")
+
+def watch_registry(model_dir, poll_seconds):
+    """Poll the model registry and swap in the promoted model whenever it changes."""
+    registry = ModelRegistry(model_dir)
+    fingerprint = registry.fingerprint()
+    while not stop_watching.wait(poll_seconds):
+        current_fingerprint = registry.fingerprint()
+        if current_fingerprint == fingerprint:
+            continue
+        fingerprint = current_fingerprint
+        try:
+            model_path = get_latest_best_model(model_dir)
+            if model_path is not None and model_path != active_model.model_path:
+                swap_model(model_path)
+                swap_status["swaps"] += 1
+                swap_status["last_error"] = None
+                swap_counter.inc(result="success")
+        except Exception as e:
+            # The active model keeps serving; the registry is checked again on its next change
+            logging.exception("Model swap failed")
+            swap_status["last_error"] = str(e)
+            swap_counter.inc(result="error")
+
+def score_with_active_model(score):
+    """Run `score` on the active model, retrying on its replacement if it is swapped out meanwhile.
+
+    Args:
+        score (callable): Takes the `ActiveModel` and returns the scores.
+
+    Returns:
+        tuple: The `ActiveModel` that scored and the scores.
+    """
+    while True:
+        current = active_model
+        try:
+            return current, score(current)
+        except EngineClosedError:
+            # Closed between reading the active model and queueing; the new model is already active
+            continue
 
 @app.on_event("startup")
 def load_model():
-    global model
-    global device
+    global active_model
+    global model_format
     global preprocess
-    parent_dir = os.path.abspath(os.path.join(os.getcwd(), os.pardir))
-    grandparent_dir = os.path.abspath(os.path.join(parent_dir, os.pardir))
-    model_path = get_latest_best_model(os.path.join(grandparent_dir,"artifacts/model"))
-    model = InceptBaseModel()
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model.to(device)
-    state_dict = torch.load(model_path)
-    model.load_state_dict(state_dict)
-    model.eval()
+    global bulk_batch_size
+    global watcher
+    model_format = os.environ.get("MODEL_FORMAT", "float")
+    if preloaded_model is not None:
+        model, device, model_path = preloaded_model
+        active_model = start_model(model_format, model_path, (model, device))
+    else:
+        model_path = None if model_format == "random" else get_latest_best_model(get_model_dir(model_format))
+        active_model = start_model(model_format, model_path)
+    prediction_cache.set_model_version(active_model.version)
+    bulk_batch_size = BatchingConfig().BULK_BATCH_SIZE
+    # Swap in models promoted in the registry while serving; under the prefork launcher, the launcher swaps them
+    # by replacing its workers, so they keep sharing one copy of the weights
+    poll_seconds = RegistryConfig().POLL_SECONDS
+    watcher = None
+    if preloaded_model is None and model_format != "random" and poll_seconds > 0:
+        watcher = threading.Thread(target=watch_registry, args=(get_model_dir(model_format), poll_seconds),
+                                   name="registry-watcher", daemon=True)
+        watcher.start()
 
     # Define image preprocessing
-    preprocess = transforms.Compose([
-        transforms.Resize((229, 229)),
-        transforms.ToTensor(),
-    ])
+    preprocess = serving_transform(INPUT_SIZE)
+
+@app.on_event("shutdown")
+def stop_engine():
+    stop_watching.set()
+    if watcher is not None:
+        watcher.join()
+    active_model.engine.close()
+
+@app.middleware("http")
+async def count_requests(request: Request, call_next):
+    if not metrics.enabled:
+        return await call_next(request)
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Unknown paths share one label, so scanners cannot grow the label set
+    route = request.scope.get("route")
+    path = route.path if route is not None else "other"
+    request_histogram.observe(time.perf_counter() - start, path=path)
+    request_counter.inc(method=request.method, path=path, status=response.status_code)
+    return response
 
 @app.get("/")
 def root():
     return {"message": "Fraud Document detection. Go to http://127.0.0.1:8000/docs for API documentation and testing"}
 
+allowed_content_types = ["image/jpeg", "image/png", "image/jpg"]
+zip_content_types = ["application/zip", "application/x-zip-compressed"]
+image_extensions = IMAGE_EXTENSIONS
+
 @app.post("/predict")
 def predict(file: UploadFile):
-    allowed_content_types = ["image/jpeg", "image/png", "image/jpg"]
     if file.content_type not in allowed_content_types:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Only image uploads are allowed (JPEG, PNG).",
         )
-    image = Image.open(file.file).convert("RGB")
-    image = preprocess(image).unsqueeze(0).to(device)
-    
-    with torch.no_grad():
-        output = model(image)
-    
-    return {"Prediction": output.item()}
\ No newline at end of file
+    content = file.file.read()
+    version = active_model.version
+    cache_key = prediction_cache.make_key(content, version)
+    output = prediction_cache.get(cache_key)
+    if output is not None:
+        return {"Prediction": output}
+
+    with decode_histogram.time():
+        image = open_image(content, INPUT_SIZE)
+    with preprocess_histogram.time():
+        image = preprocess(image)
+
+    # Concurrent requests are scored together in one forward pass
+    current, output = score_with_active_model(lambda current: current.engine.predict(image))
+    if current.version != version:
+        cache_key = prediction_cache.make_key(content, current.version)
+    prediction_cache.put(cache_key, output)
+
+    return {"Prediction": output}
+
+@app.post("/predict/tiled")
+def predict_tiled(file: UploadFile):
+    """Score a full-resolution scan patch by patch, returning the document score and a coarse heatmap."""
+    if file.content_type not in allowed_content_types:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only image uploads are allowed (JPEG, PNG).",
+        )
+    with decode_histogram.time():
+        image = open_image(file.file)
+    with preprocess_histogram.time():
+        image = transforms.functional.to_tensor(image)
+
+    # The patches are queued together, so they fill whole batches; a model swap restarts the document on the new model
+    _, result = score_with_active_model(
+        lambda current: tiler.predict(image, lambda patches: current.engine.predict_many(list(patches))))
+    return {"Prediction": result.pop("score"), **result}
+
+@app.get("/admin/cache")
+def cache_stats():
+    """Report the prediction cache counters."""
+    return prediction_cache.stats()
+
+@app.get("/admin/model")
+def model_info():
+    """Report the model serving predictions and its registry entry."""
+    current = active_model
+    entry = None
+    if current.model_path is not None:
+        entry = ModelRegistry(os.path.dirname(current.model_path)).get(os.path.basename(current.model_path))
+    return {
+        "model_version": current.version,
+        "model_format": model_format,
+        "model_path": current.model_path,
+        "loaded_at": current.loaded_at,
+        "registry": entry,
+        "swaps": swap_status["swaps"],
+        "last_swap_error": swap_status["last_error"],
+    }
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Expose the service metrics in the Prometheus text format."""
+    if not metrics.enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are disabled.")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def iter_documents(files):
+    """Yield the name and a readable file object of every uploaded document.
+
+    Zip archives are expanded into their image members, read lazily one at a time.
+    """
+    for file in files:
+        if file.content_type in zip_content_types or file.filename.lower().endswith(".zip"):
+            with ZipFile(file.file) as archive:
+                for member in archive.infolist():
+                    if not member.is_dir() and member.filename.lower().endswith(image_extensions):
+                        with archive.open(member) as member_file:
+                            yield member.filename, member_file
+        elif file.content_type in allowed_content_types:
+            yield file.filename, file.file
+        else:
+            yield file.filename, None
+
+def score_documents(documents):
+    """Preprocess and score documents in batches, yielding one NDJSON line per document."""
+    pending_names, pending_images, lines = [], [], []
+
+    def flush():
+        scores = score_with_active_model(lambda current: current.engine.predict_many(pending_images))[1] if pending_images else []
+        for name, score in zip(pending_names, scores):
+            lines.append(json.dumps({"filename": name, "Prediction": score}) + "\n")
+        pending_names.clear()
+        pending_images.clear()
+
+    for name, document in documents:
+        if document is None:
+            lines.append(json.dumps({"filename": name, "error": "Only image uploads are allowed (JPEG, PNG, ZIP)."}) + "\n")
+        else:
+            try:
+                with decode_histogram.time():
+                    image = open_image(document, INPUT_SIZE)
+                with preprocess_histogram.time():
+                    pending_images.append(preprocess(image))
+                pending_names.append(name)
+            except Exception as e:
+                lines.append(json.dumps({"filename": name, "error": str(e)}) + "\n")
+        if len(pending_images) >= bulk_batch_size:
+            flush()
+        if lines:
+            yield "".join(lines)
+            lines.clear()
+    flush()
+    if lines:
+        yield "".join(lines)
+
+@app.post("/predict/batch")
+def predict_batch(files: List[UploadFile]):
+    """Score many images, or zip archives of images, and stream one JSON line per document as each batch finishes."""
+    return StreamingResponse(score_documents(iter_documents(files)), media_type="application/x-ndjson")
@@ -0,0 +1,316 @@
+from dataclasses import dataclass
+import argparse
+import os
+import select
+import signal
+import socket
+import sys
+import time
+import torch
+import uvicorn
+from src.app import main
+from src.components.model_registry import ModelRegistry, RegistryConfig
+from src.logger import logging
+from src.exception import CustomException
+from src.utils import get_latest_best_model
+
+@dataclass
+class ServingConfig:
+    """Configuration class for the prefork serving launcher.
+
+    `WORKERS` and `THREADS_PER_WORKER` can be overridden with the `SERVE_WORKERS` and `SERVE_THREADS_PER_WORKER`
+    environment variables.
+
+    Attributes:
+        HOST (str): Interface the service listens on.
+        PORT (int): Port the service listens on.
+        WORKERS (int): Number of worker processes.
+        THREADS_PER_WORKER (int): Intra-op threads of every worker. 0 divides the available cores between the workers.
+        PIN_CPUS (bool): Pin every worker to its own cores (Linux only).
+        READY_TIMEOUT (float): Maximum time, in seconds, a worker takes to load and warm up its model.
+        SHUTDOWN_TIMEOUT (float): Maximum time, in seconds, a worker takes to finish its requests when stopped.
+
+    Example:
+        >>> config = ServingConfig(WORKERS=4)
+    """
+
+    HOST: str = "127.0.0.1"
+    PORT: int = 8000
+    WORKERS: int = int(os.environ.get("SERVE_WORKERS", 2))
+    THREADS_PER_WORKER: int = int(os.environ.get("SERVE_THREADS_PER_WORKER", 0))
+    PIN_CPUS: bool = True
+    READY_TIMEOUT: float = 300
+    SHUTDOWN_TIMEOUT: float = 30
+
+
+def available_cpus():
+    """Cores this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_cpus(workers, threads_per_worker=0):
+    """Split the available cores between workers.
+
+    Args:
+        workers (int): Number of workers.
+        threads_per_worker (int, optional): Threads of every worker; 0 gives every worker an equal share of the cores.
+
+    Returns:
+        tuple: Threads per worker and the cores of every worker. Cores are shared round-robin when there are
+            more threads than cores.
+    """
+    cpus = available_cpus()
+    threads = threads_per_worker or max(1, len(cpus) // workers)
+    if workers * threads > len(cpus):
+        logging.warning(f"{workers} workers x {threads} threads oversubscribe the {len(cpus)} available cores")
+    return threads, [[cpus[(worker * threads + i) % len(cpus)] for i in range(threads)] for worker in range(workers)]
+
+
+class _WorkerServer(uvicorn.Server):
+    """uvicorn server telling the launcher once its start-up, model loading included, has completed."""
+
+    def __init__(self, config, ready_fd):
+        super().__init__(config)
+        self.ready_fd = ready_fd
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets=sockets)
+        if not self.should_exit:
+            os.write(self.ready_fd, b"1")
+        os.close(self.ready_fd)
+
+
+class PreforkServer:
+    """Serves `src/app/main.py` from worker processes sharing one copy of the model weights.
+
+    The launcher loads the model once, on CPU, moves its tensors to shared memory and binds the listening
+    socket. It then forks the workers: each maps the same weights instead of loading its own copy, is pinned to
+    its own cores and runs its intra-op threads within its budget, and accepts connections on the shared socket.
+    Workers that die are replaced.
+
+    When the model registry promotes another model, the launcher loads it and forks a new set of workers; the
+    old workers are stopped once every new worker has warmed up, finishing the requests they hold. Workers do
+    not watch the registry themselves.
+
+    The launcher must not run any model computation before forking: the workers' thread pools and memory are
+    inherited from it.
+
+    Args:
+        config (ServingConfig): Launcher settings.
+        model_format (str): 'float', 'int8', 'torchscript' or 'random' (see `src/app/main.py`).
+        model_dir (str, optional): Directory of the model artifacts and registry; not used for 'random'.
+
+    Example:
+        >>> server = PreforkServer(ServingConfig(WORKERS=4), 'float', 'artifacts/model')
+        >>> server.serve_forever()
+    """
+    def __init__(self, config, model_format, model_dir=None):
+        self.config = config
+        self.model_format = model_format
+        self.model_dir = model_dir
+        self.threads, self.worker_cpus = plan_cpus(config.WORKERS, config.THREADS_PER_WORKER)
+        # pid -> (generation, slot)
+        self.workers = {}
+        self.generation = 0
+        self.models = {}
+        self.stopping = False
+        self.socket = None
+
+    def load(self, model_path):
+        """Load a model on CPU with its tensors in shared memory.
+
+        Returns:
+            tuple: The model, its device and its path.
+        """
+        model, device = main.load_artifact(self.model_format, model_path, torch.device("cpu"))
+        try:
+            model.share_memory()
+        except Exception as e:
+            # Tensors that cannot move to shared memory stay shared copy-on-write by the fork
+            logging.warning(f"Model tensors not moved to shared memory: {e}")
+        logging.info(f"Loaded model '{model_path}' for {self.config.WORKERS} workers")
+        return model, device, model_path
+
+    def __current_model_path(self):
+        if self.model_format == "random":
+            return None
+        return get_latest_best_model(self.model_dir)
+
+    def __run_worker(self, slot, model, ready_fd):
+        if self.config.PIN_CPUS and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, self.worker_cpus[slot])
+        # Read by the OpenMP and MKL runtimes of libraries loaded later; torch's pool is sized explicitly
+        os.environ["OMP_NUM_THREADS"] = os.environ["MKL_NUM_THREADS"] = str(self.threads)
+        torch.set_num_threads(self.threads)
+        main.use_preloaded_model(*model)
+        server = _WorkerServer(uvicorn.Config(main.app, log_level="warning",
+                                              timeout_graceful_shutdown=self.config.SHUTDOWN_TIMEOUT), ready_fd)
+        server.run(sockets=[self.socket])
+
+    def __fork_worker(self, slot, generation):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                os.close(read_fd)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                self.__run_worker(slot, self.models[generation], write_fd)
+            except BaseException:
+                logging.exception(f"Worker {slot} failed")
+                code = 1
+            finally:
+                os._exit(code)
+        os.close(write_fd)
+        self.workers[pid] = (generation, slot)
+        logging.info(f"Started worker {slot} (pid {pid}) on cores {self.worker_cpus[slot]} with {self.threads} threads")
+        return pid, read_fd
+
+    def __start_generation(self, model):
+        """Fork a full set of workers serving `model` and wait until they are ready.
+
+        Returns:
+            bool: Whether every worker started.
+        """
+        self.generation += 1
+        self.models[self.generation] = model
+        ready_fds = [self.__fork_worker(slot, self.generation)[1] for slot in range(self.config.WORKERS)]
+        deadline = time.monotonic() + self.config.READY_TIMEOUT
+        pending, ok = list(ready_fds), True
+        while pending and time.monotonic() < deadline:
+            readable, _, _ = select.select(pending, [], [], 1)
+            for fd in readable:
+                # An empty read means the worker exited before it was ready
+                ok = ok and os.read(fd, 1) == b"1"
+                os.close(fd)
+                pending.remove(fd)
+        for fd in pending:
+            os.close(fd)
+        return ok and not pending
+
+    def __stop_workers(self, generations):
+        pids = [pid for pid, (generation, _) in self.workers.items() if generation in generations]
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.config.SHUTDOWN_TIMEOUT + 5
+        while pids and time.monotonic() < deadline:
+            for pid in list(pids):
+                if os.waitpid(pid, os.WNOHANG)[0] == pid:
+                    pids.remove(pid)
+                    self.workers.pop(pid, None)
+            time.sleep(0.1)
+        for pid in pids:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            self.workers.pop(pid, None)
+        for generation in generations:
+            self.models.pop(generation, None)
+
+    def __reap(self):
+        """Replace the workers of the current generation that exited."""
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            generation, slot = self.workers.pop(pid, (None, None))
+            if generation == self.generation and not self.stopping:
+                logging.error(f"Worker {slot} (pid {pid}) exited with status {status}, restarting it")
+                self.__fork_worker(slot, generation)
+
+    def __swap(self, model_path):
+        logging.info(f"Swapping to model '{model_path}'")
+        old_generation = self.generation
+        if self.__start_generation(self.load(model_path)):
+            self.__stop_workers([old_generation])
+            logging.info(f"Now serving '{model_path}'")
+            return
+        logging.error(f"Workers for '{model_path}' failed to start, keeping '{self.models[old_generation][2]}'")
+        self.__stop_workers([self.generation])
+        self.generation = old_generation
+
+    def __handle_signal(self, signum, frame):
+        self.stopping = True
+
+    def serve_forever(self):
+        """Start the workers and supervise them until SIGTERM or SIGINT.
+
+        Raises:
+            CustomException: If the model cannot be loaded or the first workers fail to start.
+        """
+        try:
+            # No intra-op pool in the launcher: forked workers must not inherit a running OpenMP thread pool
+            torch.set_num_threads(1)
+            os.environ["MODEL_FORMAT"] = self.model_format
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.socket.bind((self.config.HOST, self.config.PORT))
+            self.socket.listen(2048)
+            self.socket.set_inheritable(True)
+            signal.signal(signal.SIGTERM, self.__handle_signal)
+            signal.signal(signal.SIGINT, self.__handle_signal)
+
+            model_path = self.__current_model_path()
+            registry = ModelRegistry(self.model_dir) if self.model_dir else None
+            fingerprint = registry.fingerprint() if registry else None
+            if not self.__start_generation(self.load(model_path)):
+                raise RuntimeError("Workers failed to start")
+            logging.info(f"Serving on http://{self.config.HOST}:{self.config.PORT} with {self.config.WORKERS} workers")
+        except Exception as e:
+            self.__stop_workers(list(self.models))
+            error_message = str(e)
+            raise CustomException(error_message, sys)
+
+        poll_seconds = RegistryConfig().POLL_SECONDS
+        next_poll = time.monotonic() + poll_seconds
+        try:
+            while not self.stopping:
+                time.sleep(0.2)
+                self.__reap()
+                if registry is None or self.model_format == "random" or poll_seconds <= 0 or time.monotonic() < next_poll:
+                    continue
+                next_poll = time.monotonic() + poll_seconds
+                current_fingerprint = registry.fingerprint()
+                if current_fingerprint == fingerprint:
+                    continue
+                fingerprint = current_fingerprint
+                try:
+                    model_path = self.__current_model_path()
+                    if model_path is not None and model_path != self.models[self.generation][2]:
+                        self.__swap(model_path)
+                except Exception:
+                    # The current workers keep serving; the registry is checked again on its next change
+                    logging.exception("Model swap failed")
+        finally:
+            logging.info("Stopping the workers")
+            self.stopping = True
+            self.__stop_workers(list(self.models))
+            self.socket.close()
+
+
+if __name__ == "__main__":
+    default = ServingConfig()
+    parser = argparse.ArgumentParser(description="Serve the API from several worker processes that share one copy of "
+                                                 "the model weights, each with its own cores and thread budget.")
+    parser.add_argument("--host", default=default.HOST)
+    parser.add_argument("--port", type=int, default=default.PORT)
+    parser.add_argument("--workers", type=int, default=default.WORKERS, help="Worker processes.")
+    parser.add_argument("--threads-per-worker", type=int, default=default.THREADS_PER_WORKER,
+                        help="Intra-op threads per worker; 0 splits the available cores between the workers.")
+    parser.add_argument("--no-pin", action="store_true", help="Do not pin the workers to cores.")
+    parser.add_argument("--format", default=os.environ.get("MODEL_FORMAT", "float"), choices=["float", "int8", "torchscript", "random"],
+                        help="Model artifact to serve.")
+    parser.add_argument("--model-dir", default=None, help="Directory of the model artifacts, defaults to the one of the format.")
+    args = parser.parse_args()
+
+    config = ServingConfig(HOST=args.host, PORT=args.port, WORKERS=args.workers, THREADS_PER_WORKER=args.threads_per_worker,
+                           PIN_CPUS=not args.no_pin)
+    model_dir = None
+    if args.format != "random":
+        model_dir = args.model_dir or os.path.join(os.getcwd(), main.MODEL_DIRS[args.format])
+    PreforkServer(config, args.format, model_dir).serve_forever()
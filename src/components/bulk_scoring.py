@@ -0,0 +1,294 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from zipfile import ZipFile
+import csv
+import json
+import os
+import sys
+import time
+import torch
+from src.components.image_io import IMAGE_EXTENSIONS, INPUT_SIZE, open_image, serving_transform
+from src.logger import logging
+from src.exception import CustomException
+
+@dataclass
+class BulkScoringConfig:
+    """Configuration class for offline bulk scoring.
+
+    `BATCH_SIZE` and `DECODE_WORKERS` can be overridden with the `BULK_SCORING_BATCH_SIZE` and
+    `BULK_SCORING_DECODE_WORKERS` environment variables.
+
+    Attributes:
+        BATCH_SIZE (int): Documents per forward pass.
+        DECODE_WORKERS (int): Threads decoding and preprocessing documents ahead of the model.
+        PREFETCH_BATCHES (int): Batches decoded ahead of the model. With the batch size it bounds the number of
+            documents in memory, whatever the size of the corpus.
+        CHECKPOINT_EVERY (int): Batches between progress checkpoints. Results are flushed to disk at every checkpoint.
+        LOG_EVERY (int): Batches between throughput reports.
+
+    Example:
+        >>> config = BulkScoringConfig(BATCH_SIZE=128)
+    """
+
+    BATCH_SIZE: int = int(os.environ.get("BULK_SCORING_BATCH_SIZE", 64))
+    DECODE_WORKERS: int = int(os.environ.get("BULK_SCORING_DECODE_WORKERS", os.cpu_count() or 1))
+    PREFETCH_BATCHES: int = 2
+    CHECKPOINT_EVERY: int = 20
+    LOG_EVERY: int = 10
+
+
+def iter_documents(source, skip=0):
+    """Yield the name and contents of every image of a directory or zip archive, in a stable order.
+
+    Directories are walked recursively with sorted entries; archives are read in the order of their members.
+    The order is what lets an interrupted run skip the documents it already scored.
+
+    Args:
+        source (str): Directory or zip archive.
+        skip (int, optional): Number of leading documents to skip, without reading them.
+
+    Yields:
+        tuple: Name of the document (relative path or member name) and its path or, for archive members, bytes.
+    """
+    index = 0
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for file in sorted(files):
+                if file.lower().endswith(IMAGE_EXTENSIONS):
+                    index += 1
+                    if index > skip:
+                        path = os.path.join(root, file)
+                        yield os.path.relpath(path, source), path
+    else:
+        with ZipFile(source) as archive:
+            for member in archive.infolist():
+                if not member.is_dir() and member.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    index += 1
+                    # Members are read here, sequentially; the archive closes once the last one is yielded
+                    if index > skip:
+                        yield member.filename, archive.read(member)
+
+
+class CsvResultWriter:
+    """Appends results to a CSV file that can be cut back to its last checkpoint.
+
+    Args:
+        path (str): Output CSV file.
+        offset (int, optional): Size of the file at the checkpoint being resumed; rows after it are dropped.
+    """
+    def __init__(self, path, offset=None):
+        self.path = path
+        exists = offset is not None and os.path.exists(path)
+        self.file = open(path, "r+" if exists else "w", newline="")
+        if exists:
+            self.file.truncate(offset)
+            self.file.seek(offset)
+        self.writer = csv.writer(self.file)
+        if not exists:
+            self.writer.writerow(["filename", "score", "error"])
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def flush(self):
+        """Make the rows written so far durable and return the file position to resume from."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetResultWriter:
+    """Writes results as a directory of Parquet part files, one per checkpoint.
+
+    Needs `pyarrow`, imported only when Parquet output is requested.
+
+    Args:
+        path (str): Output directory.
+        offset (int, optional): Number of parts written at the checkpoint being resumed; later parts are dropped.
+    """
+    def __init__(self, path, offset=None):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("Parquet output needs pyarrow (pip install pyarrow); write a .csv file instead") from e
+        self.pa, self.pq = pyarrow, pyarrow.parquet
+        self.path = path
+        self.part = offset or 0
+        os.makedirs(path, exist_ok=True)
+        for file in os.listdir(path):
+            if file.startswith("part-") and int(file[5:10]) >= self.part:
+                os.remove(os.path.join(path, file))
+        self.rows = []
+
+    def write(self, rows):
+        self.rows.extend(rows)
+
+    def flush(self):
+        """Write the rows since the last flush as a new part and return the number of parts."""
+        if self.rows:
+            names, scores, errors = zip(*self.rows)
+            table = self.pa.table({"filename": list(names), "score": list(scores), "error": list(errors)},
+                                  schema=self.pa.schema([("filename", self.pa.string()), ("score", self.pa.float32()),
+                                                         ("error", self.pa.string())]))
+            part_file = os.path.join(self.path, "part-{:05d}.parquet".format(self.part))
+            tmp_file = os.path.join(self.path, ".part-{:05d}.parquet.tmp".format(self.part))
+            self.pq.write_table(table, tmp_file)
+            os.replace(tmp_file, part_file)
+            self.part += 1
+            self.rows = []
+        return self.part
+
+    def close(self):
+        pass
+
+
+class BulkScorer:
+    """Scores a directory or zip archive of documents offline, with bounded memory, resuming interrupted runs.
+
+    Documents are read in a stable order and decoded and preprocessed exactly like the app's `/predict`
+    (`open_image` and `serving_transform`) by a pool of threads, at most `PREFETCH_BATCHES` batches ahead of
+    the model. Decoding happens in C with the GIL released, so the threads decode in parallel while the model
+    runs on the main thread. Results are written in document order, to a CSV file or a directory of Parquet parts.
+
+    Every `CHECKPOINT_EVERY` batches the results are flushed to disk, then the number of scored documents and the
+    output position are saved atomically to a progress file. A rerun skips the scored documents and drops any
+    results written after the last checkpoint, so every document appears exactly once.
+
+    Args:
+        model (torch.nn.Module): Model in eval mode returning one score per image.
+        device (torch.device): Device the model runs on.
+        model_version (str): Identifies the model in the progress file; a run is only resumed with the same model.
+        config (BulkScoringConfig, optional): Scoring settings.
+
+    Example:
+        >>> scorer = BulkScorer(model, torch.device('cpu'), 'model_20230601_120000_3')
+        >>> scorer.score('archive.zip', 'scores.csv')
+    """
+    def __init__(self, model, device, model_version, config=None):
+        self.model = model
+        self.device = device
+        self.model_version = model_version
+        self.config = config or BulkScoringConfig()
+        self.transform = serving_transform(INPUT_SIZE)
+
+    def __preprocess(self, document):
+        try:
+            return self.transform(open_image(document, INPUT_SIZE)), None
+        except Exception as e:
+            return None, str(e)
+
+    def __load_progress(self, progress_file, source, output, restart):
+        if restart or not os.path.exists(progress_file):
+            return None
+        with open(progress_file) as f:
+            progress = json.load(f)
+        if (progress["source"], progress["output"]) != (os.path.abspath(source), os.path.abspath(output)):
+            raise ValueError(f"Progress file '{progress_file}' belongs to another run; pass restart=True (--restart) to start over")
+        if progress["model_version"] != self.model_version:
+            raise ValueError(f"'{output}' was scored with model '{progress['model_version']}', not "
+                             f"'{self.model_version}'; pass restart=True (--restart) to start over")
+        return progress
+
+    def __save_progress(self, progress_file, progress):
+        tmp_file = os.path.join(os.path.dirname(progress_file), "." + os.path.basename(progress_file) + ".tmp")
+        with open(tmp_file, "w") as f:
+            json.dump(progress, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, progress_file)
+
+    def __score_batch(self, images):
+        with torch.inference_mode():
+            return self.model(torch.stack(images).to(self.device)).view(-1).float().cpu().tolist()
+
+    def score(self, source, output, progress_file=None, restart=False):
+        """Score every document of `source`, appending the results to `output`.
+
+        Args:
+            source (str): Directory or zip archive of JPEG/PNG documents.
+            output (str): Output CSV file, or directory of Parquet parts when it ends with '.parquet'.
+            progress_file (str, optional): Progress checkpoint, `<output>.progress.json` by default.
+            restart (bool, optional): Ignore the progress of an earlier run and score everything again.
+
+        Returns:
+            dict: Documents scored by this run, failed documents, total documents scored, elapsed seconds and
+                documents per second.
+
+        Raises:
+            CustomException: If the source cannot be read, the output cannot be written or the progress file
+                belongs to another source, output or model.
+        """
+        try:
+            output = output.rstrip(os.sep)
+            progress_file = progress_file or output + ".progress.json"
+            progress = self.__load_progress(progress_file, source, output, restart)
+            done = progress["documents"] if progress else 0
+            writer_class = ParquetResultWriter if output.endswith(".parquet") else CsvResultWriter
+            writer = writer_class(output, progress["offset"] if progress else None)
+            if done:
+                logging.info(f"Resuming after {done} scored documents")
+            progress = {"source": os.path.abspath(source), "output": os.path.abspath(output),
+                        "model_version": self.model_version, "documents": done, "offset": writer.flush()}
+            self.__save_progress(progress_file, progress)
+
+            batch_size = self.config.BATCH_SIZE
+            # Name and decode error (None when decoded) of the documents of the current batch, and their images
+            pending, images = [], []
+            scored, failed, batches = 0, 0, 0
+            start = last_log = time.perf_counter()
+            last_logged = 0
+
+            def run_batch():
+                nonlocal scored, failed, batches, last_log, last_logged
+                scores = iter(self.__score_batch(images) if images else [])
+                writer.write([(name, next(scores), None) if error is None else (name, None, error) for name, error in pending])
+                scored += len(pending)
+                failed += len(pending) - len(images)
+                batches += 1
+                pending.clear()
+                images.clear()
+                if batches % self.config.CHECKPOINT_EVERY == 0:
+                    progress.update(documents=done + scored, offset=writer.flush())
+                    self.__save_progress(progress_file, progress)
+                if batches % self.config.LOG_EVERY == 0:
+                    now = time.perf_counter()
+                    logging.info(f"{done + scored} documents scored, {(scored - last_logged) / (now - last_log):.1f} documents/sec")
+                    last_log, last_logged = now, scored
+
+            window = deque()
+            with ThreadPoolExecutor(max_workers=self.config.DECODE_WORKERS) as pool:
+                documents = iter_documents(source, skip=done)
+                while True:
+                    # Bounded read-ahead: only the documents of the next few batches are in memory
+                    for name, document in documents:
+                        window.append((name, pool.submit(self.__preprocess, document)))
+                        if len(window) >= batch_size * self.config.PREFETCH_BATCHES:
+                            break
+                    if not window:
+                        break
+                    name, future = window.popleft()
+                    image, error = future.result()
+                    pending.append((name, error))
+                    if image is not None:
+                        images.append(image)
+                    if len(pending) == batch_size or not window:
+                        run_batch()
+            progress.update(documents=done + scored, offset=writer.flush())
+            self.__save_progress(progress_file, progress)
+            writer.close()
+
+            seconds = time.perf_counter() - start
+            stats = {"documents": scored, "failed": failed, "total_documents": done + scored, "seconds": seconds,
+                     "documents_per_sec": scored / seconds if seconds else 0.}
+            logging.info(f"Scored {scored} documents ({failed} failed) in {seconds:.1f}s: "
+                         f"{stats['documents_per_sec']:.1f} documents/sec; results in '{output}'")
+            return stats
+        except Exception as e:
+            error_message = str(e)
+            raise CustomException(error_message, sys)
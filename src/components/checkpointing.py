@@ -0,0 +1,267 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import os
+import random
+import re
+import sys
+import numpy as np
+import torch
+from src.logger import logging
+from src.exception import CustomException
+
+CHECKPOINT_FILE = "checkpoint_e{:04d}_b{:06d}.pt"
+CHECKPOINT_PATTERN = re.compile(r"checkpoint_e\d{4}_b\d{6}\.pt$")
+BEST_CHECKPOINT_FILE = "best.pt"
+
+@dataclass
+class CheckpointConfig:
+    """Configuration class for training checkpoints.
+
+    Attributes:
+        CHECKPOINT_DIR (str): Directory the resumable training checkpoints are written to.
+        KEEP_LAST (int): Number of most recent checkpoints kept, besides the best one.
+        EVERY_N_BATCHES (int): Also checkpoint every N training batches within an epoch. 0 only checkpoints at epoch ends.
+
+    Example:
+        >>> config = CheckpointConfig()
+    """
+
+    CHECKPOINT_DIR: str = os.path.join(os.getcwd(), "artifacts", "checkpoints")
+    KEEP_LAST: int = 3
+    EVERY_N_BATCHES: int = 0
+
+
+def snapshot(obj):
+    """Copy every tensor of a (nested) state to CPU memory, so training can keep updating the originals.
+
+    Args:
+        obj: A tensor, or dicts, lists and tuples of tensors and plain values.
+
+    Returns:
+        The same structure holding CPU copies of the tensors.
+    """
+    if torch.is_tensor(obj):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return type(obj)((key, snapshot(value)) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot(value) for value in obj)
+    return obj
+
+
+def get_rng_state():
+    """Capture the Python, NumPy and torch (CPU and CUDA) random generator states."""
+    return {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+        "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else [],
+    }
+
+
+def set_rng_state(state):
+    """Restore random generator states captured with `get_rng_state`."""
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if state["cuda"] and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def save_atomic(obj, file_path):
+    """Save an object with `torch.save` so that `file_path` is either the previous file or the complete new one.
+
+    The object is written to a hidden temporary file in the same directory, flushed to disk and renamed over
+    `file_path`.
+
+    Args:
+        obj: The object to save.
+        file_path (str): Destination path.
+    """
+    directory, name = os.path.split(file_path)
+    os.makedirs(directory or ".", exist_ok=True)
+    # Hidden, so directory scans such as get_latest_best_model never pick up a partial file
+    tmp_path = os.path.join(directory, ".{}.tmp".format(name))
+    with open(tmp_path, "wb") as f:
+        torch.save(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+
+
+class CheckpointManager:
+    """Writes training checkpoints on a background thread and finds them again to resume.
+
+    `save_checkpoint` and `save_async` only copy the state to CPU memory on the calling thread; serialization and
+    disk writes happen on a single writer thread, in submission order. Every file is written atomically.
+
+    Every training run writes its checkpoints to its own subdirectory, named after the run (see `set_run`), so
+    runs sharing `checkpoint_dir` never prune, resume from or overwrite each other's checkpoints. Once a
+    checkpoint is written, all but the `keep_last` most recent of its run are deleted; the best one of the run
+    is kept as `best.pt`. An error on the writer thread is raised by the next call to `save_checkpoint`,
+    `save_async` or `wait`.
+
+    Args:
+        checkpoint_dir (str): Directory of the run subdirectories.
+        keep_last (int): Number of most recent checkpoints kept per run, besides the best one.
+
+    Example:
+        >>> manager = CheckpointManager('/path/to/checkpoints', keep_last=3)
+        >>> manager.set_run('20230601_120000')
+        >>> manager.save_checkpoint(state, epoch=2, batch=0, is_best=True)
+        >>> manager.wait()
+        >>> state = manager.load(manager.latest_checkpoint())
+    """
+    def __init__(self, checkpoint_dir, keep_last):
+        self.checkpoint_dir = checkpoint_dir
+        self.keep_last = max(1, keep_last)
+        self.run_id = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint-writer")
+        self._pending = []
+
+    def __check_errors(self, wait=False):
+        remaining = []
+        for future in self._pending:
+            if wait or future.done():
+                future.result()
+            else:
+                remaining.append(future)
+        self._pending = remaining
+
+    def __submit(self, fn, *args):
+        try:
+            self.__check_errors()
+        except Exception as e:
+            raise CustomException(f"Writing a checkpoint failed: {e}", sys)
+        self._pending.append(self._executor.submit(fn, *args))
+
+    def save_async(self, obj, file_path, on_saved=None):
+        """Snapshot an object and save it atomically in the background.
+
+        Args:
+            obj: The object to save, e.g. a state dict.
+            file_path (str): Destination path.
+            on_saved (callable, optional): Called on the writer thread with `file_path` once the file is on disk.
+        """
+        self.__submit(self.__save_and_notify, snapshot(obj), file_path, on_saved)
+
+    @staticmethod
+    def __save_and_notify(obj, file_path, on_saved):
+        save_atomic(obj, file_path)
+        if on_saved is not None:
+            on_saved(file_path)
+
+    def set_run(self, run_id):
+        """Write the following checkpoints to the subdirectory of run `run_id`, e.g. the run timestamp.
+
+        A resumed run passes the id it was started with, so it continues in the same subdirectory.
+        """
+        self.run_id = run_id
+
+    def run_dir(self, run_id=None):
+        """Directory of the checkpoints of a run, the current one by default."""
+        run_id = run_id or self.run_id
+        if run_id is None:
+            raise ValueError("No training run set, call set_run first")
+        return os.path.join(self.checkpoint_dir, run_id)
+
+    def __write_checkpoint(self, state, file_path, is_best):
+        save_atomic(state, file_path)
+        run_dir = os.path.dirname(file_path)
+        if is_best:
+            best_path = os.path.join(run_dir, BEST_CHECKPOINT_FILE)
+            tmp_path = os.path.join(run_dir, ".{}.tmp".format(BEST_CHECKPOINT_FILE))
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            # A hard link shares the data with the epoch checkpoint, which may later be pruned
+            try:
+                os.link(file_path, tmp_path)
+            except OSError:
+                save_atomic(state, tmp_path)
+            os.replace(tmp_path, best_path)
+        for old_file in self.__list_checkpoints(run_dir)[:-self.keep_last]:
+            os.remove(old_file)
+        logging.info(f"Checkpoint saved to '{file_path}'" + (" (best)" if is_best else ""))
+
+    def save_checkpoint(self, state, epoch, batch, is_best=False):
+        """Snapshot a training state and write it as a checkpoint in the background.
+
+        Args:
+            state (dict): The training state.
+            epoch (int): Index of the epoch in progress.
+            batch (int): Number of batches of that epoch already trained.
+            is_best (bool, optional): Also keep this checkpoint as `best.pt`.
+
+        Returns:
+            str: Path the checkpoint is written to.
+        """
+        file_path = os.path.join(self.run_dir(), CHECKPOINT_FILE.format(epoch, batch))
+        self.__submit(self.__write_checkpoint, snapshot(state), file_path, is_best)
+        return file_path
+
+    def wait(self):
+        """Block until every submitted write is on disk, raising the first error of the writer thread."""
+        try:
+            self.__check_errors(wait=True)
+        except Exception as e:
+            raise CustomException(f"Writing a checkpoint failed: {e}", sys)
+
+    def close(self):
+        self.wait()
+        self._executor.shutdown()
+
+    @staticmethod
+    def __list_checkpoints(directory):
+        if not os.path.isdir(directory):
+            return []
+        return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if CHECKPOINT_PATTERN.match(name)]
+
+    def runs(self):
+        """List the ids of the runs that have checkpoints."""
+        if not os.path.isdir(self.checkpoint_dir):
+            return []
+        return [name for name in sorted(os.listdir(self.checkpoint_dir))
+                if self.__list_checkpoints(os.path.join(self.checkpoint_dir, name))]
+
+    def checkpoints(self, run_id=None):
+        """List the checkpoints of a run, oldest first.
+
+        Args:
+            run_id (str, optional): The run, by default the current one.
+
+        Returns:
+            list: Paths of the checkpoints.
+        """
+        return self.__list_checkpoints(self.run_dir(run_id))
+
+    def latest_checkpoint(self, run_id=None):
+        """Get the most recent checkpoint of a run, or None if there is none.
+
+        Args:
+            run_id (str, optional): The run. By default, the run that wrote a checkpoint last.
+        """
+        if run_id is None:
+            latest = [self.checkpoints(run)[-1] for run in self.runs()]
+            return max(latest, key=os.path.getmtime) if latest else None
+        checkpoints = self.checkpoints(run_id)
+        return checkpoints[-1] if checkpoints else None
+
+    @staticmethod
+    def load(file_path):
+        """Load a checkpoint to CPU memory.
+
+        Args:
+            file_path (str): Path of the checkpoint.
+
+        Returns:
+            dict: The training state.
+
+        Raises:
+            CustomException: If the checkpoint cannot be read.
+        """
+        try:
+            logging.info(f"Loading checkpoint '{file_path}'")
+            return torch.load(file_path, map_location="cpu")
+        except Exception as e:
+            error_message = str(e)
+            raise CustomException(error_message, sys)
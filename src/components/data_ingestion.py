@@ -1,7 +1,10 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
 import os
 import sys
 from src.utils import download_file_sftp, unzip_file
+from src.components.data_loader import DataLoadTransform
 from src.logger import logging
 from src.exception import CustomException
 
@@ -18,6 +21,16 @@ class DataIngestionConfig:
         HOSTNAME (str): The hostname of the FTP/SFTP server.
         USER_NAME (str): The username for accessing the FTP/SFTP server.
         PASSWORD (str): The password for accessing the FTP/SFTP server.
+        NUM_CONNECTIONS (int): The number of SFTP channels used to download each file.
+        TRAIN_SHA256 (str, optional): The expected SHA-256 digest of the training archive.
+        TEST_SHA256 (str, optional): The expected SHA-256 digest of the test archive.
+        TRAIN_INCLUDE_PATTERNS (tuple): Glob patterns of the training archive members to extract.
+        TEST_INCLUDE_PATTERNS (tuple): Glob patterns of the test archive members to extract.
+        UNZIP_WORKERS (int): The number of processes extracting each archive.
+        KEEP_ARCHIVES (bool): Keep the archives after extraction, so re-running the ingestion skips both the
+            download and the members that are already extracted.
+        PACK_FROM_ARCHIVE (bool): Instead of extracting the images, pack the pre-resized shards used with
+            `DataConfig.USE_SHARDS` straight from the archives.
     Note:
         The `TRAIN_LOCAL_DATA_DIR` and `TEST_LOCAL_DATA_DIR` attributes are generated using the current working directory
         and appending the respective directory names. The remote data directories (`TRAIN_REMOTE_DATA_DIR` and
@@ -31,6 +44,14 @@ class DataIngestionConfig:
     HOSTNAME: str = "L3i-Share.univ-lr.fr"
     USER_NAME: str = "findit-participant"
     PASSWORD: str = "69cQek4N"
+    NUM_CONNECTIONS: int = 4
+    TRAIN_SHA256: Optional[str] = None
+    TEST_SHA256: Optional[str] = None
+    TRAIN_INCLUDE_PATTERNS: Tuple[str, ...] = ("T1-train/*",)
+    TEST_INCLUDE_PATTERNS: Tuple[str, ...] = ("FindIt-Dataset-Test/T1-*",)
+    UNZIP_WORKERS: int = field(default_factory=lambda: os.cpu_count() or 1)
+    KEEP_ARCHIVES: bool = True
+    PACK_FROM_ARCHIVE: bool = False
 
 
 class DataIngestion:
@@ -45,8 +66,8 @@ class DataIngestion:
     Note:
         The initiate_data_ingestion method performs the following steps:
         1. Creates the local data directories specified in the DataIngestionConfig.
-        2. Downloads the train and test data from the remote server using SFTP.
-        3. Unzips the downloaded data files.
+        2. Downloads the train and test data from the remote server using SFTP, both at the same time.
+        3. Unzips the members of the downloaded data files the data loader uses, or packs them into shards.
         
         This class assumes that the download_file_sftp and unzip_file functions are implemented separately.
     """
@@ -75,17 +96,27 @@ class DataIngestion:
             os.makedirs(self.config.TRAIN_LOCAL_DATA_DIR, exist_ok=True)
             os.makedirs(self.config.TEST_LOCAL_DATA_DIR, exist_ok=True)
 
-            logging.info("Downloading train data...")
-            download_file_sftp(self.config.HOSTNAME, self.config.USER_NAME, self.config.PASSWORD, self.config.TRAIN_REMOTE_DATA_DIR, os.path.join(self.config.TRAIN_LOCAL_DATA_DIR, "FindIt-Dataset-Train.zip"))
-
-            logging.info("Downloading test data...")
-            download_file_sftp(self.config.HOSTNAME, self.config.USER_NAME, self.config.PASSWORD, self.config.TEST_REMOTE_DATA_DIR, os.path.join(self.config.TEST_LOCAL_DATA_DIR, "FindIt-Dataset-Test.zip"))
-
-            logging.info("Unzipping train data...")
-            unzip_file(os.path.join(self.config.TRAIN_LOCAL_DATA_DIR, "FindIt-Dataset-Train.zip"), self.config.TRAIN_LOCAL_DATA_DIR)
-
-            logging.info("Unzipping test data...")
-            unzip_file(os.path.join(self.config.TEST_LOCAL_DATA_DIR, "FindIt-Dataset-Test.zip"), self.config.TEST_LOCAL_DATA_DIR)
+            logging.info("Downloading train and test data...")
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                downloads = [
+                    executor.submit(download_file_sftp, self.config.HOSTNAME, self.config.USER_NAME, self.config.PASSWORD, self.config.TRAIN_REMOTE_DATA_DIR, os.path.join(self.config.TRAIN_LOCAL_DATA_DIR, "FindIt-Dataset-Train.zip"),
+                                    num_connections=self.config.NUM_CONNECTIONS, expected_sha256=self.config.TRAIN_SHA256),
+                    executor.submit(download_file_sftp, self.config.HOSTNAME, self.config.USER_NAME, self.config.PASSWORD, self.config.TEST_REMOTE_DATA_DIR, os.path.join(self.config.TEST_LOCAL_DATA_DIR, "FindIt-Dataset-Test.zip"),
+                                    num_connections=self.config.NUM_CONNECTIONS, expected_sha256=self.config.TEST_SHA256),
+                ]
+                for download in downloads:
+                    download.result()
+
+            for name, archive, local_dir, patterns, train in (
+                    ("train", "FindIt-Dataset-Train.zip", self.config.TRAIN_LOCAL_DATA_DIR, self.config.TRAIN_INCLUDE_PATTERNS, True),
+                    ("test", "FindIt-Dataset-Test.zip", self.config.TEST_LOCAL_DATA_DIR, self.config.TEST_INCLUDE_PATTERNS, False)):
+                if self.config.PACK_FROM_ARCHIVE:
+                    logging.info(f"Packing {name} data from the archive...")
+                    DataLoadTransform().pack_from_archive(os.path.join(local_dir, archive), local_dir, train)
+                else:
+                    logging.info(f"Unzipping {name} data...")
+                    unzip_file(os.path.join(local_dir, archive), local_dir, include=patterns,
+                               num_workers=self.config.UNZIP_WORKERS, remove_archive=not self.config.KEEP_ARCHIVES)
 
             logging.info("Data ingestion completed successfully.")
         except Exception as e:
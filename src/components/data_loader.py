@@ -1,14 +1,99 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import os
+import numpy as np
 import torch
 import torchvision
-import skimage
-from torch.utils.data import Dataset
-from src.components.image_transformers import Rescale, ToTensor
+from torch.utils.data import Dataset, DistributedSampler
+from src.components.image_transformers import Rescale, ResizeCollate, ToTensor
+from src.components.image_io import load_image
+from src.components.dataset_shards import ShardedFrogeryDataset, pack_dataset, shard_status
+from src.components.distributed import get_rank, get_world_size
+from src.utils import file_digest
 from src.logger import logging
-import pandas as pd
 from src.exception import CustomException
 import sys
+import multiprocessing
+import hashlib
+from zipfile import ZipFile
+from xml.etree import ElementTree
+
+def default_num_workers():
+    """Number of data loading workers: one per available core, leaving one core to the training process.
+
+    When `torchrun` starts several training processes on the machine, the cores are split between them.
+    """
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    cores //= max(int(os.environ.get("LOCAL_WORLD_SIZE", 1)), 1)
+    return max(cores - 1, 0)
+
+MISSING_IMAGE_POLICIES = ("skip", "previous", "error")
+
+def read_ground_truth(xml_file_path):
+    """Stream the ground truth XML file into arrays of image ids and labels.
+
+    Every direct child of the root element is a sample; its 'id' and 'modified' fields are read from its attributes
+    or from child elements. Elements are discarded as soon as they are parsed, so memory stays flat for large files.
+
+    Args:
+        xml_file_path (str): Path to the XML file containing ID labels.
+
+    Returns:
+        tuple: A str array of image ids and a float32 array of labels.
+    """
+    ids, labels = [], []
+    depth = 0
+    root = None
+    for event, element in ElementTree.iterparse(xml_file_path, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1:
+            fields = dict(element.attrib)
+            fields.update((child.tag, (child.text or "").strip()) for child in element)
+            ids.append(fields['id'])
+            labels.append(float(fields['modified']))
+            root.clear()
+    return np.array(ids, dtype=str), np.array(labels, dtype=np.float32)
+
+def resolve_image_files(ids, labels, available, image_path, missing_policy):
+    """Match ground truth ids to their '<id>.jpg' image files, applying a missing-image policy.
+
+    Args:
+        ids (numpy.ndarray): Image ids from the ground truth.
+        labels (numpy.ndarray): Labels from the ground truth.
+        available (set): Names of the image files that exist.
+        image_path (str): Where the images are looked up, used in log and error messages.
+        missing_policy (str): 'skip', 'previous' or 'error' (see `DataConfig.MISSING_IMAGE_POLICY`).
+
+    Returns:
+        tuple: The ids, labels and image file names of the resulting samples.
+    """
+    if missing_policy not in MISSING_IMAGE_POLICIES:
+        raise ValueError(f"missing_policy must be one of {MISSING_IMAGE_POLICIES}, got '{missing_policy}'")
+    file_names = np.char.add(ids, ".jpg")
+    found = np.array([file_name in available for file_name in file_names], dtype=bool)
+    missing = np.flatnonzero(~found)
+    if len(missing):
+        logging.warning(f"{len(missing)} of {len(ids)} images listed in the ground truth are missing from "
+                        f"'{image_path}' (policy '{missing_policy}'), e.g. {ids[missing[:5]].tolist()}")
+        if missing_policy == "error":
+            raise FileNotFoundError(f"{len(missing)} images are missing from '{image_path}'")
+        if missing_policy == "skip":
+            ids, labels, file_names = ids[found], labels[found], file_names[found]
+        else:
+            # Point every missing sample at the closest earlier sample that has an image
+            source = np.maximum.accumulate(np.where(found, np.arange(len(ids)), -1))
+            if source[0] < 0:
+                raise FileNotFoundError(f"No earlier image to reuse for '{ids[0]}' in '{image_path}'")
+            ids, labels, file_names = ids[source], labels[source], file_names[source]
+    return ids, labels, file_names
+
+def default_start_method():
+    """Start method for data loading workers: fork where the platform offers it, since it skips re-importing the dataset."""
+    return "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
 
 @dataclass
 class DataConfig:
@@ -21,6 +106,29 @@ class DataConfig:
         TEST_DATA_XML_FILE (str): Path to the XML file containing test data labels.
         DATA_RESIZE (int): Size to which the images will be resized.
         BATCH_SIZE (int): Batch size used for data loading.
+        EVAL_BATCH_SIZE (int): Batch size of the test data loader. Evaluation keeps no autograd state, so it fits larger batches.
+        USE_SHARDS (bool): Read samples from pre-resized uint8 shards instead of decoding the JPEG scans.
+            The shards are packed on first use, and again when the settings in `DataLoadTransform.shard_settings`,
+            the number of source image files or the ground truth change.
+        TRAIN_SHARD_DIR (str): Path to the directory containing the training shards.
+        TEST_SHARD_DIR (str): Path to the directory containing the test shards.
+        SAMPLES_PER_SHARD (int): Number of images stored in each shard file.
+        NUM_WORKERS (int): Number of data loading worker processes. Defaults to the number of available cores minus one.
+        PIN_MEMORY (bool): Copy batches into page-locked memory for faster host-to-device transfer. Defaults to True with CUDA.
+        PERSISTENT_WORKERS (bool): Keep the worker processes alive between epochs.
+        PREFETCH_FACTOR (int): Number of batches loaded in advance by each worker.
+        WORKER_START_METHOD (str): Multiprocessing start method of the workers ('fork', 'forkserver' or 'spawn').
+        MISSING_IMAGE_POLICY (str): What to do with labels whose image file does not exist: 'skip' drops the sample,
+            'previous' reuses the image and label of the previous sample and 'error' raises.
+        DRAFT_DECODE (bool): Decode JPEG scans at a reduced resolution close to `DATA_RESIZE` (see `image_io.open_image`)
+            instead of at full resolution. Off by default: the model inputs then differ from those of full decodes
+            (on A4 scans at 300 dpi, mean and max absolute pixel differences of 0.031 and 0.19 after `Rescale`, 0.005
+            and 0.04 with `BATCH_TRANSFORM`, see tests/test_decode_parity.py), and the effect on accuracy has to be
+            checked on the test set before training with it. Shards and feature caches are rebuilt when it changes.
+        BATCH_TRANSFORM (bool): Keep samples uint8 and resize and normalize them batch by batch at collation
+            (`ResizeCollate`) instead of per sample with `Rescale` and `ToTensor`. Both resizes are antialiased; on
+            A4 scans at 300 dpi the batches differ by a mean absolute pixel difference of 0.012 (see
+            tests/test_batch_transform.py).
 
     Example:
         >>> config = DataConfig()
@@ -32,17 +140,100 @@ class DataConfig:
     TEST_DATA_XML_FILE: str = os.path.join(os.getcwd(), "artifacts/test_data/FindIt-Dataset-Test/T1-Test-GT.xml")
     DATA_RESIZE: int = 299
     BATCH_SIZE: int = 32
+    EVAL_BATCH_SIZE: int = 64
+    USE_SHARDS: bool = False
+    TRAIN_SHARD_DIR: str = os.path.join(os.getcwd(), "artifacts/shards/train")
+    TEST_SHARD_DIR: str = os.path.join(os.getcwd(), "artifacts/shards/test")
+    SAMPLES_PER_SHARD: int = 1024
+    NUM_WORKERS: int = field(default_factory=default_num_workers)
+    PIN_MEMORY: bool = field(default_factory=torch.cuda.is_available)
+    PERSISTENT_WORKERS: bool = True
+    PREFETCH_FACTOR: int = 2
+    WORKER_START_METHOD: str = field(default_factory=default_start_method)
+    MISSING_IMAGE_POLICY: str = "skip"
+    DRAFT_DECODE: bool = False
+    BATCH_TRANSFORM: bool = True
+
+class ResumableSampler(DistributedSampler):
+    """Sampler with a reproducible order per epoch that can resume partway through an epoch.
+
+    The order only depends on the seed and the epoch set with `set_epoch`, so a resumed run visits the samples of
+    the interrupted epoch in the same order. `set_start` skips the samples already trained on in the current epoch
+    without loading them. In distributed training every rank gets its own shard, as with `DistributedSampler`.
+
+    With a `generator`, `set_epoch` also seeds it from the seed, epoch and rank. Passed to the data loader, it then
+    draws the same worker seeds for an epoch whether the run was interrupted or not.
+
+    Args:
+        dataset (torch.utils.data.Dataset): The dataset to sample.
+        shuffle (bool): Whether to shuffle the samples of every epoch.
+        distributed (bool, optional): Shard the dataset across the ranks of the process group.
+        seed (int, optional): Seed of the shuffling, identical on every rank.
+        generator (torch.Generator, optional): Generator of the data loader, seeded at every epoch.
+
+    Example:
+        >>> sampler = ResumableSampler(dataset, shuffle=True)
+        >>> sampler.set_epoch(3)
+        >>> sampler.set_start(640)
+    """
+    def __init__(self, dataset, shuffle, distributed=True, seed=0, generator=None):
+        num_replicas, rank = (get_world_size(), get_rank()) if distributed else (1, 0)
+        super(ResumableSampler, self).__init__(dataset, num_replicas=num_replicas, rank=rank, shuffle=shuffle, seed=seed)
+        self.start = 0
+        self.generator = generator
+        if generator is not None:
+            self.set_epoch(0)
+
+    def set_epoch(self, epoch):
+        super(ResumableSampler, self).set_epoch(epoch)
+        self.start = 0
+        if self.generator is not None:
+            self.generator.manual_seed((self.seed + epoch) * self.num_replicas + self.rank)
+
+    def set_start(self, start):
+        """Skip the first `start` samples of this rank in the current epoch."""
+        self.start = start
+
+    def __iter__(self):
+        return iter(list(super(ResumableSampler, self).__iter__())[self.start:])
+
+    def __len__(self):
+        return max(self.num_samples - self.start, 0)
+
+
+def make_sampler(dataset, shuffle, distributed=True, generator=None):
+    """Sampler of a data loader: a `ResumableSampler` when shuffling or in distributed training, None otherwise.
+
+    Args:
+        dataset (torch.utils.data.Dataset): The dataset to sample.
+        shuffle (bool): Whether to shuffle the samples of every epoch.
+        distributed (bool, optional): Shard the dataset across ranks in distributed training.
+        generator (torch.Generator, optional): Generator of the data loader, seeded by the sampler at every epoch.
+
+    Returns:
+        ResumableSampler: The sampler, or None for in-order loading of the whole dataset.
+    """
+    distributed = distributed and get_world_size() > 1
+    if not shuffle and not distributed:
+        return None
+    return ResumableSampler(dataset, shuffle, distributed, generator=generator)
+
 
 class FrogeryDataset(Dataset):
     """Custom dataset for frogery data.
 
     This dataset loads frogery data from XML file and corresponding images from a specified image path.
     The dataset returns a dictionary containing the 'image' and 'label' for each sample.
+    Labels and image paths are resolved once when the dataset is built, so loading a sample is an array lookup.
 
     Args:
         xml_file_path (str): Path to the XML file containing ID labels.
         image_path (str): Path to the directory containing the images.
         transformation (callable, optional): Optional transformation to be applied to each sample.
+        missing_policy (str, optional): How samples without an image file are handled, one of
+            'skip', 'previous' or 'error' (see `DataConfig.MISSING_IMAGE_POLICY`).
+        decode_size (int or tuple, optional): Smallest (height, width) the transformation resizes images to. JPEGs
+            are then decoded at a reduced resolution still covering it; None decodes at full resolution.
 
     Example:
         >>> xml_file = '/path/to/labels.xml'
@@ -52,48 +243,254 @@ class FrogeryDataset(Dataset):
         >>> image = sample['image']
         >>> label = sample['label']
     """
-    def __init__(self, xml_file_path, image_path, transformation = None):
+    def __init__(self, xml_file_path, image_path, transformation = None, missing_policy = "skip", decode_size = None):
         self.image_path = image_path
         self.transformation = transformation
-        self.id_labels = pd.read_xml(xml_file_path)
-        
-    
+        self.decode_size = decode_size
+        # Ids, labels and paths are flat NumPy arrays rather than a DataFrame: forked loader workers then share
+        # a few buffers copy-on-write instead of touching (and copying) the pages of many Python objects.
+        ids, labels = read_ground_truth(xml_file_path)
+        available = set(os.listdir(image_path)) if os.path.isdir(image_path) else set()
+        self.num_source_files = len(available)
+        self.ids, self.labels, file_names = resolve_image_files(ids, labels, available, image_path, missing_policy)
+        self.files = np.char.add(os.path.join(image_path, ""), file_names)
+
     def __len__(self):
-        return len(self.id_labels)
+        return len(self.labels)
+
+    def get_sample_file(self, idx):
+        """Get the image file that backs a sample.
+
+        Args:
+            idx (int): Index of the sample.
+
+        Returns:
+            tuple: The image id and the path of the image file.
+        """
+        return str(self.ids[idx]), str(self.files[idx])
+
+    def get_sample_key(self, idx):
+        """Get the identity of a sample's image content.
+
+        Args:
+            idx (int): Index of the sample.
+
+        Returns:
+            tuple: The image id and the SHA-256 hex digest of the image file.
+        """
+        image_id, img_file_name = self.get_sample_file(idx)
+        return image_id, file_digest(img_file_name)
 
     def __getitem__(self, idx):
         if torch.is_tensor(idx):
             idx = idx.tolist()
 
-        img_file_name = os.path.join(self.image_path, str(self.id_labels.iloc[idx]['id']) + ".jpg")
-        if not os.path.exists(img_file_name):
-            idx = idx - 1
-            if idx < 0:
-                idx = idx + 1
-            img_file_name = os.path.join(self.image_path, str(self.id_labels.iloc[idx]['id']) + ".jpg")
-        image = skimage.io.imread(img_file_name)
-        label = self.id_labels.iloc[idx]['modified']
+        image = load_image(str(self.files[idx]), self.decode_size)
+        label = self.labels[idx]
         sample = {'image': image, 'label': label}
         if self.transformation:
             sample = self.transformation(sample)
         return sample
 
 
+class ZipFrogeryDataset(Dataset):
+    """Frogery dataset read straight from a ZIP archive, without extracting it.
+
+    Used to pack the pre-resized shards directly from the downloaded archive. The dataset returns a dictionary
+    containing the 'image' and 'label' for each sample.
+
+    Args:
+        archive_path (str): Path to the ZIP archive.
+        xml_member (str): Name of the ground truth XML member.
+        image_prefix (str): Name of the archive directory containing the images.
+        transformation (callable, optional): Optional transformation to be applied to each sample.
+        missing_policy (str, optional): How samples without an image member are handled (see `FrogeryDataset`).
+        decode_size (int or tuple, optional): Smallest size the transformation resizes images to (see `FrogeryDataset`).
+
+    Example:
+        >>> dataset = ZipFrogeryDataset('FindIt-Dataset-Train.zip', 'T1-train/GT/T1-GT.xml', 'T1-train/img')
+        >>> sample = dataset[0]
+    """
+    def __init__(self, archive_path, xml_member, image_prefix, transformation = None, missing_policy = "skip", decode_size = None):
+        self.archive_path = archive_path
+        self.transformation = transformation
+        self.decode_size = decode_size
+        prefix = image_prefix.strip("/") + "/"
+        with ZipFile(archive_path) as archive:
+            with archive.open(xml_member) as xml_file:
+                ids, labels = read_ground_truth(xml_file)
+            available = {name[len(prefix):] for name in archive.namelist() if name.startswith(prefix)}
+        self.num_source_files = len(available)
+        self.ids, self.labels, file_names = resolve_image_files(ids, labels, available, f"{archive_path}:{prefix}", missing_policy)
+        self.members = np.char.add(prefix, file_names)
+        self._digests = {}
+        # Opened lazily, once per process, since ZipFile handles must not be shared by forked workers
+        self._archive = None
+
+    def __read(self, idx):
+        if self._archive is None or self._archive[0] != os.getpid():
+            self._archive = (os.getpid(), ZipFile(self.archive_path))
+        data = self._archive[1].read(str(self.members[idx]))
+        self._digests[idx] = hashlib.sha256(data).hexdigest()
+        return data
+
+    def get_sample_key(self, idx):
+        """Get the identity of a sample's image content.
+
+        Args:
+            idx (int): Index of the sample.
+
+        Returns:
+            tuple: The image id and the SHA-256 hex digest of the image member.
+        """
+        if idx not in self._digests:
+            self.__read(idx)
+        return str(self.ids[idx]), self._digests.pop(idx)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, idx):
+        if torch.is_tensor(idx):
+            idx = idx.tolist()
+
+        image = load_image(self.__read(idx), self.decode_size)
+        sample = {'image': image, 'label': self.labels[idx]}
+        if self.transformation:
+            sample = self.transformation(sample)
+        return sample
+
+
 class DataLoadTransform:
     """Class for loading and transforming data.
 
     This class provides methods to get training and test data loaders for frogery data.
     It uses the provided configuration object to set up the dataset and transformation.
 
+    Args:
+        config (DataConfig, optional): Data settings, defaults to `DataConfig()`.
+
     Example:
         >>> data_loader = DataLoadTransform()
         >>> train_loader = data_loader.get_train_loader()
         >>> test_loader = data_loader.get_test_loader()
     """
-    def __init__(self):
-        self.config = DataConfig()
-        self.transform = torchvision.transforms.Compose([Rescale((self.config.DATA_RESIZE, self.config.DATA_RESIZE)), ToTensor()])
+    def __init__(self, config=None):
+        self.config = config or DataConfig()
+        size = (self.config.DATA_RESIZE, self.config.DATA_RESIZE)
+        if self.config.BATCH_TRANSFORM:
+            # Samples stay uint8 until the collate function resizes whole batches
+            self.transform = None
+            self.collate_fn = ResizeCollate(size)
+        else:
+            self.transform = torchvision.transforms.Compose([Rescale(size), ToTensor()])
+            self.collate_fn = None
+
+    @property
+    def decode_size(self):
+        """Size JPEG scans are decoded for, or None to decode them at full resolution."""
+        return (self.config.DATA_RESIZE, self.config.DATA_RESIZE) if self.config.DRAFT_DECODE else None
     
+    @property
+    def shard_settings(self):
+        """Settings the packed shards depend on. Shards packed with other settings are packed again."""
+        return {name: getattr(self.config, name) for name in ("DATA_RESIZE", "DRAFT_DECODE", "MISSING_IMAGE_POLICY", "SAMPLES_PER_SHARD")}
+
+    def __pack_shards(self, dataset, shard_dir):
+        reason = shard_status(shard_dir, self.shard_settings, dataset)
+        if reason is None:
+            logging.info(f"Shards in '{shard_dir}' are up to date.")
+            return
+        logging.info(f"Packing shards in '{shard_dir}': {reason}")
+        size = (self.config.DATA_RESIZE, self.config.DATA_RESIZE)
+        pack_dataset(dataset, shard_dir, size, self.config.SAMPLES_PER_SHARD, self.shard_settings)
+
+    def __get_dataset(self, xml_file_path, image_path, shard_dir):
+        if not self.config.USE_SHARDS:
+            return FrogeryDataset(xml_file_path, image_path, self.transform, self.config.MISSING_IMAGE_POLICY, self.decode_size)
+        if os.path.isdir(image_path):
+            size = (self.config.DATA_RESIZE, self.config.DATA_RESIZE)
+            dataset = FrogeryDataset(xml_file_path, image_path, Rescale(size), self.config.MISSING_IMAGE_POLICY, self.decode_size)
+            self.__pack_shards(dataset, shard_dir)
+        else:
+            # Shards packed straight from the archive have no extracted images to check against or repack from
+            reason = shard_status(shard_dir, self.shard_settings)
+            if reason is not None:
+                raise ValueError(f"The shards in '{shard_dir}' cannot be used ({reason}) and there are no images in "
+                                 f"'{image_path}' to pack them from. Run the data ingestion again.")
+        return ShardedFrogeryDataset(shard_dir, None if self.config.BATCH_TRANSFORM else ToTensor())
+
+    def pack_from_archive(self, archive_path, local_data_dir, train):
+        """Pack the shards of a dataset straight from its ZIP archive, without writing full-size images to disk.
+
+        The ground truth and image locations inside the archive are taken from the configured paths, relative to the
+        directory the archive would be extracted to. Shards that are up to date with the archive are kept.
+
+        Args:
+            archive_path (str): Path to the ZIP archive.
+            local_data_dir (str): Directory the archive would be extracted to.
+            train (bool): Pack the training dataset if True, the test dataset otherwise.
+        """
+        xml_file_path, image_path, shard_dir = (
+            (self.config.TRAIN_DATA_XML_FILE, self.config.TRAIN_DATA_IMAGE_DIR, self.config.TRAIN_SHARD_DIR) if train else
+            (self.config.TEST_DATA_XML_FILE, self.config.TEST_DATA_IMAGE_DIR, self.config.TEST_SHARD_DIR))
+        size = (self.config.DATA_RESIZE, self.config.DATA_RESIZE)
+        dataset = ZipFrogeryDataset(archive_path, os.path.relpath(xml_file_path, local_data_dir).replace(os.sep, "/"),
+                                    os.path.relpath(image_path, local_data_dir).replace(os.sep, "/"), Rescale(size),
+                                    self.config.MISSING_IMAGE_POLICY, self.decode_size)
+        self.__pack_shards(dataset, shard_dir)
+
+    def get_train_dataset(self):
+        """Get the transformed training dataset.
+
+        Returns:
+            torch.utils.data.Dataset: The training dataset.
+        """
+        return self.__get_dataset(self.config.TRAIN_DATA_XML_FILE, self.config.TRAIN_DATA_IMAGE_DIR, self.config.TRAIN_SHARD_DIR)
+
+    def get_test_dataset(self):
+        """Get the transformed test dataset.
+
+        Returns:
+            torch.utils.data.Dataset: The test dataset.
+        """
+        return self.__get_dataset(self.config.TEST_DATA_XML_FILE, self.config.TEST_DATA_IMAGE_DIR, self.config.TEST_SHARD_DIR)
+
+    def make_loader(self, dataset, shuffle, batch_size=None, distributed=True):
+        """Create a data loader using the worker, pinning and prefetching settings of the configuration.
+
+        Shuffled data is loaded through a `ResumableSampler`, so training can resume partway through an epoch.
+        In distributed training every rank loads its own shard of the dataset.
+
+        Args:
+            dataset (torch.utils.data.Dataset): The dataset to load.
+            shuffle (bool): Whether to reshuffle the data at every epoch.
+            batch_size (int, optional): Batch size, defaults to `BATCH_SIZE`.
+            distributed (bool, optional): Shard the dataset across ranks in distributed training. Pass False to load
+                the whole dataset on this rank.
+
+        Returns:
+            torch.utils.data.DataLoader: Data loader for the dataset.
+        """
+        loader_args = {}
+        if self.config.NUM_WORKERS > 0:
+            loader_args = dict(
+                num_workers=self.config.NUM_WORKERS,
+                persistent_workers=self.config.PERSISTENT_WORKERS,
+                prefetch_factor=self.config.PREFETCH_FACTOR,
+                multiprocessing_context=self.config.WORKER_START_METHOD,
+            )
+        # Worker seeds are drawn from a generator of the loader rather than the global one, and the sampler seeds it
+        # at every epoch, so a resumed run seeds the workers of an epoch like the interrupted run did. Persistent
+        # workers are seeded only once, in the first epoch a process runs, so their random streams after a resume
+        # differ; the workers draw no random numbers today.
+        generator = torch.Generator()
+        generator.manual_seed(0)
+        return torch.utils.data.DataLoader(dataset, batch_size=batch_size or self.config.BATCH_SIZE,
+                                           sampler=make_sampler(dataset, shuffle, distributed, generator),
+                                           collate_fn=self.collate_fn, pin_memory=self.config.PIN_MEMORY,
+                                           generator=generator, **loader_args)
+
     def get_train_loader(self):
         """Get a data loader for the training dataset.
 
@@ -102,8 +499,8 @@ class DataLoadTransform:
         """
         try:
             logging.info("Getting training data loader")
-            train_dataset = FrogeryDataset(self.config.TRAIN_DATA_XML_FILE, self.config.TRAIN_DATA_IMAGE_DIR, self.transform)
-            train_loader = torch.utils.data.DataLoader(train_dataset, batch_size=self.config.BATCH_SIZE, shuffle=True)
+            train_dataset = self.get_train_dataset()
+            train_loader = self.make_loader(train_dataset, shuffle=True)
             return train_loader
         except Exception as e:
             error_message = str(e)
@@ -118,8 +515,8 @@ class DataLoadTransform:
         """
         try:
             logging.info("Getting test data loader")
-            test_dataset = FrogeryDataset(self.config.TEST_DATA_XML_FILE, self.config.TEST_DATA_IMAGE_DIR, self.transform)
-            test_loader = torch.utils.data.DataLoader(test_dataset, batch_size=self.config.BATCH_SIZE, shuffle=True)
+            test_dataset = self.get_test_dataset()
+            test_loader = self.make_loader(test_dataset, shuffle=False, batch_size=self.config.EVAL_BATCH_SIZE)
             return test_loader
         except Exception as e:
             error_message = str(e)
@@ -0,0 +1,186 @@
+import glob
+import json
+import os
+import sys
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+from src.logger import logging
+from src.exception import CustomException
+
+INDEX_FILE = "index.npz"
+SHARD_FILE = "shard_{:05d}.npy"
+
+
+def to_uint8_image(image):
+    """Convert a decoded or rescaled image to an RGB uint8 array.
+
+    Args:
+        image (numpy.ndarray): Image of shape (H, W), (H, W, 3) or (H, W, 4). Float images are expected in [0, 1].
+
+    Returns:
+        numpy.ndarray: Image of shape (H, W, 3) with dtype uint8.
+    """
+    if image.dtype != np.uint8:
+        image = np.clip(np.rint(image * 255), 0, 255).astype(np.uint8)
+    if image.ndim == 2:
+        image = np.stack([image] * 3, axis=-1)
+    return image[:, :, :3]
+
+
+def pack_dataset(dataset, shard_dir, image_size, samples_per_shard, settings=None):
+    """Pack a dataset into memory-mapped uint8 shards.
+
+    Every sample is decoded and resized once, then written as a uint8 (H, W, 3) image into `.npy` shard files
+    of at most `samples_per_shard` images each. An `index.npz` file next to the shards records the shard,
+    offset, image id, content hash and label of every sample, the packing settings and the number of source
+    image files (see `shard_status`). The index is written last and a previous one is removed first, so a
+    directory without an index is an incomplete pack.
+
+    Args:
+        dataset (FrogeryDataset or ZipFrogeryDataset): Dataset whose transformation resizes images to `image_size`.
+        shard_dir (str): Path to the directory the shards are written to.
+        image_size (tuple): (height, width) of the packed images.
+        samples_per_shard (int): Maximum number of images per shard file.
+        settings (dict, optional): JSON-serializable settings the packed pixels depend on.
+
+    Raises:
+        CustomException: If an error occurs while packing the dataset.
+
+    Example:
+        >>> dataset = FrogeryDataset(xml_file, image_dir, Rescale((299, 299)))
+        >>> pack_dataset(dataset, '/path/to/shards', (299, 299), 1024)
+    """
+    try:
+        logging.info(f"Packing {len(dataset)} samples into '{shard_dir}'")
+        os.makedirs(shard_dir, exist_ok=True)
+        # Replacing an existing pack: drop its index first, so an interrupted repack is not taken for a complete one
+        index_path = os.path.join(shard_dir, INDEX_FILE)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        for old_shard in glob.glob(os.path.join(shard_dir, "shard_*.npy")):
+            os.remove(old_shard)
+        height, width = image_size
+        num_samples = len(dataset)
+        ids, hashes = [], []
+        labels = np.zeros(num_samples, dtype=np.float32)
+        shards = np.arange(num_samples, dtype=np.int32) // samples_per_shard
+        offsets = np.arange(num_samples, dtype=np.int32) % samples_per_shard
+
+        shard = None
+        for idx in range(num_samples):
+            if offsets[idx] == 0:
+                if shard is not None:
+                    shard.flush()
+                shard_size = min(samples_per_shard, num_samples - idx)
+                shard_path = os.path.join(shard_dir, SHARD_FILE.format(shards[idx]))
+                shard = np.lib.format.open_memmap(shard_path, mode='w+', dtype=np.uint8, shape=(shard_size, height, width, 3))
+            sample = dataset[idx]
+            shard[offsets[idx]] = to_uint8_image(sample['image'])
+            labels[idx] = sample['label']
+            image_id, digest = dataset.get_sample_key(idx)
+            ids.append(image_id)
+            hashes.append(digest)
+        if shard is not None:
+            shard.flush()
+            del shard
+
+        index_tmp = os.path.join(shard_dir, "index.tmp.npz")
+        np.savez(index_tmp, ids=np.array(ids), hashes=np.array(hashes), labels=labels, shards=shards, offsets=offsets,
+                 settings=np.array(json.dumps(settings or {}, sort_keys=True)),
+                 source_files=np.array(getattr(dataset, "num_source_files", -1)))
+        os.replace(index_tmp, index_path)
+        logging.info(f"Dataset packed into '{shard_dir}' successfully.")
+    except Exception as e:
+        error_message = str(e)
+        raise CustomException(error_message, sys)
+
+
+def shard_status(shard_dir, settings, source=None):
+    """Check whether the shards of a directory can be used as they are.
+
+    Shards are stale when they were packed with other settings than `settings`, or, when the `source` dataset is
+    given, from another number of image files or another ground truth than it has.
+
+    Args:
+        shard_dir (str): Path to the directory containing the shards and their index.
+        settings (dict): Settings the shards must have been packed with.
+        source (FrogeryDataset or ZipFrogeryDataset, optional): The dataset the shards are packed from.
+
+    Returns:
+        str: Why the shards must be packed again, or None if they are up to date.
+    """
+    if not ShardedFrogeryDataset.exists(shard_dir):
+        return "no shards packed yet"
+    index = np.load(os.path.join(shard_dir, INDEX_FILE))
+    if 'settings' not in index.files or json.loads(str(index['settings'])) != json.loads(json.dumps(settings)):
+        return "packed with other settings"
+    if source is not None:
+        if int(index['source_files']) != source.num_source_files:
+            return f"packed from {int(index['source_files'])} image files, the source now has {source.num_source_files}"
+        if not (np.array_equal(index['ids'], source.ids) and np.array_equal(index['labels'], source.labels)):
+            return "the ground truth changed"
+    return None
+
+
+class ShardedFrogeryDataset(Dataset):
+    """Dataset reading pre-resized uint8 frogery images from shards written by `pack_dataset`.
+
+    Shards are memory-mapped copy-on-write, so a sample is a view into the page cache and no image data is
+    copied until a transformation converts it. The dataset returns a dictionary containing the 'image'
+    (uint8, H x W x C) and 'label' for each sample.
+
+    Args:
+        shard_dir (str): Path to the directory containing the shards and their index.
+        transformation (callable, optional): Optional transformation to be applied to each sample.
+
+    Example:
+        >>> dataset = ShardedFrogeryDataset('/path/to/shards', ToTensor())
+        >>> sample = dataset[0]
+        >>> image = sample['image']
+        >>> label = sample['label']
+    """
+    def __init__(self, shard_dir, transformation = None):
+        self.shard_dir = shard_dir
+        self.transformation = transformation
+        index = np.load(os.path.join(shard_dir, INDEX_FILE))
+        self.ids = index['ids']
+        self.hashes = index['hashes']
+        self.labels = index['labels']
+        self.shards = index['shards']
+        self.offsets = index['offsets']
+        # Mapped lazily so every DataLoader worker maps the shards itself
+        self._shard_maps = {}
+
+    @staticmethod
+    def exists(shard_dir):
+        return os.path.exists(os.path.join(shard_dir, INDEX_FILE))
+
+    def __get_shard(self, shard):
+        if shard not in self._shard_maps:
+            self._shard_maps[shard] = np.load(os.path.join(self.shard_dir, SHARD_FILE.format(shard)), mmap_mode='c')
+        return self._shard_maps[shard]
+
+    def get_sample_key(self, idx):
+        """Get the identity of a sample's image content.
+
+        Args:
+            idx (int): Index of the sample.
+
+        Returns:
+            tuple: The image id and the SHA-256 hex digest of the source image file.
+        """
+        return str(self.ids[idx]), str(self.hashes[idx])
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, idx):
+        if torch.is_tensor(idx):
+            idx = idx.tolist()
+
+        image = self.__get_shard(int(self.shards[idx]))[self.offsets[idx]]
+        sample = {'image': image, 'label': self.labels[idx]}
+        if self.transformation:
+            sample = self.transformation(sample)
+        return sample
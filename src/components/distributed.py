@@ -0,0 +1,127 @@
+from contextlib import contextmanager
+import os
+import sys
+import torch
+import torch.distributed as dist
+from src.logger import logging
+from src.exception import CustomException
+
+def is_distributed():
+    """Whether this process is one rank of an initialized process group."""
+    return dist.is_available() and dist.is_initialized()
+
+
+def get_rank():
+    return dist.get_rank() if is_distributed() else 0
+
+
+def get_world_size():
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def is_main_process():
+    return get_rank() == 0
+
+
+def init_distributed(backend="gloo"):
+    """Join the process group described by the environment variables `torchrun` sets.
+
+    Does nothing when the process was not started by `torchrun` with more than one process.
+
+    Args:
+        backend (str, optional): The `torch.distributed` backend; gloo runs on CPU-only nodes.
+
+    Returns:
+        bool: Whether distributed training is enabled.
+
+    Raises:
+        CustomException: If the process group cannot be initialized.
+
+    Example:
+        >>> # torchrun --nproc_per_node=4 src/pipelines/train_pipeline.py
+        >>> init_distributed()
+        True
+    """
+    if int(os.environ.get("WORLD_SIZE", 1)) <= 1 or is_distributed():
+        return is_distributed()
+    try:
+        dist.init_process_group(backend=backend)
+        logging.info(f"Initialized rank {get_rank()} of {get_world_size()} ({backend})")
+        return True
+    except Exception as e:
+        error_message = str(e)
+        raise CustomException(error_message, sys)
+
+
+def cleanup_distributed():
+    if is_distributed():
+        # Ranks leave together; a rank tearing down gloo while another still uses it can hang
+        dist.barrier()
+        dist.destroy_process_group()
+
+
+@contextmanager
+def main_process_first():
+    """Run the block on rank 0 before the other ranks, e.g. to download or build shared files once."""
+    if is_distributed() and not is_main_process():
+        dist.barrier()
+    try:
+        yield
+    finally:
+        if is_distributed() and is_main_process():
+            dist.barrier()
+
+
+def all_reduce_sum(tensor):
+    """Sum a tensor across ranks in place. The tensor is returned unchanged outside distributed training."""
+    if is_distributed():
+        dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+    return tensor
+
+
+def all_gather_object(obj):
+    """Collect a picklable object from every rank.
+
+    Returns:
+        list: The object of every rank, in rank order; `[obj]` outside distributed training.
+    """
+    if not is_distributed():
+        return [obj]
+    objects = [None] * get_world_size()
+    dist.all_gather_object(objects, obj)
+    return objects
+
+
+def all_reduce_gradients(parameters):
+    """Average the gradients of parameters across ranks with a single all-reduce.
+
+    Args:
+        parameters (iterable): Parameters whose gradients are averaged; those without a gradient are skipped.
+    """
+    if not is_distributed():
+        return
+    grads = [parameter.grad for parameter in parameters if parameter.grad is not None]
+    if not grads:
+        return
+    flat = torch.cat([grad.reshape(-1) for grad in grads])
+    dist.all_reduce(flat, op=dist.ReduceOp.SUM)
+    flat.div_(get_world_size())
+    offset = 0
+    for grad in grads:
+        grad.copy_(flat[offset:offset + grad.numel()].view_as(grad))
+        offset += grad.numel()
+
+
+def broadcast_state(module, tensors="all"):
+    """Copy the parameters and/or buffers of rank 0 to every other rank.
+
+    Args:
+        module (torch.nn.Module): The module to synchronize.
+        tensors (str, optional): 'all', or 'buffers' to only synchronize buffers such as BatchNorm statistics.
+    """
+    if not is_distributed():
+        return
+    items = module.named_buffers() if tensors == "buffers" else module.state_dict().items()
+    with torch.no_grad():
+        for _, tensor in items:
+            dist.broadcast(tensor, src=0)
@@ -0,0 +1,253 @@
+from dataclasses import dataclass
+import hashlib
+import json
+import os
+import sys
+import numpy as np
+import torch
+from torch.utils.data import Dataset, Subset
+from src.components.data_loader import make_sampler
+from src.logger import logging
+from src.exception import CustomException
+
+# DataConfig settings that change the pixels the backbone sees, and therefore the cached features
+PREPROCESSING_SETTINGS = ("DATA_RESIZE", "DRAFT_DECODE", "BATCH_TRANSFORM", "USE_SHARDS")
+
+@dataclass
+class FeatureCacheConfig:
+    """Configuration class for the frozen-backbone feature cache.
+
+    Attributes:
+        TRAIN_CACHE_DIR (str): Directory of the feature store built from the training set.
+        TEST_CACHE_DIR (str): Directory of the feature store built from the test set.
+        FEATURE_DIM (int): Size of the pooled Inception v3 features.
+        BATCH_SIZE (int): Batch size used for the backbone pass while building a store.
+
+    Example:
+        >>> config = FeatureCacheConfig()
+    """
+
+    TRAIN_CACHE_DIR: str = os.path.join(os.getcwd(), "artifacts", "feature_cache", "train")
+    TEST_CACHE_DIR: str = os.path.join(os.getcwd(), "artifacts", "feature_cache", "test")
+    FEATURE_DIM: int = 2048
+    BATCH_SIZE: int = 64
+
+
+class FeatureStore(Dataset):
+    """Memory-mapped store of pooled backbone features.
+
+    A store is a directory holding `features.npy`, a (num_samples, feature_dim) float32 array that is
+    memory-mapped on access, and `index.npz` with the image id, content hash, file size, modification time and
+    label of every row, plus the fingerprint of the preprocessing and backbone the features were computed with.
+    The dataset returns a dictionary containing the 'features' and 'label' for each sample.
+
+    Args:
+        store_dir (str): Path to the directory of the store.
+
+    Example:
+        >>> store = FeatureStore('/path/to/feature_cache/train')
+        >>> sample = store[0]
+        >>> features = sample['features']
+        >>> label = sample['label']
+    """
+    FEATURES_FILE = "features.npy"
+    INDEX_FILE = "index.npz"
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        index = np.load(os.path.join(store_dir, self.INDEX_FILE))
+        self.ids = index['ids']
+        self.hashes = index['hashes']
+        self.labels = index['labels']
+        # Stores written before these fields existed are rebuilt, since their fingerprint is unknown
+        self.sizes = index['sizes'] if 'sizes' in index.files else None
+        self.mtimes = index['mtimes'] if 'mtimes' in index.files else None
+        self.fingerprint = str(index['fingerprint']) if 'fingerprint' in index.files else None
+        # Opened lazily so every DataLoader worker maps the file itself
+        self._features = None
+
+    @classmethod
+    def exists(cls, store_dir):
+        return os.path.exists(os.path.join(store_dir, cls.INDEX_FILE))
+
+    @property
+    def features(self):
+        if self._features is None:
+            self._features = np.load(os.path.join(self.store_dir, self.FEATURES_FILE), mmap_mode='r')
+            if len(self._features) != len(self.labels):
+                raise ValueError(f"Feature store '{self.store_dir}' is inconsistent, rebuild it.")
+        return self._features
+
+    def keys(self):
+        """Get the cache key of every row.
+
+        Returns:
+            list: The '<image id>:<content hash>' key of every row.
+        """
+        return [f"{image_id}:{digest}" for image_id, digest in zip(self.ids, self.hashes)]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, idx):
+        if torch.is_tensor(idx):
+            idx = idx.tolist()
+        return {'features': torch.from_numpy(np.array(self.features[idx])),
+                'label': torch.Tensor([self.labels[idx]]).float()}
+
+
+class FeatureCache:
+    """Class for building feature stores with a single backbone pass per image.
+
+    Since every `base_model` parameter of `InceptBaseModel` is frozen, the pooled backbone features of an image
+    never change during training. This class runs the backbone once per image, in eval mode, and saves the
+    features to a `FeatureStore`. Rows are keyed by image id plus a hash of the image file, so rebuilding a
+    store only runs the backbone on images that are new or have changed. Files whose size and modification time
+    are those recorded in the store are not hashed again. A store built with other preprocessing settings or
+    backbone weights (see `fingerprint`) is rebuilt whole.
+
+    Args:
+        data_loader (DataLoadTransform): Provides the datasets the stores are built from.
+        model (InceptBaseModel): The model whose backbone computes the features.
+        device (torch.device): Device the backbone runs on.
+
+    Example:
+        >>> feature_cache = FeatureCache(DataLoadTransform(), model, device)
+        >>> train_loader = feature_cache.get_train_loader(batch_size=32)
+        >>> test_loader = feature_cache.get_test_loader(batch_size=32)
+    """
+    def __init__(self, data_loader, model, device):
+        self.config = FeatureCacheConfig()
+        self.data_loader = data_loader
+        self.model = model
+        self.device = device
+
+    def fingerprint(self):
+        """Identify what the features depend on besides the images: the preprocessing settings and the backbone.
+
+        Returns:
+            str: The SHA-256 hex digest of the `PREPROCESSING_SETTINGS` of the data loader and the backbone weights.
+        """
+        settings = {name: getattr(self.data_loader.config, name) for name in PREPROCESSING_SETTINGS}
+        settings['backbone'] = self.model.backbone_digest()
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+    @staticmethod
+    def __sample_keys(dataset, previous):
+        # Content hashes of files that kept the size and modification time recorded in the previous store
+        known = {}
+        if previous is not None and previous.sizes is not None:
+            known = {(str(image_id), int(size), int(mtime)): str(digest) for image_id, digest, size, mtime
+                     in zip(previous.ids, previous.hashes, previous.sizes, previous.mtimes)}
+        ids, hashes = [], []
+        sizes = np.full(len(dataset), -1, dtype=np.int64)
+        mtimes = np.full(len(dataset), -1, dtype=np.int64)
+        for idx in range(len(dataset)):
+            digest = None
+            # Only datasets reading image files have a size and modification time; shards already store the hashes
+            if hasattr(dataset, "get_sample_file"):
+                image_id, file_path = dataset.get_sample_file(idx)
+                stat = os.stat(file_path)
+                sizes[idx], mtimes[idx] = stat.st_size, stat.st_mtime_ns
+                digest = known.get((image_id, stat.st_size, stat.st_mtime_ns))
+            if digest is None:
+                image_id, digest = dataset.get_sample_key(idx)
+            ids.append(image_id)
+            hashes.append(digest)
+        return ids, hashes, sizes, mtimes
+
+    def build_store(self, dataset, store_dir):
+        """Build or refresh the feature store of a dataset.
+
+        Args:
+            dataset (FrogeryDataset or ShardedFrogeryDataset): The dataset to extract features from.
+            store_dir (str): Path to the directory of the store.
+
+        Returns:
+            FeatureStore: The up-to-date feature store.
+        """
+        try:
+            logging.info(f"Building feature store in '{store_dir}'")
+            os.makedirs(store_dir, exist_ok=True)
+            fingerprint = self.fingerprint()
+            previous = FeatureStore(store_dir) if FeatureStore.exists(store_dir) else None
+            ids, hashes, sizes, mtimes = self.__sample_keys(dataset, previous)
+            keys = [f"{image_id}:{digest}" for image_id, digest in zip(ids, hashes)]
+
+            if previous is not None and previous.fingerprint != fingerprint:
+                logging.info("Preprocessing settings or backbone weights changed, rebuilding the whole store")
+                previous = None
+            cached = {}
+            if previous is not None:
+                cached = {key: row for row, key in enumerate(previous.keys())}
+            missing = [idx for idx, key in enumerate(keys) if key not in cached]
+            logging.info(f"{len(keys) - len(missing)} cached and {len(missing)} new samples")
+            # Only features are reused; labels always come from the dataset, so ground truth corrections reach the store
+            labels = np.asarray(dataset.labels, dtype=np.float32)
+            if previous is not None and not missing and len(keys) == len(previous):
+                rows = [cached[key] for key in keys]
+                if np.array_equal(previous.labels[rows], labels):
+                    if np.array_equal(previous.sizes[rows], sizes) and np.array_equal(previous.mtimes[rows], mtimes):
+                        return previous
+                    logging.info("Files were touched without changing, updating their recorded modification times")
+                else:
+                    logging.info("Labels changed in the ground truth, rewriting the store with the cached features")
+
+            features_tmp = os.path.join(store_dir, FeatureStore.FEATURES_FILE + ".tmp")
+            features = np.lib.format.open_memmap(features_tmp, mode='w+', dtype=np.float32,
+                                                 shape=(len(keys), self.config.FEATURE_DIM))
+            for idx, key in enumerate(keys):
+                if key in cached:
+                    features[idx] = previous.features[cached[key]]
+
+            if missing:
+                # Every rank that builds a store needs all of its features, so the dataset is not sharded
+                loader = self.data_loader.make_loader(Subset(dataset, missing), shuffle=False,
+                                                      batch_size=self.config.BATCH_SIZE, distributed=False)
+                self.model.eval()
+                start = 0
+                with torch.inference_mode():
+                    for data in loader:
+                        batch_features = self.model.extract_features(data['image'].to(self.device))
+                        rows = missing[start:start + len(batch_features)]
+                        features[rows] = batch_features.cpu().numpy()
+                        start += len(batch_features)
+            features.flush()
+            del features
+
+            index_tmp = os.path.join(store_dir, "index.tmp.npz")
+            np.savez(index_tmp, ids=np.array(ids), hashes=np.array(hashes), labels=labels, sizes=sizes, mtimes=mtimes,
+                     fingerprint=np.array(fingerprint))
+            os.replace(features_tmp, os.path.join(store_dir, FeatureStore.FEATURES_FILE))
+            os.replace(index_tmp, os.path.join(store_dir, FeatureStore.INDEX_FILE))
+            logging.info(f"Feature store '{store_dir}' built successfully.")
+            return FeatureStore(store_dir)
+        except Exception as e:
+            error_message = str(e)
+            raise CustomException(error_message, sys)
+
+    def get_train_loader(self, batch_size):
+        """Get a data loader over the cached features of the training dataset.
+
+        Args:
+            batch_size (int): Batch size used for data loading.
+
+        Returns:
+            torch.utils.data.DataLoader: Data loader for the training features.
+        """
+        store = self.build_store(self.data_loader.get_train_dataset(), self.config.TRAIN_CACHE_DIR)
+        return torch.utils.data.DataLoader(store, batch_size=batch_size, sampler=make_sampler(store, shuffle=True),
+                                           generator=torch.Generator())
+
+    def get_test_loader(self, batch_size):
+        """Get a data loader over the cached features of the test dataset.
+
+        Args:
+            batch_size (int): Batch size used for data loading.
+
+        Returns:
+            torch.utils.data.DataLoader: Data loader for the test features.
+        """
+        store = self.build_store(self.data_loader.get_test_dataset(), self.config.TEST_CACHE_DIR)
+        return torch.utils.data.DataLoader(store, batch_size=batch_size, sampler=make_sampler(store, shuffle=False),
+                                           generator=torch.Generator())
@@ -0,0 +1,83 @@
+import io
+import numpy as np
+from PIL import Image
+from torchvision import transforms
+from src.components.image_transformers import Rescale
+
+# (height, width) the app and the bulk scorer resize documents to; JPEGs are decoded at a reduced resolution that still covers it
+INPUT_SIZE = (229, 229)
+# Image files the app and the bulk scorer accept, on their own or inside zip archives
+IMAGE_EXTENSIONS = (".jpeg", ".jpg", ".png")
+
+# JPEGs are decoded at no less than this multiple of the requested size, leaving the last 2x of the downscaling to
+# the caller's anti-aliased resize; decoding right at the requested size aliases fine periodic content such as text lines
+DRAFT_MARGIN = 2
+
+def open_image(source, size=None):
+    """Decode an image as RGB, letting JPEG decoding skip the resolution a later resize would throw away.
+
+    With `size`, JPEGs are decoded with DCT scaling (`PIL.Image.draft`) at 1/2, 1/4 or 1/8 of their resolution,
+    the smallest scale that still covers `DRAFT_MARGIN` times `size` in both dimensions. The caller's resize then
+    shrinks the image by less than a factor of four. Other formats are decoded at full resolution.
+
+    Args:
+        source (str, bytes or file object): Path, encoded bytes or readable binary file of the image.
+        size (int or tuple, optional): Smallest (height, width) the caller resizes the image to; an int applies to
+            both dimensions. None decodes at full resolution.
+
+    Returns:
+        PIL.Image.Image: The decoded RGB image.
+
+    Example:
+        >>> image = open_image('scan.jpg', (299, 299)).resize((299, 299))
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    image = Image.open(source)
+    if size is not None and image.format == "JPEG":
+        height, width = (size, size) if isinstance(size, int) else size
+        image.draft("RGB", (width * DRAFT_MARGIN, height * DRAFT_MARGIN))
+    return image.convert("RGB")
+
+
+def load_image(source, size=None):
+    """Decode an image into an RGB uint8 array of shape (height, width, 3), at reduced resolution if `size` allows.
+
+    See `open_image` for the arguments.
+    """
+    return np.asarray(open_image(source, size))
+
+
+def serving_transform(size=INPUT_SIZE):
+    """Resize a decoded image and convert it to a (3, height, width) float tensor in [0, 1], as the app does."""
+    return transforms.Compose([
+        transforms.Resize(size),
+        transforms.ToTensor(),
+    ])
+
+
+def decode_parity(files, size):
+    """Compare images decoded at reduced resolution with full-resolution decodes, after the same resize.
+
+    Both decodes are resized to `size` the way the training data is (`Rescale`), so the difference is what the
+    model sees change.
+
+    Args:
+        files (list): Image paths.
+        size (tuple): Output (height, width).
+
+    Returns:
+        dict: Mean and maximum absolute pixel difference (in [0, 1] units) and the mean per-image difference
+            of the worst image.
+    """
+    rescale = Rescale(tuple(size))
+    total, count, max_diff, worst_mean = 0., 0, 0., 0.
+    for file in files:
+        full = rescale({'image': load_image(file), 'label': 0})['image']
+        reduced = rescale({'image': load_image(file, size), 'label': 0})['image']
+        diff = np.abs(full - reduced)
+        total += diff.sum()
+        count += diff.size
+        max_diff = max(max_diff, float(diff.max()))
+        worst_mean = max(worst_mean, float(diff.mean()))
+    return {"mean_abs_diff": total / max(count, 1), "max_abs_diff": max_diff, "worst_image_mean_abs_diff": worst_mean}
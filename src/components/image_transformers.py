@@ -1,5 +1,9 @@
+import math
+import numpy as np
 import skimage
 import torch
+import torch.nn.functional as F
+from torch.utils.data import get_worker_info
 
 class Rescale:
     """Rescale the image and label to the specified output size.
@@ -48,7 +52,8 @@ class ToTensor:
     Converts the 'image' and 'label' values in the input dictionary to PyTorch
     Tensors. The 'image' value is transposed to match the format expected by
     PyTorch (C x H x W). The 'image' and 'label' values are then converted to
-    float Tensors.
+    float Tensors. uint8 images are scaled to [0, 1], matching the float
+    images produced by `Rescale`.
 
     Example:
         >>> import numpy as np
@@ -68,5 +73,82 @@ class ToTensor:
         # numpy image: H x W x C
         # torch image: C x H x W
         image = image.transpose((2, 0, 1))
+        if image.dtype == np.uint8:
+            return {'image': torch.from_numpy(image).float().div_(255),
+                    'label': torch.Tensor([label]).float()}
         return {'image': torch.from_numpy(image).float(),
-                'label': torch.Tensor([label]).float()}
\ No newline at end of file
+                'label': torch.Tensor([label]).float()}
+
+
+class ResizeCollate:
+    """Collate uint8 samples into a batch, resizing and normalizing the whole batch at once.
+
+    A replacement for `Rescale` and `ToTensor` plus the default collate function. Samples stay uint8 (H x W x C)
+    arrays until collation, so loader workers never hold float64 or per-sample float copies of a scan. Images of
+    the same size are converted into one float32 scratch buffer, reused across batches, and resized together by a
+    single antialiased bilinear `interpolate` call; the layout change to (N, C, H, W) happens in the same pass.
+    Images too large to share the scratch budget are converted and resized a few at a time.
+    The batch is normalized to [0, 1] in place. Images already at the output size are only converted.
+
+    In a loader worker the batch is allocated in shared memory, as the default collate function does, so passing
+    it to the main process copies nothing. The batch itself is not reused, since the main process still holds
+    it while the worker collates the next one.
+
+    Args:
+        output_size (tuple): Desired output size (new_height, new_width).
+        max_scratch_bytes (int, optional): Memory budget of the float32 scratch buffer.
+
+    Example:
+        >>> collate = ResizeCollate((299, 299))
+        >>> batch = collate([{'image': np.zeros((600, 400, 3), np.uint8), 'label': 1}])
+        >>> batch['image'].shape
+        torch.Size([1, 3, 299, 299])
+        >>> batch['label']
+        tensor([[1.]])
+    """
+
+    def __init__(self, output_size, max_scratch_bytes=16 * 1024 * 1024):
+        assert isinstance(output_size, tuple)
+        self.output_size = output_size
+        self.max_scratch_bytes = max_scratch_bytes
+        self._scratch = torch.empty(0)
+
+    def __scratch(self, shape):
+        numel = math.prod(shape)
+        if self._scratch.numel() < numel:
+            self._scratch = torch.empty(numel)
+        return self._scratch[:numel].view(shape)
+
+    @staticmethod
+    def __new_batch(shape):
+        if get_worker_info() is None:
+            return torch.empty(shape)
+        storage = torch.empty(0)._typed_storage()._new_shared(math.prod(shape))
+        return torch.empty(0).new(storage).view(shape)
+
+    def __call__(self, samples):
+        height, width = self.output_size
+        batch = self.__new_batch((len(samples), 3, height, width))
+        groups = {}
+        for idx, sample in enumerate(samples):
+            groups.setdefault(sample['image'].shape, []).append(idx)
+        for shape, indices in groups.items():
+            # Large scans are converted a few at a time, so the scratch buffer stays within its budget
+            chunk = max(1, self.max_scratch_bytes // (4 * math.prod(shape)))
+            for start in range(0, len(indices), chunk):
+                chunk_indices = indices[start:start + chunk]
+                images = self.__scratch((len(chunk_indices),) + shape)
+                # Converted straight from uint8 into the scratch buffer, through NumPy since samples may be read-only arrays
+                images_array = images.numpy()
+                for row, idx in enumerate(chunk_indices):
+                    images_array[row] = samples[idx]['image']
+                images = images.permute(0, 3, 1, 2)
+                if shape[:2] != (height, width):
+                    images = F.interpolate(images, size=(height, width), mode="bilinear", antialias=True, align_corners=False)
+                if len(chunk_indices) == len(samples):
+                    batch.copy_(images)
+                else:
+                    batch[chunk_indices] = images
+        batch.mul_(1 / 255)
+        labels = torch.tensor(np.array([sample['label'] for sample in samples], dtype=np.float32)).view(-1, 1)
+        return {'image': batch, 'label': labels}
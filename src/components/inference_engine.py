@@ -0,0 +1,173 @@
+from concurrent.futures import Future
+from dataclasses import dataclass
+import os
+import queue
+import threading
+import time
+import torch
+from src.components.metrics import MetricsRegistry
+from src.logger import logging
+
+@dataclass
+class BatchingConfig:
+    """Configuration class for server-side request batching.
+
+    All settings can be overridden with environment variables of the same name prefixed with `PREDICT_`.
+
+    Attributes:
+        MAX_BATCH_SIZE (int): Maximum number of requests scored in one forward pass.
+        MAX_WAIT_MS (float): Maximum time, in milliseconds, the first request of a batch waits for more requests.
+        BULK_BATCH_SIZE (int): Number of documents of a bulk request preprocessed and scored per step.
+
+    Example:
+        >>> config = BatchingConfig()
+    """
+
+    MAX_BATCH_SIZE: int = int(os.environ.get("PREDICT_MAX_BATCH_SIZE", 16))
+    MAX_WAIT_MS: float = float(os.environ.get("PREDICT_MAX_WAIT_MS", 5))
+    BULK_BATCH_SIZE: int = int(os.environ.get("PREDICT_BULK_BATCH_SIZE", 32))
+
+
+class EngineClosedError(RuntimeError):
+    """Raised when an image is submitted to an engine that is closed or closing."""
+
+
+class BatchingEngine:
+    """Dynamic micro-batching engine for model inference.
+
+    Callers submit single preprocessed images from any thread. A background thread collects the pending
+    images into one batch, until `max_batch_size` images are queued or the first one has waited
+    `max_wait_ms`, runs a single forward pass and hands every caller its own score. Once `close` is called,
+    new submissions raise `EngineClosedError`, while images already queued are still scored.
+
+    Args:
+        model (torch.nn.Module): Model in eval mode returning one score per image.
+        device (torch.device): Device the model runs on.
+        max_batch_size (int): Maximum number of images per forward pass.
+        max_wait_ms (float): Maximum time the first image of a batch waits for more images.
+        metrics (MetricsRegistry, optional): Registry the queue wait, model latency and batch size histograms are added to.
+
+    Example:
+        >>> engine = BatchingEngine(model, device, max_batch_size=16, max_wait_ms=5)
+        >>> score = engine.predict(torch.rand(3, 229, 229))
+        >>> engine.close()
+    """
+    def __init__(self, model, device, max_batch_size, max_wait_ms, metrics=None):
+        self.model = model
+        self.device = device
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        metrics = metrics or MetricsRegistry(enabled=False)
+        self.queue_wait_histogram = metrics.histogram("inference_queue_wait_seconds", "Time an image waits in the batching queue.")
+        self.model_histogram = metrics.histogram("inference_model_seconds", "Forward pass time of a batch.")
+        self.batch_size_histogram = metrics.histogram("inference_batch_size", "Number of images per forward pass.",
+                                                      buckets=tuple(2 ** i for i in range(max_batch_size.bit_length() + 1)))
+        metrics.gauge("inference_queue_depth", "Images waiting in the batching queue.", self._queue.qsize)
+        self._thread = threading.Thread(target=self.__run, name="batching-engine", daemon=True)
+        self._thread.start()
+
+    def submit(self, image):
+        """Queue an image for scoring.
+
+        Args:
+            image (torch.Tensor): Preprocessed image of shape (channels, height, width).
+
+        Returns:
+            concurrent.futures.Future: Future resolving to the score of the image.
+
+        Raises:
+            EngineClosedError: If the engine is closed.
+        """
+        future = Future()
+        # Checked under the lock, so no image can be queued behind the stop signal and never be scored
+        with self._lock:
+            if self._closed:
+                raise EngineClosedError("The inference engine is closed")
+            self._queue.put((image, future, time.perf_counter()))
+        return future
+
+    def predict(self, image):
+        """Score an image, blocking until its batch has run.
+
+        Args:
+            image (torch.Tensor): Preprocessed image of shape (channels, height, width).
+
+        Returns:
+            float: The score of the image.
+        """
+        return self.submit(image).result()
+
+    def predict_many(self, images):
+        """Score several images, blocking until all of them have run.
+
+        The images are queued together, so they fill whole batches alongside any concurrent requests.
+
+        Args:
+            images (list): Preprocessed images of shape (channels, height, width).
+
+        Returns:
+            list: The score of every image, in order.
+        """
+        futures = [self.submit(image) for image in images]
+        return [future.result() for future in futures]
+
+    def close(self):
+        """Stop the engine once the images queued so far have been scored."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def __collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get_nowait() if timeout <= 0 else self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                # Re-queue the stop signal so the loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def __run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = []
+            now = time.perf_counter()
+            for image, future, submitted in self.__collect(item):
+                if future.set_running_or_notify_cancel():
+                    self.queue_wait_histogram.observe(now - submitted)
+                    batch.append((image, future))
+            # Images of different shapes cannot share a tensor, so each shape runs as its own batch
+            by_shape = {}
+            for image, future in batch:
+                by_shape.setdefault(tuple(image.shape), []).append((image, future))
+            for group in by_shape.values():
+                self.__run_batch(group)
+
+    def __run_batch(self, batch):
+        try:
+            inputs = torch.stack([image for image, _ in batch]).to(self.device)
+            self.batch_size_histogram.observe(len(batch))
+            with self.model_histogram.time(), torch.no_grad():
+                outputs = self.model(inputs)
+                scores = outputs.view(-1).tolist()
+        except Exception as e:
+            logging.exception("Batched inference failed")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), score in zip(batch, scores):
+            future.set_result(score)
@@ -0,0 +1,279 @@
+from bisect import bisect_left
+from contextlib import nullcontext
+from dataclasses import dataclass
+import math
+import os
+import threading
+import time
+import torch
+
+# Latency buckets in seconds, from sub-millisecond preprocessing up to multi-second training steps
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Returned by every timer of a disabled registry, so turned-off instrumentation costs one attribute check
+NULL_TIMER = nullcontext()
+
+@dataclass
+class MetricsConfig:
+    """Configuration class for the service metrics.
+
+    Attributes:
+        ENABLED (bool): Record metrics and expose them on `/metrics`. Overridden by the `METRICS_ENABLED` environment variable.
+
+    Example:
+        >>> config = MetricsConfig()
+    """
+
+    ENABLED: bool = os.environ.get("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = ('{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+               for name, value in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels.
+
+    Args:
+        name (str): Metric name, conventionally ending in `_total`.
+        documentation (str): Help text.
+        labelnames (tuple, optional): Names of the labels every increment is tagged with.
+        enabled (bool, optional): Whether increments are recorded.
+    """
+    def __init__(self, name, documentation, labelnames=(), enabled=True):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.enabled = enabled
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = ["# HELP {} {}".format(self.name, self.documentation), "# TYPE {} counter".format(self.name)]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append("{}{} {}".format(self.name, _format_labels(self.labelnames, key), _format_value(value)))
+        return lines
+
+
+class Gauge:
+    """Gauge whose value is read from a callback when the metrics are rendered.
+
+    Args:
+        name (str): Metric name.
+        documentation (str): Help text.
+        function (callable): Returns the current value.
+    """
+    def __init__(self, name, documentation, function):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+
+    def render(self):
+        return ["# HELP {} {}".format(self.name, self.documentation), "# TYPE {} gauge".format(self.name),
+                "{} {}".format(self.name, _format_value(self.function()))]
+
+
+class _HistogramTimer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Histogram:
+    """Cumulative histogram of observed values, optionally split by labels.
+
+    Args:
+        name (str): Metric name.
+        documentation (str): Help text.
+        labelnames (tuple, optional): Names of the labels every observation is tagged with.
+        buckets (tuple, optional): Increasing upper bounds of the buckets; a `+Inf` bucket is always added.
+        enabled (bool, optional): Whether observations are recorded.
+
+    Example:
+        >>> histogram = Histogram("decode_seconds", "Image decoding time.")
+        >>> with histogram.time():
+        ...     image = Image.open(file).convert("RGB")
+    """
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, enabled=True):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.enabled = enabled
+        # Per label values: [non-cumulative bucket counts (last one is +Inf), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        if not self.enabled:
+            return
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0., 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels):
+        """Context manager observing the time spent in its block."""
+        if not self.enabled:
+            return NULL_TIMER
+        return _HistogramTimer(self, labels)
+
+    def totals(self):
+        """Get the sum and count of the observations of every label value.
+
+        Returns:
+            dict: Maps label values (tuple) to (sum, count).
+        """
+        with self._lock:
+            return {key: (entry[1], entry[2]) for key, entry in self._values.items()}
+
+    def render(self):
+        lines = ["# HELP {} {}".format(self.name, self.documentation), "# TYPE {} histogram".format(self.name)]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                    cumulative += bucket_count
+                    lines.append("{}_bucket{} {}".format(self.name, _format_labels(self.labelnames, key, [("le", _format_value(bound))]), cumulative))
+                labels = _format_labels(self.labelnames, key)
+                lines.append("{}_sum{} {}".format(self.name, labels, _format_value(total)))
+                lines.append("{}_count{} {}".format(self.name, labels, count))
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in the Prometheus text exposition format.
+
+    Metrics created by a disabled registry record nothing and their timers are shared no-op context managers.
+
+    Args:
+        enabled (bool, optional): Whether the metrics record anything.
+
+    Example:
+        >>> registry = MetricsRegistry()
+        >>> requests = registry.counter("http_requests_total", "Requests served.", ["path"])
+        >>> requests.inc(path="/predict")
+        >>> text = registry.render()
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._metrics = {}
+
+    def __register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None and not isinstance(metric, Gauge):
+            # Components re-created at runtime (e.g. a new inference engine) keep recording into the same metric
+            if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                raise ValueError(f"Metric '{metric.name}' is already registered with a different type or labels")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.__register(Counter(name, documentation, labelnames, self.enabled))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.__register(Histogram(name, documentation, labelnames, buckets, self.enabled))
+
+    def gauge(self, name, documentation, function):
+        return self.__register(Gauge(name, documentation, function))
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics, one sample per line.
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """Times the stages of a training step into a labelled histogram.
+
+    CUDA kernels run asynchronously, so when enabled on a CUDA device the timer synchronizes at every stage
+    boundary; the stages are then measured accurately at the cost of some overlap between them. When disabled,
+    `stage` returns a shared no-op context manager and nothing is synchronized.
+
+    Args:
+        histogram (Histogram): Histogram with a 'stage' label.
+        device (torch.device): Device the stages run on.
+
+    Example:
+        >>> timer = StageTimer(registry.histogram("train_stage_seconds", "Training step stages.", ["stage"]), device)
+        >>> with timer.stage("forward"):
+        ...     outputs = model(inputs)
+    """
+    def __init__(self, histogram, device):
+        self.histogram = histogram
+        self.device = device
+        self.cuda = device.type == "cuda"
+
+    @property
+    def enabled(self):
+        return self.histogram.enabled
+
+    def sync(self):
+        """Wait for the kernels queued on the device, if it runs asynchronously."""
+        if self.cuda:
+            torch.cuda.synchronize(self.device)
+
+    def stage(self, name):
+        if not self.histogram.enabled:
+            return NULL_TIMER
+        return _StageContext(self, name)
+
+    def observe(self, name, seconds):
+        self.histogram.observe(seconds, stage=name)
+
+
+class _StageContext:
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.timer.sync()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timer.sync()
+        self.timer.observe(self.name, time.perf_counter() - self.start)
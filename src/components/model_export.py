@@ -0,0 +1,75 @@
+from dataclasses import dataclass
+from datetime import datetime
+import os
+import sys
+import torch
+from src.logger import logging
+from src.exception import CustomException
+from src.components.model_registry import ModelRegistry
+
+@dataclass
+class ExportConfig:
+    """Configuration class for the TorchScript serving artifact.
+
+    Attributes:
+        SAVE_MODEL_PATH (str): Directory the TorchScript artifacts are written to.
+        EXAMPLE_SIZE (int): Height and width of the example input used to trace the model.
+        TOLERANCE (float): Maximum absolute score difference allowed between the artifact and the eager model.
+
+    Example:
+        >>> config = ExportConfig()
+    """
+
+    SAVE_MODEL_PATH: str = os.path.join(os.getcwd(), "artifacts", "model_torchscript")
+    EXAMPLE_SIZE: int = 299
+    TOLERANCE: float = 1e-3
+
+
+class ModelExporter:
+    """Class for exporting a trained `InceptBaseModel` as a frozen TorchScript artifact.
+
+    The eval-mode model is traced and frozen: parameters become constants and BatchNorm layers are folded into the
+    preceding convolutions. The artifact contains the trained head, so serving it needs neither the model classes
+    nor the pretrained ImageNet weights. Machine-specific passes (`torch.jit.optimize_for_inference`) are left to
+    load time, since their MKLDNN constants cannot be serialized.
+
+    Args:
+        model (InceptBaseModel): The trained model.
+
+    Example:
+        >>> exporter = ModelExporter(model)
+        >>> model_path = exporter.export()
+    """
+    def __init__(self, model):
+        self.config = ExportConfig()
+        self.model = model.cpu().eval()
+
+    def export(self):
+        """Export the model, check it scores like the eager model and promote it in the model registry.
+
+        Returns:
+            str: Path of the saved TorchScript model.
+
+        Raises:
+            CustomException: If the export fails or the artifact's scores drift from the eager model.
+        """
+        try:
+            example = torch.rand(2, 3, self.config.EXAMPLE_SIZE, self.config.EXAMPLE_SIZE)
+            with torch.no_grad():
+                traced = torch.jit.trace(self.model, example)
+                frozen = torch.jit.freeze(traced)
+                drift = (frozen(example) - self.model(example)).abs().max().item()
+            if drift > self.config.TOLERANCE:
+                raise ValueError(f"Exported model differs from the eager model by {drift}")
+
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            os.makedirs(self.config.SAVE_MODEL_PATH, exist_ok=True)
+            model_path = os.path.join(self.config.SAVE_MODEL_PATH, 'model_torchscript_{}.pt'.format(timestamp))
+            torch.jit.save(frozen, model_path)
+            logging.info(f"TorchScript model saved to '{model_path}' (max score difference {drift})")
+            ModelRegistry(self.config.SAVE_MODEL_PATH).register(model_path, {'max_abs_score_diff': drift}, "torchscript",
+                                                                promote=True)
+            return model_path
+        except Exception as e:
+            error_message = str(e)
+            raise CustomException(error_message, sys)
@@ -0,0 +1,186 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+import copy
+import os
+import sys
+import time
+import torch
+import torch.nn as nn
+import torchvision
+from src.logger import logging
+from src.exception import CustomException
+from src.components.model_registry import ModelRegistry
+
+def default_quantization_backend():
+    """Quantized kernel backend: 'x86' where this build of torch supports it, 'fbgemm' otherwise."""
+    return "x86" if "x86" in torch.backends.quantized.supported_engines else "fbgemm"
+
+@dataclass
+class QuantizationConfig:
+    """Configuration class for int8 post-training quantization.
+
+    Attributes:
+        SAVE_MODEL_PATH (str): Directory the int8 TorchScript artifacts and their accuracy reports are written to.
+        CALIBRATION_BATCHES (int): Number of training batches used to calibrate the activation observers.
+        BACKEND (str): Quantized kernel backend ('x86' or 'fbgemm').
+
+    Example:
+        >>> config = QuantizationConfig()
+    """
+
+    SAVE_MODEL_PATH: str = os.path.join(os.getcwd(), "artifacts", "model_int8")
+    CALIBRATION_BATCHES: int = 10
+    BACKEND: str = field(default_factory=default_quantization_backend)
+
+
+class QuantizedInceptModel(nn.Module):
+    """Int8 version of `InceptBaseModel`.
+
+    The Inception v3 backbone is statically quantized, its output features are dequantized and fed to
+    the dynamically quantized classifier head.
+
+    Args:
+        backbone (torch.nn.Module): Quantized backbone returning float features of shape (batch_size, 2048).
+        head (torch.nn.Module): Dynamically quantized classifier head.
+    """
+
+    def __init__(self, backbone, head):
+        super(QuantizedInceptModel, self).__init__()
+        self.backbone = backbone
+        self.head = head
+
+    def forward(self, inputs):
+        return self.head(self.backbone(inputs))
+
+
+class ModelQuantizer:
+    """Class for producing an int8 CPU inference artifact from a trained `InceptBaseModel`.
+
+    The backbone is rebuilt as torchvision's quantizable Inception v3, its conv/bn/relu blocks are fused and it is
+    statically quantized after calibrating on a sample of the training set. The `fc` head is dynamically quantized.
+
+    Args:
+        model (InceptBaseModel): The trained float32 model.
+        train_loader (torch.utils.data.DataLoader): Loader the calibration batches are drawn from.
+        test_loader (torch.utils.data.DataLoader): Loader the int8 model is evaluated on.
+
+    Example:
+        >>> quantizer = ModelQuantizer(model, train_loader, test_loader)
+        >>> model_path = quantizer.quantize_and_export()
+    """
+    def __init__(self, model, train_loader, test_loader):
+        self.config = QuantizationConfig()
+        self.model = model.cpu().eval()
+        self.train_loader = train_loader
+        self.test_loader = test_loader
+
+    def __build_backbone(self):
+        backbone = torchvision.models.quantization.inception_v3(weights=None, quantize=False, aux_logits=True,
+                                                               transform_input=True, init_weights=False)
+        backbone.AuxLogits = None
+        backbone.aux_logits = False
+        state_dict = {name: value for name, value in self.model.base_model.state_dict().items()
+                      if not name.startswith(("fc.", "AuxLogits."))}
+        backbone.fc = nn.Identity()
+        backbone.load_state_dict(state_dict)
+        return backbone.eval()
+
+    def quantize(self):
+        """Quantize the model.
+
+        Returns:
+            QuantizedInceptModel: The int8 model.
+        """
+        torch.backends.quantized.engine = self.config.BACKEND
+        backbone = self.__build_backbone()
+        backbone.fuse_model(is_qat=False)
+        backbone.qconfig = torch.ao.quantization.get_default_qconfig(self.config.BACKEND)
+        torch.ao.quantization.prepare(backbone, inplace=True)
+
+        logging.info(f"Calibrating on {self.config.CALIBRATION_BATCHES} training batches")
+        with torch.inference_mode():
+            for i, data in enumerate(self.train_loader):
+                if i >= self.config.CALIBRATION_BATCHES:
+                    break
+                backbone(data['image'])
+        torch.ao.quantization.convert(backbone, inplace=True)
+
+        head = torch.ao.quantization.quantize_dynamic(copy.deepcopy(self.model.base_model.fc), {nn.Linear}, dtype=torch.qint8)
+        return QuantizedInceptModel(backbone, head).eval()
+
+    def evaluate(self, quantized_model):
+        """Compare the int8 model with the float32 model on the test split.
+
+        Args:
+            quantized_model (torch.nn.Module): The int8 model.
+
+        Returns:
+            dict: Accuracy of both models, score differences, prediction agreement and inference time.
+        """
+        correct_float, correct_int8, agree, total = 0, 0, 0, 0
+        max_diff, sum_diff = 0., 0.
+        float_time, int8_time = 0., 0.
+        with torch.inference_mode():
+            for data in self.test_loader:
+                inputs, labels = data['image'], data['label']
+                start = time.perf_counter()
+                float_outputs = self.model(inputs)
+                float_time += time.perf_counter() - start
+                start = time.perf_counter()
+                int8_outputs = quantized_model(inputs)
+                int8_time += time.perf_counter() - start
+                float_pred, int8_pred = (float_outputs > 0.5).float(), (int8_outputs > 0.5).float()
+                correct_float += (float_pred == labels).sum().item()
+                correct_int8 += (int8_pred == labels).sum().item()
+                agree += (float_pred == int8_pred).sum().item()
+                diff = (float_outputs - int8_outputs).abs()
+                max_diff = max(max_diff, diff.max().item())
+                sum_diff += diff.sum().item()
+                total += len(labels)
+        return {
+            'accuracy_float32': 100 * correct_float / total,
+            'accuracy_int8': 100 * correct_int8 / total,
+            'prediction_agreement': 100 * agree / total,
+            'mean_abs_score_diff': sum_diff / total,
+            'max_abs_score_diff': max_diff,
+            'seconds_float32': float_time,
+            'seconds_int8': int8_time,
+        }
+
+    def quantize_and_export(self):
+        """Quantize the model, evaluate it and save it with its accuracy report.
+
+        The int8 model is saved as TorchScript, so it loads without the model classes or pretrained weights. It is
+        registered and promoted in the model registry of `SAVE_MODEL_PATH`.
+
+        Returns:
+            str: Path of the saved int8 model.
+
+        Raises:
+            CustomException: If an error occurs during quantization or export.
+        """
+        try:
+            quantized_model = self.quantize()
+            report = self.evaluate(quantized_model)
+            logging.info(f"Int8 accuracy report: {report}")
+
+            example = next(iter(self.test_loader))['image'][:1]
+            scripted = torch.jit.trace(quantized_model, example)
+
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            os.makedirs(self.config.SAVE_MODEL_PATH, exist_ok=True)
+            model_path = os.path.join(self.config.SAVE_MODEL_PATH, 'model_int8_{}.pt'.format(timestamp))
+            report_file = os.path.join(self.config.SAVE_MODEL_PATH, 'report_int8_{}.txt'.format(timestamp))
+            with open(report_file, 'w') as f:
+                f.write('Backend {}\n'.format(self.config.BACKEND))
+                f.write('Accuracy float32 {} Int8 {}\n'.format(report['accuracy_float32'], report['accuracy_int8']))
+                f.write('Prediction agreement {}\n'.format(report['prediction_agreement']))
+                f.write('Score difference mean {} max {}\n'.format(report['mean_abs_score_diff'], report['max_abs_score_diff']))
+                f.write('Test time float32 {}s Int8 {}s'.format(report['seconds_float32'], report['seconds_int8']))
+            torch.jit.save(scripted, model_path)
+            logging.info(f"Int8 model saved to '{model_path}'")
+            ModelRegistry(self.config.SAVE_MODEL_PATH).register(model_path, report, "int8", promote=True)
+            return model_path
+        except Exception as e:
+            error_message = str(e)
+            raise CustomException(error_message, sys)
@@ -0,0 +1,154 @@
+from dataclasses import dataclass
+from datetime import datetime
+import json
+import os
+import sys
+from src.logger import logging
+from src.exception import CustomException
+
+REGISTRY_FILE = "registry.json"
+
+@dataclass
+class RegistryConfig:
+    """Configuration class for model registries.
+
+    Attributes:
+        POLL_SECONDS (float): How often the app checks the registry for a newly promoted model. Overridden by the
+            `MODEL_REGISTRY_POLL_SECONDS` environment variable; 0 disables hot swapping.
+
+    Example:
+        >>> config = RegistryConfig()
+    """
+
+    POLL_SECONDS: float = float(os.environ.get("MODEL_REGISTRY_POLL_SECONDS", 5))
+
+
+class ModelRegistry:
+    """Manifest of the model artifacts of a directory, with their metrics and the promoted one.
+
+    The manifest is a `registry.json` file next to the artifacts. Every entry records the artifact file, its
+    format, its metrics and when it was registered. Exactly one entry, the current one, is promoted; it is the
+    model the app serves. The manifest is rewritten atomically, so readers never see a partial file.
+
+    Args:
+        model_dir (str): Directory holding the model artifacts and the manifest.
+
+    Example:
+        >>> registry = ModelRegistry('artifacts/model')
+        >>> registry.register('artifacts/model/model_20230601_120000_3', {'test_loss': 0.21}, promote=True)
+        >>> registry.current()['file']
+        'model_20230601_120000_3'
+    """
+    def __init__(self, model_dir):
+        self.model_dir = model_dir
+        self.registry_file = os.path.join(model_dir, REGISTRY_FILE)
+
+    def exists(self):
+        return os.path.exists(self.registry_file)
+
+    def read(self):
+        """Read the manifest.
+
+        Returns:
+            dict: The 'models' entries, oldest first, and the 'current' version (None when nothing is promoted).
+        """
+        if not self.exists():
+            return {"models": [], "current": None}
+        with open(self.registry_file) as f:
+            return json.load(f)
+
+    def __write(self, manifest):
+        os.makedirs(self.model_dir, exist_ok=True)
+        tmp_file = os.path.join(self.model_dir, ".{}.tmp".format(REGISTRY_FILE))
+        with open(tmp_file, "w") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.registry_file)
+
+    def fingerprint(self):
+        """Cheap change detector of the manifest: its modification time and size, or None if it does not exist."""
+        try:
+            stat = os.stat(self.registry_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def register(self, file_path, metrics=None, model_format="float", promote=False):
+        """Add a model artifact to the manifest.
+
+        Args:
+            file_path (str): Path of the artifact, inside the registry directory.
+            metrics (dict, optional): Evaluation metrics of the model.
+            model_format (str, optional): Format of the artifact ('float', 'int8' or 'torchscript').
+            promote (bool, optional): Make it the current model.
+
+        Returns:
+            str: The version of the model, i.e. its file name.
+
+        Raises:
+            CustomException: If the artifact does not exist or the manifest cannot be updated.
+        """
+        try:
+            if not os.path.isfile(file_path):
+                raise FileNotFoundError(f"Model artifact '{file_path}' does not exist")
+            version = os.path.basename(file_path)
+            manifest = self.read()
+            manifest["models"] = [entry for entry in manifest["models"] if entry["version"] != version]
+            manifest["models"].append({
+                "version": version,
+                "file": version,
+                "format": model_format,
+                "metrics": metrics or {},
+                "registered_at": datetime.now().isoformat(timespec="seconds"),
+                "promoted": False,
+            })
+            self.__write(manifest)
+            logging.info(f"Registered model '{version}' in '{self.registry_file}'")
+            if promote:
+                self.promote(version)
+            return version
+        except CustomException:
+            raise
+        except Exception as e:
+            error_message = str(e)
+            raise CustomException(error_message, sys)
+
+    def promote(self, version):
+        """Make a registered model the current one.
+
+        Args:
+            version (str): Version of the model.
+
+        Raises:
+            CustomException: If the version is not registered or the manifest cannot be updated.
+        """
+        try:
+            manifest = self.read()
+            if not any(entry["version"] == version for entry in manifest["models"]):
+                raise ValueError(f"Model '{version}' is not registered in '{self.registry_file}'")
+            for entry in manifest["models"]:
+                entry["promoted"] = entry["version"] == version
+            manifest["current"] = version
+            self.__write(manifest)
+            logging.info(f"Promoted model '{version}'")
+        except Exception as e:
+            error_message = str(e)
+            raise CustomException(error_message, sys)
+
+    def get(self, version):
+        """Get the entry of a model, or None if the version is not registered."""
+        for entry in self.read()["models"]:
+            if entry["version"] == version:
+                return entry
+        return None
+
+    def current(self):
+        """Get the entry of the current model, or None when no model is promoted."""
+        current = self.read()["current"]
+        return self.get(current) if current else None
+
+    def current_path(self):
+        """Get the path of the current model's artifact, or None when no model is promoted."""
+        entry = self.current()
+        return os.path.join(self.model_dir, entry["file"]) if entry else None
@@ -1,9 +1,23 @@
+from contextlib import nullcontext
 from datetime import datetime
+import math
+import time
 from src.logger import logging
+from src.components.metrics import MetricsRegistry, StageTimer
+from src.components.distributed import (all_gather_object, all_reduce_gradients, all_reduce_sum, broadcast_state,
+                                        get_rank, get_world_size, is_distributed, is_main_process)
+from src.components.checkpointing import CheckpointManager, get_rng_state, save_atomic, set_rng_state
+from src.components.model_registry import ModelRegistry
+from src.components.models_architecture import build_head
+from dataclasses import asdict
+import copy
+import json
 import torch
 import os
 class ModelTrainer:
-    def __init__(self, model, train_loader, test_loader,  loss_fn, optimizer, device, batch_size):
+    def __init__(self, model, train_loader, test_loader,  loss_fn, optimizer, device, batch_size, head_only=False,
+                 precision="fp32", channels_last=False, compile_model=False, fast_path_tolerance=0.05, time_stages=False,
+                 log_interval=10, checkpoint_manager=None, checkpoint_every=0):
         self.model = model
         self.train_loader = train_loader
         self.test_loader = test_loader
@@ -11,60 +25,433 @@ class ModelTrainer:
         self.optimizer = optimizer
         self.device = device
         self.batch_size = batch_size
+        # When True the loaders yield cached backbone 'features' (see FeatureCache) and only the head runs
+        self.head_only = head_only
+        # Opt-in fast path: bf16 autocast, channels_last memory format and a torch.compile'd forward pass.
+        # It is validated against the eager float32 loss before training starts (see __setup_fast_path).
+        self.precision = precision
+        self.channels_last = channels_last
+        self.compile_model = compile_model
+        self.fast_path_tolerance = fast_path_tolerance
+        self.forward_model = model
+        # In distributed training (see src/components/distributed.py) only these gradients are all-reduced
+        self.trainable_parameters = [parameter for parameter in model.parameters() if parameter.requires_grad]
+        # Loss and accuracy stay on the device; they are read back, which waits for the device, every log_interval batches
+        self.log_interval = max(1, log_interval)
+        # Resumable checkpoints, written in the background at every epoch end and every checkpoint_every batches
+        self.checkpoint_manager = checkpoint_manager
+        self.checkpoint_every = checkpoint_every
+        self.timestamp = None
+        # Opt-in per-stage timing of the training step; when off the stage timers are no-ops
+        self.metrics = MetricsRegistry(enabled=time_stages)
+        self.stage_timer = StageTimer(self.metrics.histogram(
+            "train_stage_seconds", "Time spent in each stage of a training step.", ["stage"]), device)
+
+    def __autocast(self):
+        if self.precision == "bf16":
+            return torch.autocast(device_type=self.device.type, dtype=torch.bfloat16)
+        return nullcontext()
+
+    def __predict(self, data):
+        with self.__autocast():
+            if self.head_only:
+                inputs = data['features'].to(self.device)
+                outputs = self.model.classify(inputs)
+            else:
+                inputs = data['image'].to(self.device)
+                if self.channels_last:
+                    inputs = inputs.contiguous(memory_format=torch.channels_last)
+                outputs = self.forward_model(inputs)
+                if self.model.training:
+                    outputs = outputs.logits
+        # The loss is always computed in float32
+        return outputs.float()
+
+    def __disable_fast_path(self):
+        self.precision = "fp32"
+        if self.channels_last:
+            self.model.to(memory_format=torch.contiguous_format)
+        self.channels_last = False
+        self.compile_model = False
+        self.forward_model = self.model
+
+    def __eval_loss(self, data):
+        self.model.train(False)
+        with torch.no_grad():
+            return self.loss_fn(self.__predict(data), data['label'].to(self.device)).item()
+
+    def __setup_fast_path(self):
+        if self.precision == "fp32" and not self.channels_last and not self.compile_model:
+            return
+        data = next(iter(self.train_loader))
+        fast_options = dict(precision=self.precision, channels_last=self.channels_last, compile_model=self.compile_model)
+        self.precision, self.channels_last = "fp32", False
+        eager_loss = self.__eval_loss(data)
+        self.precision, self.channels_last = fast_options['precision'], fast_options['channels_last']
+
+        if self.channels_last:
+            self.model.to(memory_format=torch.channels_last)
+        if self.compile_model and not self.head_only:
+            try:
+                self.forward_model = torch.compile(self.model)
+                # Compile the training graph too, restoring the BatchNorm statistics the extra pass updates
+                buffers = {name: buffer.clone() for name, buffer in self.model.named_buffers()}
+                self.model.train(True)
+                self.loss_fn(self.__predict(data), data['label'].to(self.device)).backward()
+                self.optimizer.zero_grad()
+                with torch.no_grad():
+                    for name, buffer in self.model.named_buffers():
+                        buffer.copy_(buffers[name])
+                self.__eval_loss(data)
+            except Exception as e:
+                logging.warning(f"torch.compile failed, falling back to the eager model: {e}")
+                self.compile_model = False
+                self.forward_model = self.model
+
+        fast_loss = self.__eval_loss(data)
+        if math.isclose(fast_loss, eager_loss, rel_tol=self.fast_path_tolerance, abs_tol=self.fast_path_tolerance):
+            logging.info(f"Fast path enabled (precision={self.precision}, channels_last={self.channels_last}, "
+                         f"compile={self.compile_model}): loss {fast_loss} vs eager {eager_loss}")
+        else:
+            logging.warning(f"Fast path loss {fast_loss} differs from eager float32 loss {eager_loss}, "
+                            f"training in eager float32 instead")
+            self.__disable_fast_path()
     
-    def __train_one_epoch(self, train_data_len):
-        running_loss = 0.
-        last_loss = 0.
-        total_batch = train_data_len// self.batch_size
-        correct = 0
-        for i, data in enumerate(self.train_loader):
-            inputs, labels = data['image'].to(self.device), data['label'].to(self.device)
-            self.optimizer.zero_grad()
-            outputs = self.model(inputs)
-            loss = self.loss_fn(outputs.logits, labels)
-            loss.backward()
-            self.optimizer.step()
-            outputs = (outputs.logits>0.5).float()
-            correct += (outputs == labels).float().sum()
-            running_loss += loss.item()
-            if i % 1 == 0:
-                last_loss = running_loss 
-                logging.info(f'batch {i+1}/{total_batch + 1} loss: {last_loss}')
-                running_loss = 0.
-        accuracy = 100 * correct / train_data_len
+    def __to_device(self, data):
+        return {key: value.to(self.device, non_blocking=True) for key, value in data.items()}
+
+    def __log_epoch_summary(self, num_images, seconds, stage_totals_before):
+        logging.info(f'{num_images} images in {seconds:.1f}s: {num_images / seconds:.1f} images/sec')
+        if not self.stage_timer.enabled:
+            return
+        summary = []
+        for (stage,), (total, count) in self.stage_timer.histogram.totals().items():
+            total -= stage_totals_before.get((stage,), (0., 0))[0]
+            summary.append(f'{stage} {total:.2f}s ({100 * total / seconds:.0f}%)')
+        logging.info('Stage times: ' + ', '.join(summary))
+
+    def __training_state(self, epoch, batch, best_test_loss, progress):
+        # Collective on every rank; the state of every rank's random generators is kept
+        rng_states = all_gather_object(get_rng_state())
+        sampler = self.train_loader.sampler
+        return {
+            'model': self.model.state_dict(),
+            'optimizer': self.optimizer.state_dict(),
+            'epoch': epoch,
+            'batch': batch,
+            'best_test_loss': best_test_loss,
+            'timestamp': self.timestamp,
+            'progress': progress,
+            'sampler': {'seed': getattr(sampler, 'seed', None), 'epoch': epoch, 'start': batch * self.train_loader.batch_size},
+            'rng': rng_states,
+        }
+
+    def __save_checkpoint(self, epoch, batch, best_test_loss, progress, is_best=False):
+        if self.checkpoint_manager is None:
+            return
+        state = self.__training_state(epoch, batch, best_test_loss, progress)
+        if is_main_process():
+            self.checkpoint_manager.save_checkpoint(state, epoch, batch, is_best)
+
+    def __restore(self, state):
+        self.model.load_state_dict(state['model'])
+        self.optimizer.load_state_dict(state['optimizer'])
+        self.timestamp = state['timestamp']
+        # The shuffling seed of the interrupted run; its epoch is set at the start of every epoch
+        sampler = self.train_loader.sampler
+        if state['sampler']['seed'] is not None and hasattr(sampler, 'seed'):
+            sampler.seed = state['sampler']['seed']
+        logging.info(f"Resuming training at epoch {state['epoch'] + 1}, batch {state['batch']}")
+        return state['epoch'], state['batch'], state['sampler']['start'], state['best_test_loss'], state['progress']
+
+    def __train_one_epoch(self, epoch, best_test_loss, start_batch=0, progress=None):
+        running_loss = torch.zeros((), device=self.device)
+        running_batches = 0
+        # Counts of the batches trained before a resume, summed over all ranks; the counters below are this rank's
+        progress = progress or {'correct': 0., 'images': 0, 'last_loss': 0.}
+        last_loss = progress['last_loss']
+        total_batch = start_batch + len(self.train_loader)
+        correct = torch.zeros((), device=self.device)
+        timer = self.stage_timer
+        stage_totals_before = timer.histogram.totals()
+        epoch_start = time.perf_counter()
+        num_images = 0
+        wait_start = time.perf_counter()
+        i = start_batch - 1
+        for i, data in enumerate(self.train_loader, start=start_batch):
+            if timer.enabled:
+                timer.observe("data_wait", time.perf_counter() - wait_start)
+            with timer.stage("transfer"):
+                data = self.__to_device(data)
+            labels = data['label']
+            self.optimizer.zero_grad(set_to_none=True)
+            with timer.stage("forward"):
+                outputs = self.__predict(data)
+                loss = self.loss_fn(outputs, labels)
+            with timer.stage("backward"):
+                loss.backward()
+            if is_distributed():
+                with timer.stage("allreduce"):
+                    all_reduce_gradients(self.trainable_parameters)
+            with timer.stage("optimizer"):
+                self.optimizer.step()
+            with torch.no_grad():
+                correct += ((outputs > 0.5).float() == labels).sum()
+                running_loss += loss.detach()
+            running_batches += 1
+            num_images += len(labels)
+            if (i + 1) % self.log_interval == 0:
+                last_loss = all_reduce_sum(running_loss).item() / (running_batches * get_world_size())
+                logging.info(f'batch {i+1}/{total_batch} loss: {last_loss}')
+                running_loss.zero_()
+                running_batches = 0
+            if (self.checkpoint_manager is not None and self.checkpoint_every and (i + 1) % self.checkpoint_every == 0
+                    and i + 1 < total_batch):
+                # Checkpoints hold the counts of every rank, so a resume with any number of ranks adds them once
+                counts = all_reduce_sum(torch.tensor([correct.item(), num_images], dtype=torch.float64))
+                self.__save_checkpoint(epoch, i + 1, best_test_loss, {'correct': progress['correct'] + counts[0].item(),
+                                                                      'images': progress['images'] + int(counts[1].item()),
+                                                                      'last_loss': last_loss})
+            wait_start = time.perf_counter()
+        if running_batches:
+            last_loss = all_reduce_sum(running_loss).item() / (running_batches * get_world_size())
+            logging.info(f'batch {i+1}/{total_batch} loss: {last_loss}')
+        self.__log_epoch_summary(num_images, time.perf_counter() - epoch_start, stage_totals_before)
+        # In distributed training every rank trained on its own shard, padded by the sampler to equal sizes
+        counts = all_reduce_sum(torch.tensor([correct.item(), num_images], dtype=torch.float64))
+        accuracy = 100 * (progress['correct'] + counts[0].item()) / max(progress['images'] + counts[1].item(), 1)
         return last_loss, accuracy
-    
-    def train_model(self, epochs, save_model_path):
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    def __evaluate(self):
+        self.model.train(False)
+        running_test_loss = torch.zeros((), device=self.device)
+        correct_test = torch.zeros((), device=self.device)
+        num_batches = 0
+        # No autograd state is recorded, so memory stays flat across the test set
+        with torch.inference_mode():
+            for t_data in self.test_loader:
+                t_data = self.__to_device(t_data)
+                t_labels = t_data['label']
+                t_outputs = self.__predict(t_data)
+                running_test_loss += self.loss_fn(t_outputs, t_labels)
+                correct_test += ((t_outputs > 0.5).float() == t_labels).sum()
+                num_batches += 1
+        if is_distributed():
+            totals = all_reduce_sum(torch.tensor([running_test_loss.item(), num_batches, correct_test.item(),
+                                                  len(self.test_loader.sampler)], dtype=torch.float64))
+            return totals[0].item() / max(totals[1].item(), 1), 100 * totals[2].item() / totals[3].item()
+        avg_test_loss = running_test_loss.item() / max(num_batches, 1)
+        test_accuracy = 100 * correct_test.item() / len(self.test_loader.dataset)
+        return avg_test_loss, test_accuracy
+
+    def train_model(self, epochs, save_model_path, resume_from=None):
+        """Train the model, keeping the checkpoint with the lowest test loss in `save_model_path`.
+
+        Every improved model is registered and promoted in the model registry of `save_model_path` as soon as it
+        is written, so a running app swaps to it while training goes on.
+
+        Args:
+            epochs (int): Total number of epochs, including those of a resumed run.
+            save_model_path (str): Directory the best model weights and their reports are written to.
+            resume_from (str, optional): Checkpoint to continue from, written by the `checkpoint_manager`.
+        """
+        self.timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         best_test_loss = 1_000_000.
+        start_epoch, start_batch, start_sample, progress = 0, 0, 0, None
+        registry = ModelRegistry(save_model_path)
+        state = CheckpointManager.load(resume_from) if resume_from else None
+        if state is not None:
+            start_epoch, start_batch, start_sample, best_test_loss, progress = self.__restore(state)
+        if self.checkpoint_manager is not None:
+            # Checkpoints go to the run's own subdirectory; a resumed run keeps its original timestamp
+            self.checkpoint_manager.set_run(self.timestamp)
+        # Every rank starts from the weights of rank 0
+        broadcast_state(self.model)
+        self.__setup_fast_path()
+        if state is not None:
+            # Restored last, so the fast path check does not shift the random streams of the resumed run
+            rng_states = state['rng']
+            set_rng_state(rng_states[get_rank()] if len(rng_states) == get_world_size() else rng_states[0])
 
-        for epoch in range(epochs):
+        for epoch in range(start_epoch, epochs):
             logging.info(f'EPOCH {epoch + 1}/{epochs}: ')
+            for loader in (self.train_loader, self.test_loader):
+                if hasattr(loader.sampler, "set_epoch"):
+                    loader.sampler.set_epoch(epoch)
+            if start_sample and hasattr(self.train_loader.sampler, "set_start"):
+                self.train_loader.sampler.set_start(start_sample)
             self.model.train(True)
-            avg_loss, accuracy = self.__train_one_epoch(len(self.train_loader.dataset))
+            avg_loss, accuracy = self.__train_one_epoch(epoch, best_test_loss, start_batch, progress)
+            start_batch, start_sample, progress = 0, 0, None
+            # BatchNorm statistics are updated locally; evaluate and save those of rank 0 everywhere
+            broadcast_state(self.model, "buffers")
 
-            self.model.train(False)
-            running_test_loss = 0.0
-            correct_test = 0
-            for i, t_data in enumerate(self.test_loader):
-                t_inputs, t_labels = t_data['image'].to(self.device), t_data['label'].to(self.device)
-                t_outputs = self.model(t_inputs)
-                t_loss = self.loss_fn(t_outputs, t_labels)
-                t_outputs = (t_outputs>0.5).float()
-                correct_test += (t_outputs == t_labels).float().sum()
-                running_test_loss += t_loss
-
-            avg_test_loss = running_test_loss / (i + 1)
-            test_accuracy = 100 * correct_test / len(self.test_loader.dataset)
+            avg_test_loss, test_accuracy = self.__evaluate()
             logging.info('LOSS train {} Test {}'.format(avg_loss, avg_test_loss))
             logging.info('Accuracy train {} Test {}'.format(accuracy, test_accuracy))
 
-            if avg_test_loss < best_test_loss:
+            is_best = avg_test_loss < best_test_loss
+            if is_best:
                 best_test_loss = avg_test_loss
+            self.__save_checkpoint(epoch + 1, 0, best_test_loss, None, is_best)
+            if is_best and is_main_process():
                 os.makedirs(save_model_path, exist_ok=True)
-                model_path = os.path.join(save_model_path, 'model_{}_{}'.format(timestamp, epoch + 1))
-                report_file = os.path.join(save_model_path, 'report_{}_{}.txt'.format(timestamp, epoch + 1))
+                model_path = os.path.join(save_model_path, 'model_{}_{}'.format(self.timestamp, epoch + 1))
+                report_file = os.path.join(save_model_path, 'report_{}_{}.txt'.format(self.timestamp, epoch + 1))
                 with open(report_file, 'w') as f:
                     f.write('LOSS train {} Test {}\n'.format(avg_loss, avg_test_loss))
                     f.write('Accuracy train {} Test {}'.format(accuracy, test_accuracy))
-                torch.save(self.model.state_dict(), model_path)
\ No newline at end of file
+                model_metrics = {'epoch': epoch + 1, 'train_loss': avg_loss, 'test_loss': avg_test_loss,
+                                 'train_accuracy': accuracy, 'test_accuracy': test_accuracy}
+                # Registered and promoted as soon as it is on disk, so a running app swaps to it during training and
+                # a crash later in the run does not lose it; never before, so the app never loads a partial file
+                register = lambda path, model_metrics=model_metrics: registry.register(path, model_metrics, "float", promote=True)
+                if self.checkpoint_manager is not None:
+                    self.checkpoint_manager.save_async(self.model.state_dict(), model_path, on_saved=register)
+                else:
+                    save_atomic(self.model.state_dict(), model_path)
+                    register(model_path)
+        if self.checkpoint_manager is not None:
+            self.checkpoint_manager.wait()
+
+
+    def __sweep_features(self, data):
+        # The frozen backbone runs once per batch, in eval mode like the feature cache; every head reads its output
+        if self.head_only:
+            return data['features']
+        with torch.no_grad(), self.__autocast():
+            inputs = data['image']
+            if self.channels_last:
+                inputs = inputs.contiguous(memory_format=torch.channels_last)
+            return self.model.extract_features(inputs).float()
+
+    def __sweep_outputs(self, head, features):
+        with self.__autocast():
+            return head(self.model.base_model.dropout(features)).float()
+
+    def __evaluate_heads(self, heads):
+        self.model.train(False)
+        for head in heads:
+            head.train(False)
+        # Per head: summed loss, correct predictions; then batch and image counts
+        totals = torch.zeros(len(heads), 2, dtype=torch.float64, device=self.device)
+        num_batches, num_images = 0, 0
+        with torch.inference_mode():
+            for t_data in self.test_loader:
+                t_data = self.__to_device(t_data)
+                t_labels = t_data['label']
+                features = self.__sweep_features(t_data)
+                for k, head in enumerate(heads):
+                    t_outputs = self.__sweep_outputs(head, features)
+                    totals[k, 0] += self.loss_fn(t_outputs, t_labels)
+                    totals[k, 1] += ((t_outputs > 0.5).float() == t_labels).sum()
+                num_batches += 1
+                num_images += len(t_labels)
+        totals = all_reduce_sum(totals.cpu())
+        counts = all_reduce_sum(torch.tensor([num_batches, num_images], dtype=torch.float64))
+        return [(loss / max(counts[0].item(), 1), 100 * correct / max(counts[1].item(), 1)) for loss, correct in totals.tolist()]
+
+    def sweep_heads(self, head_configs, epochs, save_model_path):
+        """Train several classifier heads on one shared frozen backbone and keep the best one.
+
+        Every batch goes through the backbone once (or comes from the feature cache when `head_only`); its
+        features then train every head, each with its own Adam optimizer and learning rate. The precision and
+        memory format options are validated against eager float32 first, as in `train_model`. A sweep therefore
+        costs about one training run, plus the heads themselves, whatever the number of configurations.
+
+        Per-head metrics are logged every epoch and written to `sweep_<timestamp>.json` in `save_model_path`. The
+        head with the lowest test loss at any epoch is installed in the model, saved as a full model next to the
+        other checkpoints and registered and promoted with its configuration. Sweeps are not checkpointed.
+
+        Args:
+            head_configs (list): `HeadConfig` of every head.
+            epochs (int): Number of epochs.
+            save_model_path (str): Directory the best model and the sweep report are written to.
+
+        Returns:
+            list: Per head, its configuration and the metrics of its best epoch. Heads whose test loss was never
+            finite have a `test_loss` of None and no other metrics.
+
+        Raises:
+            ValueError: If `epochs` is less than 1, `head_configs` is empty or no head reaches a finite test loss.
+        """
+        if epochs < 1:
+            raise ValueError(f"A head sweep needs at least one epoch, got {epochs}")
+        if not head_configs:
+            raise ValueError("A head sweep needs at least one head configuration")
+        self.timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        if self.compile_model:
+            # Heads are called directly on the backbone features, so a compiled forward pass would never run
+            logging.info("torch.compile is not used by head sweeps")
+            self.compile_model = False
+        # Like train_model, only keep bf16/channels_last if they match the eager float32 loss
+        self.__setup_fast_path()
+        in_features = self.model.base_model.fc[0].in_features
+        heads = [build_head(in_features, config).to(self.device) for config in head_configs]
+        # Every rank starts every head from the weights of rank 0
+        for head in heads:
+            broadcast_state(head)
+        optimizers = [torch.optim.Adam(head.parameters(), lr=config.LEARNING_RATE) for head, config in zip(heads, head_configs)]
+        # None until a head is evaluated, since json.dump would write math.inf as the non-standard 'Infinity'
+        results = [{'head': k, 'config': asdict(config), 'test_loss': None} for k, config in enumerate(head_configs)]
+        best = None
+
+        for epoch in range(epochs):
+            logging.info(f'SWEEP EPOCH {epoch + 1}/{epochs}: {len(heads)} heads')
+            for loader in (self.train_loader, self.test_loader):
+                if hasattr(loader.sampler, "set_epoch"):
+                    loader.sampler.set_epoch(epoch)
+            self.model.train(False)
+            running = torch.zeros(len(heads), 2, device=self.device)
+            num_images = 0
+            epoch_start = time.perf_counter()
+            for i, data in enumerate(self.train_loader):
+                data = self.__to_device(data)
+                labels = data['label']
+                features = self.__sweep_features(data)
+                for k, (head, optimizer) in enumerate(zip(heads, optimizers)):
+                    head.train(True)
+                    optimizer.zero_grad(set_to_none=True)
+                    outputs = self.__sweep_outputs(head, features)
+                    loss = self.loss_fn(outputs, labels)
+                    loss.backward()
+                    if is_distributed():
+                        all_reduce_gradients(list(head.parameters()))
+                    optimizer.step()
+                    with torch.no_grad():
+                        running[k, 0] += loss.detach() * len(labels)
+                        running[k, 1] += ((outputs > 0.5).float() == labels).sum()
+                num_images += len(labels)
+                if (i + 1) % self.log_interval == 0:
+                    logging.info(f'batch {i+1}/{len(self.train_loader)}')
+            self.__log_epoch_summary(num_images, time.perf_counter() - epoch_start, {})
+            running = all_reduce_sum(running.cpu().double())
+            total_images = all_reduce_sum(torch.tensor([num_images], dtype=torch.float64))[0].item()
+
+            for k, (test_loss, test_accuracy) in enumerate(self.__evaluate_heads(heads)):
+                train_loss, train_accuracy = (running[k] / max(total_images, 1)).tolist()
+                train_accuracy *= 100
+                logging.info(f'head {k} {head_configs[k]}: LOSS train {train_loss} Test {test_loss}, '
+                             f'Accuracy train {train_accuracy} Test {test_accuracy}')
+                if not math.isfinite(test_loss):
+                    continue
+                if results[k]['test_loss'] is None or test_loss < results[k]['test_loss']:
+                    results[k].update(epoch=epoch + 1, train_loss=train_loss, test_loss=test_loss,
+                                      train_accuracy=train_accuracy, test_accuracy=test_accuracy)
+                if best is None or test_loss < best[1]:
+                    best = (k, test_loss, copy.deepcopy(heads[k].state_dict()))
+
+        if best is None:
+            raise ValueError("No head of the sweep reached a finite test loss")
+        best_head, best_test_loss, best_state = best
+        logging.info(f'Best head {best_head} {head_configs[best_head]}: Test loss {best_test_loss}')
+        self.model.base_model.fc = build_head(in_features, head_configs[best_head]).to(self.device)
+        self.model.base_model.fc.load_state_dict(best_state)
+        if is_main_process():
+            os.makedirs(save_model_path, exist_ok=True)
+            with open(os.path.join(save_model_path, 'sweep_{}.json'.format(self.timestamp)), 'w') as f:
+                json.dump({'best_head': best_head, 'heads': results}, f, indent=2)
+            model_path = os.path.join(save_model_path, 'model_{}_sweep{}'.format(self.timestamp, best_head))
+            save_atomic(self.model.state_dict(), model_path)
+            ModelRegistry(save_model_path).register(model_path, results[best_head], "float", promote=True)
+        return results
@@ -1,33 +1,104 @@
+from dataclasses import dataclass
+from typing import Tuple
+import hashlib
+import torch
 import torch.nn as nn
 import torchvision
 
+# Inception v3 layers that make up the frozen feature extractor, in forward order.
+# The auxiliary classifier only runs in training mode and does not feed the head, so it is skipped.
+BACKBONE_LAYERS = (
+    "Conv2d_1a_3x3", "Conv2d_2a_3x3", "Conv2d_2b_3x3", "maxpool1",
+    "Conv2d_3b_1x1", "Conv2d_4a_3x3", "maxpool2",
+    "Mixed_5b", "Mixed_5c", "Mixed_5d",
+    "Mixed_6a", "Mixed_6b", "Mixed_6c", "Mixed_6d", "Mixed_6e",
+    "Mixed_7a", "Mixed_7b", "Mixed_7c", "avgpool",
+)
+
+@dataclass
+class HeadConfig:
+    """Configuration of the classifier head trained on top of the frozen backbone.
+
+    Attributes:
+        HIDDEN_SIZES (tuple): Widths of the hidden layers, each followed by ReLU and dropout.
+        DROPOUT (float): Dropout probability after every hidden layer.
+        LEARNING_RATE (float): Adam learning rate of the head.
+
+    Example:
+        >>> config = HeadConfig(HIDDEN_SIZES=(512,), DROPOUT=0.5)
+    """
+
+    HIDDEN_SIZES: Tuple[int, ...] = (1024, 32)
+    DROPOUT: float = 0.2
+    LEARNING_RATE: float = 0.0001
+
+
+def build_head(in_features, config=None):
+    """Build a classifier head: hidden layers with ReLU and dropout, then one sigmoid output.
+
+    Args:
+        in_features (int): Size of the backbone features.
+        config (HeadConfig, optional): Head layout, the default one when None.
+
+    Returns:
+        nn.Sequential: The head.
+    """
+    config = config or HeadConfig()
+    layers = []
+    for size in config.HIDDEN_SIZES:
+        layers += [nn.Linear(in_features, size), nn.ReLU(), nn.Dropout(config.DROPOUT)]
+        in_features = size
+    return nn.Sequential(*layers, nn.Linear(in_features, 1), nn.Sigmoid())
+
+
+def head_hidden_sizes(state_dict):
+    """Read the hidden layer widths of the head from an `InceptBaseModel` state dict."""
+    weights = sorted((int(name.split(".")[2]), value) for name, value in state_dict.items()
+                     if name.startswith("base_model.fc.") and name.endswith(".weight"))
+    return tuple(value.shape[0] for _, value in weights[:-1])
+
+
 class InceptBaseModel(nn.Module):
     """Inception-based base model for classification.
 
     This model is based on the Inception v3 architecture pretrained on ImageNet.
     It consists of a modified fully connected head for binary classification.
 
+    Args:
+        pretrained (bool, optional): Load the ImageNet weights into the backbone. Pass False when a full
+            `InceptBaseModel` state dict is loaded right after construction, to skip fetching them.
+        head_config (HeadConfig, optional): Layout of the classifier head, the default one when None.
+
     Example:
         >>> model = InceptBaseModel()
         >>> inputs = torch.randn(1, 3, 299, 299)
         >>> outputs = model(inputs)
     """
 
-    def __init__(self):
+    def __init__(self, pretrained=True, head_config=None):
         super(InceptBaseModel, self).__init__()
-        self.base_model = torchvision.models.inception_v3(weights='DEFAULT')
+        if pretrained:
+            self.base_model = torchvision.models.inception_v3(weights='DEFAULT')
+        else:
+            # Same architecture and input normalization as the pretrained model, without the weights
+            self.base_model = torchvision.models.inception_v3(weights=None, aux_logits=True, transform_input=True, init_weights=False)
         for parameter in self.base_model.parameters():
             parameter.requires_grad = False
-        self.base_model.fc = nn.Sequential(
-            nn.Linear(self.base_model.fc.in_features, 1024),
-            nn.ReLU(),
-            nn.Dropout(0.2),
-            nn.Linear(1024, 32),
-            nn.ReLU(),
-            nn.Dropout(0.2),
-            nn.Linear(32, 1),
-            nn.Sigmoid()
-        )
+        self.base_model.fc = build_head(self.base_model.fc.in_features, head_config)
+
+    @classmethod
+    def from_state_dict(cls, state_dict):
+        """Build a model around a saved state dict, whatever the layout of its head.
+
+        Args:
+            state_dict (dict): A full `InceptBaseModel` state dict, e.g. a training or sweep checkpoint.
+
+        Returns:
+            InceptBaseModel: The model with the state dict loaded, without fetching the pretrained weights.
+        """
+        model = cls(pretrained=False, head_config=HeadConfig(HIDDEN_SIZES=head_hidden_sizes(state_dict)))
+        model.load_state_dict(state_dict)
+        return model
 
     def forward(self,inputs):
         """Forward pass of the model.
@@ -39,4 +110,44 @@ class InceptBaseModel(nn.Module):
             torch.Tensor: Output tensor of shape (batch_size, 1) with sigmoid activation.
         """
         x = self.base_model(inputs)
-        return x
\ No newline at end of file
+        return x
+
+    def extract_features(self, inputs):
+        """Run the frozen Inception v3 backbone and return the pooled features.
+
+        This is the input of the classifier head, i.e. what `forward` computes right before `base_model.fc`.
+
+        Args:
+            inputs (torch.Tensor): Input tensor of shape (batch_size, channels, height, width).
+
+        Returns:
+            torch.Tensor: Feature tensor of shape (batch_size, 2048).
+        """
+        x = self.base_model._transform_input(inputs)
+        for name in BACKBONE_LAYERS:
+            x = getattr(self.base_model, name)(x)
+        return torch.flatten(x, 1)
+
+    def backbone_digest(self):
+        """Hash the weights and buffers of the backbone layers, i.e. everything `extract_features` depends on.
+
+        Returns:
+            str: The SHA-256 hex digest of the backbone state.
+        """
+        digest = hashlib.sha256()
+        for name, tensor in self.base_model.state_dict().items():
+            if name.split(".")[0] in BACKBONE_LAYERS:
+                digest.update(name.encode())
+                digest.update(tensor.detach().float().cpu().contiguous().numpy().tobytes())
+        return digest.hexdigest()
+
+    def classify(self, features):
+        """Run the classifier head on pooled backbone features.
+
+        Args:
+            features (torch.Tensor): Feature tensor of shape (batch_size, 2048) as returned by `extract_features`.
+
+        Returns:
+            torch.Tensor: Output tensor of shape (batch_size, 1) with sigmoid activation.
+        """
+        return self.base_model.fc(self.base_model.dropout(features))
\ No newline at end of file
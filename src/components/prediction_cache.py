@@ -0,0 +1,148 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import os
+import sys
+import threading
+
+# Rough per-entry bookkeeping cost (OrderedDict node, key string and float objects) counted against MAX_BYTES
+ENTRY_OVERHEAD_BYTES = 200
+
+@dataclass
+class PredictionCacheConfig:
+    """Configuration class for the prediction cache.
+
+    Both settings can be overridden with environment variables of the same name prefixed with `PREDICTION_CACHE_`.
+
+    Attributes:
+        MAX_ENTRIES (int): Maximum number of cached predictions. 0 disables the cache.
+        MAX_BYTES (int): Maximum estimated memory used by the cached predictions.
+
+    Example:
+        >>> config = PredictionCacheConfig()
+    """
+
+    MAX_ENTRIES: int = int(os.environ.get("PREDICTION_CACHE_MAX_ENTRIES", 100_000))
+    MAX_BYTES: int = int(os.environ.get("PREDICTION_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+
+class PredictionCache:
+    """Thread-safe LRU cache of predictions keyed by uploaded content and model version.
+
+    Keys combine a SHA-256 hash of the uploaded bytes with the version of the model that produced the prediction,
+    so a prediction is never served for a different model. Setting a new model version drops every entry.
+    Entries are evicted least recently used first once either the entry or the memory limit is exceeded.
+
+    Args:
+        max_entries (int): Maximum number of entries. 0 disables the cache.
+        max_bytes (int): Maximum estimated memory of the entries.
+
+    Example:
+        >>> cache = PredictionCache(max_entries=1000, max_bytes=1024 * 1024)
+        >>> cache.set_model_version("model_20230601_120000_3")
+        >>> key = cache.make_key(content)
+        >>> prediction = cache.get(key)
+        >>> if prediction is None:
+        ...     cache.put(key, 0.97)
+    """
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.model_version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def set_model_version(self, model_version):
+        """Set the version of the model serving predictions, dropping every entry if it changed.
+
+        Args:
+            model_version (str): Identifier of the loaded model.
+        """
+        with self._lock:
+            if model_version != self.model_version:
+                self.model_version = model_version
+                self._entries.clear()
+                self._bytes = 0
+
+    def make_key(self, content, model_version=None):
+        """Build the cache key of uploaded content.
+
+        Args:
+            content (bytes): The uploaded bytes.
+            model_version (str, optional): Model version, defaults to the current one.
+
+        Returns:
+            str: The cache key.
+        """
+        return "{}:{}".format(model_version or self.model_version, hashlib.sha256(content).hexdigest())
+
+    def get(self, key):
+        """Look up a prediction, marking it as recently used.
+
+        Args:
+            key (str): Key built with `make_key`.
+
+        Returns:
+            The cached prediction, or None on a miss.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store a prediction, evicting the least recently used entries beyond the limits.
+
+        Predictions made by a model other than the current one are not stored.
+
+        Args:
+            key (str): Key built with `make_key`.
+            value: The prediction.
+        """
+        if not self.enabled:
+            return
+        size = sys.getsizeof(key) + sys.getsizeof(value) + ENTRY_OVERHEAD_BYTES
+        with self._lock:
+            if not key.startswith("{}:".format(self.model_version)):
+                return
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = value
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                old_key, old_value = self._entries.popitem(last=False)
+                self._bytes -= sys.getsizeof(old_key) + sys.getsizeof(old_value) + ENTRY_OVERHEAD_BYTES
+                self.evictions += 1
+
+    def stats(self):
+        """Get the cache counters.
+
+        Returns:
+            dict: Model version, entry count, estimated bytes, limits, hits, misses and evictions.
+        """
+        with self._lock:
+            return {
+                "model_version": self.model_version,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
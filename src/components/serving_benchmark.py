@@ -0,0 +1,314 @@
+from dataclasses import asdict, dataclass
+from datetime import datetime
+import io
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+import httpx
+import numpy as np
+from PIL import Image
+import src
+from src.components.throughput_benchmark import git_revision, synthetic_scan
+from src.logger import logging
+from src.exception import CustomException
+
+@dataclass
+class ServingBenchmarkConfig:
+    """Configuration class for the load test of the inference service.
+
+    Attributes:
+        HOST (str): Interface the service is started on.
+        RESULTS_FILE (str): JSON lines file every load level result is appended to.
+        CONCURRENCY_LEVELS (tuple): Numbers of concurrent clients, run in order.
+        DURATION_SECONDS (float): Duration of every concurrency level.
+        NUM_DOCUMENTS (int): Number of synthetic documents the clients upload, alternately JPEG and PNG.
+        IMAGE_HEIGHT (int): Height of the largest synthetic document, in pixels.
+        IMAGE_WIDTH (int): Width of the largest synthetic document, in pixels.
+        STARTUP_TIMEOUT (float): Maximum time, in seconds, the service takes to start.
+        WARMUP_REQUESTS (int): Untimed requests sent after start-up.
+        DISABLE_CACHE (bool): Disable the prediction cache, which would otherwise answer the repeated documents.
+
+    Example:
+        >>> config = ServingBenchmarkConfig(CONCURRENCY_LEVELS=(1, 8, 32))
+    """
+
+    HOST: str = "127.0.0.1"
+    RESULTS_FILE: str = os.path.join(os.getcwd(), "artifacts", "benchmarks", "serving.jsonl")
+    CONCURRENCY_LEVELS: tuple = (1, 2, 4, 8, 16)
+    DURATION_SECONDS: float = 20
+    NUM_DOCUMENTS: int = 16
+    IMAGE_HEIGHT: int = 1600
+    IMAGE_WIDTH: int = 800
+    STARTUP_TIMEOUT: float = 300
+    WARMUP_REQUESTS: int = 8
+    DISABLE_CACHE: bool = True
+
+
+def synthetic_documents(num_documents, image_size, seed=0):
+    """Encode synthetic document scans of varying size, alternately as JPEG and PNG.
+
+    Args:
+        num_documents (int): Number of documents.
+        image_size (tuple): (height, width) of the largest document.
+        seed (int, optional): Seed of the scans.
+
+    Returns:
+        list: (filename, content type, bytes) of every document.
+    """
+    rng = np.random.default_rng(seed)
+    documents = []
+    for idx in range(num_documents):
+        scale = rng.uniform(0.5, 1.0)
+        image = Image.fromarray(synthetic_scan(rng, int(image_size[0] * scale), int(image_size[1] * scale)))
+        buffer = io.BytesIO()
+        if idx % 2 == 0:
+            image.save(buffer, format="JPEG", quality=90)
+            documents.append(("doc_{}.jpg".format(idx), "image/jpeg", buffer.getvalue()))
+        else:
+            image.save(buffer, format="PNG")
+            documents.append(("doc_{}.png".format(idx), "image/png", buffer.getvalue()))
+    return documents
+
+
+def process_tree(pid):
+    """List a process and all of its descendants. Only supported on Linux, returns [pid] elsewhere."""
+    children = {}
+    try:
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    with open("/proc/{}/stat".format(entry)) as f:
+                        # The command name may contain spaces, the parent pid is the second field after it
+                        parent = int(f.read().rsplit(")", 1)[1].split()[1])
+                except (OSError, IndexError, ValueError):
+                    continue
+                children.setdefault(parent, []).append(int(entry))
+    except OSError:
+        return [pid]
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        pending.extend(children.get(current, []))
+    return pids
+
+
+def resident_memory(pid):
+    """Resident set size of a process in bytes, or None if it cannot be read."""
+    try:
+        with open("/proc/{}/status".format(pid)) as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class MemorySampler:
+    """Background sampler of the peak resident memory of every process of a process tree.
+
+    Args:
+        pid (int): Root of the process tree.
+        interval (float, optional): Seconds between samples.
+    """
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.peak = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.__run, name="memory-sampler", daemon=True)
+
+    def __sample(self):
+        for pid in process_tree(self.pid):
+            rss = resident_memory(pid)
+            if rss is not None:
+                self.peak[pid] = max(rss, self.peak.get(pid, 0))
+
+    def __run(self):
+        while not self._stop.is_set():
+            self.__sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.__sample()
+
+
+class ServingBenchmark:
+    """Load test of the inference service in `src/app/main.py`.
+
+    For every serving setup, the service is started on uvicorn with an untrained model (`MODEL_FORMAT=random`),
+    so no checkpoint or network access is needed. Clients then upload synthetic JPEG and PNG documents to
+    `/predict` in a closed loop, at each concurrency level in turn. Every level reports latency percentiles,
+    throughput, errors and the peak resident memory of every server process. Results are tagged with the
+    commit and setup, and appended to `RESULTS_FILE` as JSON lines.
+
+    Args:
+        config (ServingBenchmarkConfig): Load test settings.
+
+    Example:
+        >>> benchmark = ServingBenchmark(ServingBenchmarkConfig())
+        >>> results = benchmark.run_setup(workers=2, threads=2)
+        >>> benchmark.save(results)
+    """
+    def __init__(self, config):
+        self.config = config
+        self.documents = synthetic_documents(config.NUM_DOCUMENTS, (config.IMAGE_HEIGHT, config.IMAGE_WIDTH))
+
+    @staticmethod
+    def __free_port():
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            return s.getsockname()[1]
+
+    def start_server(self, workers, threads, env=None):
+        """Start the service on a free port.
+
+        Args:
+            workers (int): Number of uvicorn worker processes.
+            threads (int, optional): Intra-op threads of every worker (`OMP_NUM_THREADS`), None for the default.
+            env (dict, optional): Extra environment variables, e.g. batching settings.
+
+        Returns:
+            tuple: The server process and its base URL.
+        """
+        port = self.__free_port()
+        repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(src.__file__)))
+        server_env = dict(os.environ, MODEL_FORMAT="random")
+        server_env["PYTHONPATH"] = os.pathsep.join(filter(None, [repo_dir, os.environ.get("PYTHONPATH")]))
+        if threads:
+            server_env["OMP_NUM_THREADS"] = server_env["MKL_NUM_THREADS"] = str(threads)
+        if self.config.DISABLE_CACHE:
+            server_env["PREDICTION_CACHE_MAX_ENTRIES"] = "0"
+        server_env.update(env or {})
+        process = subprocess.Popen([sys.executable, "-m", "uvicorn", "src.app.main:app", "--host", self.config.HOST,
+                                    "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+                                   env=server_env)
+        return process, "http://{}:{}".format(self.config.HOST, port)
+
+    def __wait_ready(self, process, url):
+        deadline = time.monotonic() + self.config.STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode} during start-up")
+            try:
+                if httpx.get(url + "/", timeout=1).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise TimeoutError(f"Server did not start within {self.config.STARTUP_TIMEOUT}s")
+
+    def __post(self, client, url, idx):
+        name, content_type, content = self.documents[idx % len(self.documents)]
+        start = time.perf_counter()
+        response = client.post(url + "/predict", files={"file": (name, content, content_type)})
+        return time.perf_counter() - start, response.status_code == 200
+
+    def __run_level(self, url, concurrency):
+        latencies, errors = [], [0]
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        def client_loop(offset):
+            with httpx.Client(timeout=None) as client:
+                idx = offset
+                while not stop.is_set():
+                    try:
+                        latency, ok = self.__post(client, url, idx)
+                    except httpx.HTTPError:
+                        latency, ok = None, False
+                    with lock:
+                        if ok:
+                            latencies.append(latency)
+                        else:
+                            errors[0] += 1
+                    idx += concurrency
+
+        clients = [threading.Thread(target=client_loop, args=(i,), daemon=True) for i in range(concurrency)]
+        start = time.perf_counter()
+        for client in clients:
+            client.start()
+        stop.wait(self.config.DURATION_SECONDS)
+        stop.set()
+        for client in clients:
+            client.join()
+        elapsed = time.perf_counter() - start
+
+        result = {"concurrency": concurrency, "requests": len(latencies), "errors": errors[0], "seconds": elapsed,
+                  "throughput_rps": len(latencies) / elapsed}
+        for name, q in (("p50", 50), ("p95", 95), ("p99", 99)):
+            result["latency_{}_ms".format(name)] = float(np.percentile(latencies, q) * 1000) if latencies else None
+        result["latency_mean_ms"] = float(np.mean(latencies) * 1000) if latencies else None
+        return result
+
+    def run_setup(self, workers=1, threads=None, env=None):
+        """Start the service with one serving setup and load it at every concurrency level.
+
+        Args:
+            workers (int, optional): Number of uvicorn worker processes.
+            threads (int, optional): Intra-op threads of every worker, None for the default.
+            env (dict, optional): Extra environment variables of the service.
+
+        Returns:
+            list: One result dictionary per concurrency level.
+
+        Raises:
+            CustomException: If the service fails to start or the load test fails.
+        """
+        try:
+            setup = {"workers": workers, "threads": threads, "env": env or {}}
+            logging.info(f"Starting the service with {setup}")
+            start = time.perf_counter()
+            process, url = self.start_server(workers, threads, env)
+            try:
+                self.__wait_ready(process, url)
+                with httpx.Client(timeout=None) as client:
+                    for idx in range(self.config.WARMUP_REQUESTS):
+                        self.__post(client, url, idx)
+                startup_seconds = time.perf_counter() - start
+                environment = {"commit": git_revision(), "timestamp": datetime.now().isoformat(timespec="seconds"),
+                               "host": platform.node(), "cpu_count": os.cpu_count(), "config": asdict(self.config)}
+                results = []
+                for concurrency in self.config.CONCURRENCY_LEVELS:
+                    with MemorySampler(process.pid) as memory:
+                        result = self.__run_level(url, concurrency)
+                    result["process_rss_bytes"] = {str(pid): rss for pid, rss in memory.peak.items()}
+                    result["total_rss_bytes"] = sum(memory.peak.values())
+                    result.update(setup, startup_seconds=startup_seconds, **environment)
+                    logging.info(f"Concurrency {concurrency}: {result['throughput_rps']:.1f} req/s, "
+                                 f"p50 {result['latency_p50_ms']} ms, p99 {result['latency_p99_ms']} ms, {result['errors']} errors")
+                    results.append(result)
+                return results
+            finally:
+                process.terminate()
+                try:
+                    process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+        except Exception as e:
+            error_message = str(e)
+            raise CustomException(error_message, sys)
+
+    def save(self, results):
+        """Append results to `RESULTS_FILE`, one JSON object per line.
+
+        Args:
+            results (list): Results returned by `run_setup`.
+        """
+        os.makedirs(os.path.dirname(self.config.RESULTS_FILE), exist_ok=True)
+        with open(self.config.RESULTS_FILE, "a") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+        logging.info(f"Serving benchmark results appended to '{self.config.RESULTS_FILE}'")
@@ -0,0 +1,371 @@
+from dataclasses import asdict, dataclass, field
+from contextlib import nullcontext
+from datetime import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import default_collate
+from src.components.data_loader import DataConfig, DataLoadTransform, FrogeryDataset, default_num_workers
+from src.components.image_io import decode_parity
+from src.components.image_transformers import Rescale
+from src.components.models_architecture import InceptBaseModel
+from src.logger import logging
+from src.exception import CustomException
+
+BENCHMARK_STAGES = ("decode", "decode_parity", "transform", "collate", "loader", "forward", "train_head", "end_to_end")
+
+@dataclass
+class BenchmarkConfig:
+    """Configuration class for the training-pipeline throughput benchmark.
+
+    Attributes:
+        DATA_DIR (str): Directory the synthetic dataset is generated in, and reused from on later runs.
+        RESULTS_FILE (str): JSON lines file every benchmark result is appended to.
+        NUM_IMAGES (int): Number of synthetic scans.
+        IMAGE_HEIGHT (int): Height of the synthetic scans, in pixels.
+        IMAGE_WIDTH (int): Width of the synthetic scans, in pixels.
+        BATCH_SIZE (int): Batch size of the collate, loader, model and end-to-end stages.
+        NUM_WORKERS (int): Number of data loading workers of the loader and end-to-end stages.
+        PRECISION (str): Precision of the model stages, 'fp32' or 'bf16' (autocast).
+        BATCH_TRANSFORM (bool): Resize and normalize at collation (`ResizeCollate`) rather than per sample.
+        WARMUP_ITERATIONS (int): Untimed iterations run before every timed stage.
+        ITERATIONS (int): Timed batches per stage. The per-image stages time `ITERATIONS * BATCH_SIZE` images.
+
+    Example:
+        >>> config = BenchmarkConfig(NUM_WORKERS=4, PRECISION="bf16")
+    """
+
+    DATA_DIR: str = os.path.join(os.getcwd(), "artifacts", "benchmark_data")
+    RESULTS_FILE: str = os.path.join(os.getcwd(), "artifacts", "benchmarks", "results.jsonl")
+    NUM_IMAGES: int = 256
+    IMAGE_HEIGHT: int = 1600
+    IMAGE_WIDTH: int = 800
+    BATCH_SIZE: int = 32
+    NUM_WORKERS: int = field(default_factory=default_num_workers)
+    PRECISION: str = "fp32"
+    BATCH_TRANSFORM: bool = True
+    WARMUP_ITERATIONS: int = 2
+    ITERATIONS: int = 5
+
+
+def synthetic_scan(rng, height, width):
+    """Draw a grayscale-looking RGB document scan: off-white paper with rows of dark text-like strokes.
+
+    Args:
+        rng (numpy.random.Generator): Random generator.
+        height (int): Height of the scan.
+        width (int): Width of the scan.
+
+    Returns:
+        numpy.ndarray: uint8 image of shape (height, width, 3).
+    """
+    page = rng.normal(238, 6, (height, width)).clip(0, 255)
+    margin = width // 12
+    for top in range(margin, height - margin, 28):
+        x = margin
+        while x < width - margin:
+            word = int(rng.integers(15, 90))
+            page[top:top + 14, x:min(x + word, width - margin)] = rng.integers(20, 80)
+            x += word + int(rng.integers(8, 16))
+    page = page.astype(np.uint8)
+    # Slight colour cast, as with a colour scanner
+    return np.stack([page, page, np.clip(page.astype(np.int16) - 4, 0, 255).astype(np.uint8)], axis=-1)
+
+
+def generate_synthetic_dataset(data_dir, num_images, image_size, seed=0):
+    """Generate a FindIt-shaped dataset: JPEG document scans in `img/` and a ground truth XML file in `GT/`.
+
+    Scans and labels are deterministic for a given seed. Existing scans are kept, so a dataset generated
+    once is reused by later runs.
+
+    Args:
+        data_dir (str): Directory of the dataset.
+        num_images (int): Number of scans.
+        image_size (tuple): (height, width) of the scans.
+        seed (int, optional): Seed of the scans and labels.
+
+    Returns:
+        tuple: Paths of the ground truth XML file and of the image directory.
+    """
+    image_dir = os.path.join(data_dir, "img")
+    xml_file_path = os.path.join(data_dir, "GT", "T1-GT.xml")
+    os.makedirs(image_dir, exist_ok=True)
+    os.makedirs(os.path.dirname(xml_file_path), exist_ok=True)
+    height, width = image_size
+    rng = np.random.default_rng(seed)
+    rows = []
+    for idx in range(num_images):
+        image_id = "X{:05d}".format(idx)
+        label = int(rng.integers(0, 2))
+        rows.append("  <doc>\n    <id>{}</id>\n    <modified>{}</modified>\n  </doc>".format(image_id, label))
+        image_file = os.path.join(image_dir, image_id + ".jpg")
+        if not os.path.exists(image_file):
+            Image.fromarray(synthetic_scan(np.random.default_rng((seed, idx)), height, width)).save(
+                image_file, quality=90, dpi=(300, 300))
+    with open(xml_file_path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<GT>\n' + "\n".join(rows) + "\n</GT>\n")
+    return xml_file_path, image_dir
+
+
+def git_revision():
+    """Commit hash of the working tree, suffixed with '-dirty' when it has local changes, or None outside git."""
+    try:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip()
+        return revision + ("-dirty" if dirty else "")
+    except Exception:
+        return None
+
+
+class ThroughputBenchmark:
+    """Benchmark of the training input pipeline and model, stage by stage and end to end.
+
+    The stages run on a synthetic FindIt-shaped dataset:
+
+    - decode: `FrogeryDataset` reading and decoding scans, in the calling process.
+    - decode_parity: decoding and `Rescale` of scans at reduced resolution, against full-resolution decodes; also
+      reports the pixel difference the reduced decode makes after `Rescale`.
+    - transform: turning decoded scans into a batch, with `Rescale`, `ToTensor` and the default collate function,
+      or with `ResizeCollate` when `BATCH_TRANSFORM` is set.
+    - collate: batching transformed samples with the `DataLoader` collate function.
+    - loader: iterating the training `DataLoader` (decode, transform and collate in `NUM_WORKERS` workers); also
+      reports the peak resident memory of the largest worker.
+    - forward: inference forward pass of `InceptBaseModel`.
+    - train_head: forward, backward and optimizer step of the classifier head on backbone features.
+    - end_to_end: the training loop, from the `DataLoader` through the training forward, backward and optimizer step.
+
+    Every stage reports images per second. Results are plain dictionaries, tagged with the commit, versions,
+    device and configuration they were measured with, and appended to `RESULTS_FILE` as JSON lines.
+
+    Args:
+        config (BenchmarkConfig): Benchmark settings.
+        device (torch.device, optional): Device of the model stages, defaults to CUDA when available.
+
+    Example:
+        >>> benchmark = ThroughputBenchmark(BenchmarkConfig(NUM_WORKERS=2))
+        >>> results = benchmark.run(["decode", "loader"])
+        >>> benchmark.save(results)
+    """
+    def __init__(self, config, device=None):
+        self.config = config
+        self.device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.xml_file_path, self.image_dir = generate_synthetic_dataset(
+            config.DATA_DIR, config.NUM_IMAGES, (config.IMAGE_HEIGHT, config.IMAGE_WIDTH))
+        self.data_loader = DataLoadTransform(DataConfig(BATCH_TRANSFORM=config.BATCH_TRANSFORM))
+        self.data_loader.config.TRAIN_DATA_XML_FILE = self.xml_file_path
+        self.data_loader.config.TRAIN_DATA_IMAGE_DIR = self.image_dir
+        self.data_loader.config.USE_SHARDS = False
+        self.data_loader.config.NUM_WORKERS = config.NUM_WORKERS
+        self.data_loader.config.BATCH_SIZE = config.BATCH_SIZE
+        self.data_loader.config.PIN_MEMORY = self.device.type == "cuda"
+        self.image_size = self.data_loader.config.DATA_RESIZE
+        self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            # Random weights: throughput does not depend on them and nothing is downloaded
+            self._model = InceptBaseModel(pretrained=False).to(self.device)
+        return self._model
+
+    def __autocast(self):
+        if self.config.PRECISION == "bf16":
+            return torch.autocast(device_type=self.device.type, dtype=torch.bfloat16)
+        return nullcontext()
+
+    def __synchronize(self):
+        if self.device.type == "cuda":
+            torch.cuda.synchronize(self.device)
+
+    def __num_samples(self):
+        return min(self.config.NUM_IMAGES, self.config.ITERATIONS * self.config.BATCH_SIZE)
+
+    def __time(self, step, repeats, images_per_step):
+        for _ in range(self.config.WARMUP_ITERATIONS):
+            step()
+        self.__synchronize()
+        start = time.perf_counter()
+        for _ in range(repeats):
+            step()
+        self.__synchronize()
+        return self.__result(time.perf_counter() - start, repeats * images_per_step)
+
+    @staticmethod
+    def __result(seconds, images):
+        return {"images": images, "seconds": seconds, "images_per_sec": images / seconds if seconds > 0 else None}
+
+    def bench_decode(self):
+        dataset = FrogeryDataset(self.xml_file_path, self.image_dir, decode_size=self.data_loader.decode_size)
+        num_samples = self.__num_samples()
+        start = time.perf_counter()
+        for idx in range(num_samples):
+            dataset[idx]
+        return self.__result(time.perf_counter() - start, num_samples)
+
+    def bench_decode_parity(self):
+        size = (self.image_size, self.image_size)
+        full = FrogeryDataset(self.xml_file_path, self.image_dir, Rescale(size))
+        reduced = FrogeryDataset(self.xml_file_path, self.image_dir, Rescale(size), decode_size=size)
+        num_samples = min(self.__num_samples(), self.config.BATCH_SIZE)
+        start = time.perf_counter()
+        for idx in range(num_samples):
+            full[idx]
+        full_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        for idx in range(num_samples):
+            reduced[idx]
+        result = self.__result(time.perf_counter() - start, num_samples)
+        result["full_decode_images_per_sec"] = num_samples / full_seconds if full_seconds > 0 else None
+        result.update(decode_parity([full.get_sample_file(idx)[1] for idx in range(num_samples)], size))
+        return result
+
+    def bench_transform(self):
+        dataset = FrogeryDataset(self.xml_file_path, self.image_dir, decode_size=self.data_loader.decode_size)
+        samples = [dataset[idx] for idx in range(min(len(dataset), self.config.BATCH_SIZE))]
+        transform = self.data_loader.transform or (lambda sample: sample)
+        collate = self.data_loader.collate_fn or default_collate
+        return self.__time(lambda: collate([transform(sample) for sample in samples]), self.config.ITERATIONS, len(samples))
+
+    def bench_collate(self):
+        dataset = FrogeryDataset(self.xml_file_path, self.image_dir, self.data_loader.transform,
+                                 decode_size=self.data_loader.decode_size)
+        batch = [dataset[idx % len(dataset)] for idx in range(self.config.BATCH_SIZE)]
+        collate = self.data_loader.collate_fn or default_collate
+        return self.__time(lambda: collate(batch), self.config.ITERATIONS, len(batch))
+
+    def bench_loader(self):
+        # Imported here, since the serving benchmark itself builds on this module
+        from src.components.serving_benchmark import MemorySampler
+
+        loader = self.data_loader.make_loader(self.data_loader.get_train_dataset(), shuffle=True)
+        start = time.perf_counter()
+        images, first_batch_seconds = 0, None
+        with MemorySampler(os.getpid(), interval=0.05) as memory:
+            for i, data in enumerate(loader):
+                if i == 0:
+                    first_batch_seconds = time.perf_counter() - start
+                    start = time.perf_counter()
+                    continue
+                images += len(data['label'])
+                if i >= self.config.ITERATIONS:
+                    break
+            result = self.__result(time.perf_counter() - start, images)
+        # Worker start-up and the first batch are reported apart from the steady-state throughput
+        result["first_batch_seconds"] = first_batch_seconds
+        worker_peaks = [rss for pid, rss in memory.peak.items() if pid != os.getpid()]
+        result["peak_worker_rss_bytes"] = max(worker_peaks) if worker_peaks else None
+        return result
+
+    def bench_forward(self):
+        model = self.model.eval()
+        inputs = torch.rand(self.config.BATCH_SIZE, 3, self.image_size, self.image_size, device=self.device)
+
+        def step():
+            with torch.no_grad(), self.__autocast():
+                model(inputs)
+        return self.__time(step, self.config.ITERATIONS, self.config.BATCH_SIZE)
+
+    def bench_train_head(self):
+        model = self.model.train()
+        optimizer = torch.optim.Adam(model.parameters(), lr=0.0001)
+        loss_fn = torch.nn.BCELoss()
+        features = torch.rand(self.config.BATCH_SIZE, 2048, device=self.device)
+        labels = torch.randint(0, 2, (self.config.BATCH_SIZE, 1), device=self.device).float()
+
+        def step():
+            optimizer.zero_grad()
+            with self.__autocast():
+                outputs = model.classify(features)
+            loss_fn(outputs.float(), labels).backward()
+            optimizer.step()
+        return self.__time(step, self.config.ITERATIONS, self.config.BATCH_SIZE)
+
+    def bench_end_to_end(self):
+        model = self.model.train()
+        optimizer = torch.optim.Adam(model.parameters(), lr=0.0001)
+        loss_fn = torch.nn.BCELoss()
+        loader = self.data_loader.make_loader(self.data_loader.get_train_dataset(), shuffle=True)
+        start = time.perf_counter()
+        images, first_batch_seconds = 0, None
+        for i, data in enumerate(loader):
+            optimizer.zero_grad()
+            inputs, labels = data['image'].to(self.device), data['label'].to(self.device)
+            with self.__autocast():
+                outputs = model(inputs).logits
+            loss = loss_fn(outputs.float(), labels)
+            loss.backward()
+            optimizer.step()
+            self.__synchronize()
+            if i == 0:
+                first_batch_seconds = time.perf_counter() - start
+                start = time.perf_counter()
+                continue
+            images += len(labels)
+            if i >= self.config.ITERATIONS:
+                break
+        result = self.__result(time.perf_counter() - start, images)
+        result["first_batch_seconds"] = first_batch_seconds
+        return result
+
+    def environment(self):
+        """Describe what the results were measured with.
+
+        Returns:
+            dict: Commit, timestamp, host, library versions, device, thread count and configuration.
+        """
+        return {
+            "commit": git_revision(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "device": str(self.device),
+            "num_threads": torch.get_num_threads(),
+            "config": asdict(self.config),
+        }
+
+    def run(self, stages=BENCHMARK_STAGES):
+        """Run benchmark stages.
+
+        Args:
+            stages (iterable, optional): Names of the stages to run, defaults to all of them.
+
+        Returns:
+            list: One result dictionary per stage, with the stage name, images, seconds and images per second.
+
+        Raises:
+            CustomException: If a stage is unknown or fails.
+        """
+        try:
+            environment = self.environment()
+            results = []
+            for stage in stages:
+                if stage not in BENCHMARK_STAGES:
+                    raise ValueError(f"Unknown benchmark stage '{stage}', expected one of {BENCHMARK_STAGES}")
+                logging.info(f"Benchmarking stage '{stage}'")
+                result = dict(stage=stage, **getattr(self, "bench_" + stage)())
+                result.update(environment)
+                logging.info(f"Stage '{stage}': {result['images_per_sec']} images/sec")
+                results.append(result)
+            return results
+        except Exception as e:
+            error_message = str(e)
+            raise CustomException(error_message, sys)
+
+    def save(self, results):
+        """Append results to `RESULTS_FILE`, one JSON object per line.
+
+        Args:
+            results (list): Results returned by `run`.
+        """
+        os.makedirs(os.path.dirname(self.config.RESULTS_FILE), exist_ok=True)
+        with open(self.config.RESULTS_FILE, "a") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+        logging.info(f"Benchmark results appended to '{self.config.RESULTS_FILE}'")
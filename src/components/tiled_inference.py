@@ -0,0 +1,183 @@
+from dataclasses import dataclass
+import math
+import os
+import sys
+import torch
+import torch.nn.functional as F
+from src.exception import CustomException
+
+@dataclass
+class TilingConfig:
+    """Configuration class for tiled inference on full-resolution document scans.
+
+    `MAX_PATCHES` and `BATCH_SIZE` can be overridden with the `TILED_MAX_PATCHES` and `TILED_BATCH_SIZE` environment
+    variables.
+
+    Attributes:
+        PATCH_SIZE (int): Height and width of the patches scored by the model.
+        OVERLAP (float): Fraction of a patch shared with its neighbours.
+        MAX_PATCHES (int): Patch budget per document. Larger pages first lose the overlap, then are downscaled.
+        BATCH_SIZE (int): Number of patches per forward pass.
+        HEATMAP_CELL (int): Size in pixels of a heatmap cell, at the scale the patches are cut.
+        AGGREGATION (str): How patch scores make the document score: 'max' flags a document with any suspicious
+            patch, 'mean' averages them.
+
+    Example:
+        >>> config = TilingConfig()
+    """
+
+    PATCH_SIZE: int = 299
+    OVERLAP: float = 0.25
+    MAX_PATCHES: int = int(os.environ.get("TILED_MAX_PATCHES", 64))
+    BATCH_SIZE: int = int(os.environ.get("TILED_BATCH_SIZE", 32))
+    HEATMAP_CELL: int = 32
+    AGGREGATION: str = "max"
+
+
+def grid_size(length, patch_size, stride):
+    """Number of patches needed along an axis to cover `length` pixels."""
+    return 1 if length <= patch_size else math.ceil((length - patch_size) / stride) + 1
+
+
+class TiledInference:
+    """Scores a full-resolution document as a grid of overlapping patches.
+
+    The patches are strided views of the image tensor (`Tensor.unfold`); only the patches of the batch being
+    scored are gathered into a contiguous tensor. Along each axis the stride is shrunk slightly so the grid
+    spans the page, leaving at most a few pixels uncovered at the right and bottom edges. When the grid would
+    exceed the patch budget, the overlap is dropped first and the page is downscaled only if that is not enough,
+    so the cost of a document is bounded whatever its size.
+
+    Patch scores are combined into the document score and into a coarse heatmap: each heatmap cell averages the
+    scores of the patches covering its centre, computed for all cells at once as two matrix products.
+
+    Args:
+        config (TilingConfig, optional): Tiling settings.
+
+    Example:
+        >>> tiler = TiledInference()
+        >>> result = tiler.predict(image, lambda patches: model(patches.to(device)).view(-1))
+        >>> result['score'], result['heatmap']
+    """
+    def __init__(self, config=None):
+        self.config = config or TilingConfig()
+        self.patch_size = self.config.PATCH_SIZE
+        self.stride = max(1, round(self.patch_size * (1 - self.config.OVERLAP)))
+
+    def plan(self, height, width):
+        """Choose the scale and nominal stride that keep the grid within the patch budget.
+
+        Args:
+            height (int): Image height.
+            width (int): Image width.
+
+        Returns:
+            tuple: Scale factor applied to the image (1.0 keeps the full resolution) and stride.
+        """
+        budget = max(1, self.config.MAX_PATCHES)
+        for stride in (self.stride, self.patch_size):
+            if grid_size(height, self.patch_size, stride) * grid_size(width, self.patch_size, stride) <= budget:
+                return 1.0, stride
+        stride = self.patch_size
+        scale = min(1.0, math.sqrt(budget * stride * stride / (height * width)))
+        while grid_size(round(height * scale), self.patch_size, stride) * grid_size(round(width * scale), self.patch_size, stride) > budget:
+            scale *= 0.95
+        return scale, stride
+
+    def tile(self, image):
+        """Cut an image into a grid of patches without copying it.
+
+        Args:
+            image (torch.Tensor): Image of shape (channels, height, width).
+
+        Returns:
+            tuple: The patch grid, a view of shape (rows, columns, channels, patch_size, patch_size), the row and
+                column strides, and the scale factor the image was resized by.
+        """
+        _, height, width = image.shape
+        scale, stride = self.plan(height, width)
+        if scale < 1.0:
+            image = F.interpolate(image.unsqueeze(0), size=(round(height * scale), round(width * scale)), mode="bilinear",
+                                  antialias=True, align_corners=False).squeeze(0)
+            _, height, width = image.shape
+        if height < self.patch_size or width < self.patch_size:
+            # Pages smaller than a patch are padded with white, like the paper around them
+            image = F.pad(image, (0, max(0, self.patch_size - width), 0, max(0, self.patch_size - height)), value=1.)
+            _, height, width = image.shape
+        strides = []
+        for length in (height, width):
+            count = grid_size(length, self.patch_size, stride)
+            strides.append((length - self.patch_size) // (count - 1) if count > 1 else self.patch_size)
+        grid = image.unfold(1, self.patch_size, strides[0]).unfold(2, self.patch_size, strides[1]).permute(1, 2, 0, 3, 4)
+        return grid, strides, scale
+
+    def heatmap(self, scores, strides, height, width):
+        """Spread patch scores over a grid of cells, averaging where patches overlap.
+
+        Args:
+            scores (torch.Tensor): Patch scores of shape (rows, columns).
+            strides (list): Row and column strides of the patches.
+            height (int): Height of the area covered by the patches.
+            width (int): Width of the area covered by the patches.
+
+        Returns:
+            torch.Tensor: Heatmap of shape (ceil(height / HEATMAP_CELL), ceil(width / HEATMAP_CELL)).
+        """
+        cell = self.config.HEATMAP_CELL
+        coverage = []
+        for length, count, stride in zip((height, width), scores.shape, strides):
+            centres = (torch.arange(math.ceil(length / cell), dtype=scores.dtype) * cell + cell / 2).clamp(max=length - 1)
+            starts = torch.arange(count, dtype=scores.dtype) * stride
+            # (cells, patches): whether each patch covers the centre of each cell along this axis
+            coverage.append(((centres[:, None] >= starts) & (centres[:, None] < starts + self.patch_size)).to(scores.dtype))
+        rows, columns = coverage
+        totals = rows @ scores @ columns.T
+        counts = rows @ torch.ones_like(scores) @ columns.T
+        return totals / counts
+
+    def predict(self, image, score_batch):
+        """Score a document patch by patch.
+
+        Args:
+            image (torch.Tensor): Full-resolution image of shape (channels, height, width), values in [0, 1].
+            score_batch (callable): Takes a batch of patches of shape (batch_size, channels, patch_size, patch_size)
+                and returns one score per patch.
+
+        Returns:
+            dict: Document 'score', 'mean_score' of the patches, 'max_score', patch count, 'grid' shape, 'scale' the
+                page was resized by, 'heatmap_cell' size in original pixels and the 'heatmap' as nested lists.
+
+        Raises:
+            CustomException: If the image cannot be tiled. Errors of `score_batch` are raised unchanged, so callers
+                can handle their own failures (e.g. retry on another model).
+        """
+        try:
+            grid, strides, scale = self.tile(image)
+        except Exception as e:
+            error_message = str(e)
+            raise CustomException(error_message, sys)
+        rows, columns = grid.shape[:2]
+        count = rows * columns
+        index = torch.arange(count)
+        scores = torch.empty(count)
+        with torch.inference_mode():
+            for start in range(0, count, self.config.BATCH_SIZE):
+                batch_index = index[start:start + self.config.BATCH_SIZE]
+                # Advanced indexing gathers only this batch's patches into one contiguous tensor
+                patches = grid[batch_index // columns, batch_index % columns]
+                scores[start:start + len(batch_index)] = torch.as_tensor(score_batch(patches), dtype=torch.float32).view(-1).cpu()
+        scores = scores.view(rows, columns)
+        height = (rows - 1) * strides[0] + self.patch_size
+        width = (columns - 1) * strides[1] + self.patch_size
+        heatmap = self.heatmap(scores, strides, height, width)
+        document_score = scores.mean() if self.config.AGGREGATION == "mean" else scores.max()
+        return {
+            "score": document_score.item(),
+            "mean_score": scores.mean().item(),
+            "max_score": scores.max().item(),
+            "patches": count,
+            "grid": [rows, columns],
+            "scale": scale,
+            "heatmap_cell": self.config.HEATMAP_CELL / scale,
+            "heatmap": heatmap.tolist(),
+        }
@@ -0,0 +1,38 @@
+import argparse
+import itertools
+import json
+from dataclasses import replace
+from src.components.throughput_benchmark import BENCHMARK_STAGES, BenchmarkConfig, ThroughputBenchmark
+from src.logger import logging
+
+
+if __name__ == "__main__":
+    default = BenchmarkConfig()
+    parser = argparse.ArgumentParser(description="Measure the throughput of the training pipeline on a synthetic dataset. "
+                                                 "Worker counts, batch sizes and precisions accept several values; "
+                                                 "every combination is benchmarked.")
+    parser.add_argument("--stages", nargs="+", choices=BENCHMARK_STAGES, default=list(BENCHMARK_STAGES), help="Stages to run.")
+    parser.add_argument("--workers", nargs="+", type=int, default=[default.NUM_WORKERS], help="Data loading worker counts.")
+    parser.add_argument("--batch-size", nargs="+", type=int, default=[default.BATCH_SIZE], help="Batch sizes.")
+    parser.add_argument("--precision", nargs="+", choices=["fp32", "bf16"], default=[default.PRECISION], help="Model precisions.")
+    parser.add_argument("--batch-transform", nargs="+", choices=["on", "off"], default=["on" if default.BATCH_TRANSFORM else "off"],
+                        help="Resize at collation (on) or per sample (off).")
+    parser.add_argument("--num-images", type=int, default=default.NUM_IMAGES, help="Number of synthetic scans.")
+    parser.add_argument("--iterations", type=int, default=default.ITERATIONS, help="Timed batches per stage.")
+    parser.add_argument("--output", default=default.RESULTS_FILE, help="JSON lines file the results are appended to.")
+    args = parser.parse_args()
+
+    for num_workers, batch_size, precision, batch_transform in itertools.product(args.workers, args.batch_size, args.precision,
+                                                                                  args.batch_transform):
+        config = replace(default, NUM_WORKERS=num_workers, BATCH_SIZE=batch_size, PRECISION=precision,
+                         BATCH_TRANSFORM=batch_transform == "on", NUM_IMAGES=args.num_images, ITERATIONS=args.iterations,
+                         RESULTS_FILE=args.output)
+        logging.info(f"Benchmarking workers={num_workers} batch_size={batch_size} precision={precision} "
+                     f"batch_transform={batch_transform}")
+        benchmark = ThroughputBenchmark(config)
+        results = benchmark.run(args.stages)
+        benchmark.save(results)
+        for result in results:
+            print(json.dumps({key: result[key] for key in ("stage", "images_per_sec", "images", "seconds", "commit")}
+                             | {"workers": num_workers, "batch_size": batch_size, "precision": precision,
+                                "batch_transform": batch_transform}))
@@ -0,0 +1,33 @@
+import argparse
+import os
+import torch
+from src.components.bulk_scoring import BulkScorer, BulkScoringConfig
+from src.components.models_architecture import InceptBaseModel
+from src.utils import get_latest_best_model
+from src.logger import logging
+
+
+if __name__ == "__main__":
+    default = BulkScoringConfig()
+    parser = argparse.ArgumentParser(description="Score a directory or zip archive of documents offline. Results are "
+                                                 "written as they are computed; rerun the same command to continue an "
+                                                 "interrupted run.")
+    parser.add_argument("source", help="Directory or zip archive of JPEG/PNG documents.")
+    parser.add_argument("output", help="Output CSV file, or directory of Parquet parts when it ends with .parquet.")
+    parser.add_argument("--model", default=None, help="Model checkpoint, defaults to the promoted model of artifacts/model.")
+    parser.add_argument("--batch-size", type=int, default=default.BATCH_SIZE, help="Documents per forward pass.")
+    parser.add_argument("--decode-workers", type=int, default=default.DECODE_WORKERS, help="Threads decoding documents.")
+    parser.add_argument("--checkpoint-every", type=int, default=default.CHECKPOINT_EVERY, metavar="N",
+                        help="Save the progress every N batches.")
+    parser.add_argument("--progress-file", default=None, help="Progress checkpoint, defaults to <output>.progress.json.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the progress of an earlier run and score everything again.")
+    args = parser.parse_args()
+
+    model_path = args.model or get_latest_best_model(os.path.join(os.getcwd(), "artifacts", "model"))
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = InceptBaseModel.from_state_dict(torch.load(model_path, map_location="cpu")).to(device).eval()
+    logging.info(f"Scoring '{args.source}' with model '{model_path}' on {device}")
+    config = BulkScoringConfig(BATCH_SIZE=args.batch_size, DECODE_WORKERS=args.decode_workers,
+                               CHECKPOINT_EVERY=args.checkpoint_every)
+    scorer = BulkScorer(model, device, os.path.basename(model_path), config)
+    scorer.score(args.source, args.output, progress_file=args.progress_file, restart=args.restart)
@@ -0,0 +1,14 @@
+import os
+import torch
+from src.components.models_architecture import InceptBaseModel
+from src.components.model_export import ModelExporter
+from src.utils import get_latest_best_model
+from src.logger import logging
+
+
+if __name__ == "__main__":
+    model_path = get_latest_best_model(os.path.join(os.getcwd(), "artifacts", "model"))
+    model = InceptBaseModel.from_state_dict(torch.load(model_path, map_location="cpu"))
+    logging.info(f"Exporting model '{model_path}' to TorchScript...")
+    exporter = ModelExporter(model)
+    exporter.export()
@@ -0,0 +1,19 @@
+import os
+import torch
+from src.components.data_loader import DataLoadTransform
+from src.components.models_architecture import InceptBaseModel
+from src.components.model_quantization import ModelQuantizer
+from src.utils import get_latest_best_model
+from src.logger import logging
+
+
+if __name__ == "__main__":
+    data_loader = DataLoadTransform()
+    train_loader = data_loader.get_train_loader()
+    test_loader = data_loader.get_test_loader()
+    logging.info("Get data loader completed successfully.")
+    model_path = get_latest_best_model(os.path.join(os.getcwd(), "artifacts", "model"))
+    model = InceptBaseModel.from_state_dict(torch.load(model_path, map_location="cpu"))
+    logging.info(f"Quantizing model '{model_path}'...")
+    quantizer = ModelQuantizer(model, train_loader, test_loader)
+    quantizer.quantize_and_export()
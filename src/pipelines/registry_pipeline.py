@@ -0,0 +1,26 @@
+import argparse
+import json
+import os
+from src.components.model_registry import ModelRegistry
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the models of a registry, or promote one; a running app swaps to "
+                                                 "the promoted model without restarting.")
+    parser.add_argument("command", choices=["list", "promote", "register"])
+    parser.add_argument("version", nargs="?", help="Model to promote, or artifact file to register.")
+    parser.add_argument("--model-dir", default=os.path.join(os.getcwd(), "artifacts", "model"), help="Registry directory.")
+    parser.add_argument("--format", default="float", choices=["float", "int8", "torchscript"], help="Format of a registered model.")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.model_dir)
+    if args.command == "list":
+        for entry in registry.read()["models"]:
+            print(json.dumps(entry))
+    elif args.version is None:
+        parser.error(f"{args.command} needs a version")
+    elif args.command == "promote":
+        registry.promote(args.version)
+    else:
+        # Adopts artifacts written before the registry existed
+        registry.register(os.path.join(args.model_dir, os.path.basename(args.version)), model_format=args.format, promote=True)
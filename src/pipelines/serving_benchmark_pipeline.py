@@ -0,0 +1,34 @@
+import argparse
+import itertools
+import json
+from dataclasses import replace
+from src.components.serving_benchmark import ServingBenchmark, ServingBenchmarkConfig
+from src.logger import logging
+
+
+if __name__ == "__main__":
+    default = ServingBenchmarkConfig()
+    parser = argparse.ArgumentParser(description="Load test the inference service with an untrained model and synthetic documents. "
+                                                 "Worker and thread counts accept several values; every combination is started "
+                                                 "and loaded at each concurrency level.")
+    parser.add_argument("--workers", nargs="+", type=int, default=[1], help="uvicorn worker process counts.")
+    parser.add_argument("--threads", nargs="+", type=int, default=[None], help="Intra-op threads per worker (OMP_NUM_THREADS).")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=list(default.CONCURRENCY_LEVELS), help="Concurrent client counts.")
+    parser.add_argument("--duration", type=float, default=default.DURATION_SECONDS, help="Seconds per concurrency level.")
+    parser.add_argument("--env", nargs="*", default=[], metavar="KEY=VALUE",
+                        help="Extra service settings applied to every setup, e.g. PREDICT_MAX_BATCH_SIZE=32.")
+    parser.add_argument("--cache", action="store_true", help="Keep the prediction cache enabled.")
+    parser.add_argument("--output", default=default.RESULTS_FILE, help="JSON lines file the results are appended to.")
+    args = parser.parse_args()
+
+    env = dict(item.split("=", 1) for item in args.env)
+    config = replace(default, CONCURRENCY_LEVELS=tuple(args.concurrency), DURATION_SECONDS=args.duration,
+                     DISABLE_CACHE=not args.cache, RESULTS_FILE=args.output)
+    benchmark = ServingBenchmark(config)
+    for workers, threads in itertools.product(args.workers, args.threads):
+        logging.info(f"Load testing workers={workers} threads={threads}")
+        results = benchmark.run_setup(workers, threads, env)
+        benchmark.save(results)
+        for result in results:
+            print(json.dumps({key: result[key] for key in ("workers", "threads", "concurrency", "throughput_rps", "latency_p50_ms",
+                                                           "latency_p95_ms", "latency_p99_ms", "errors", "total_rss_bytes")}))
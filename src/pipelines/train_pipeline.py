@@ -1,37 +1,126 @@
 import os
+import argparse
+import itertools
 from src.components.data_ingestion import DataIngestion
 from src.components.data_loader import DataLoadTransform
 from src.logger import logging
-from src.components.models_architecture import InceptBaseModel
+from src.components.models_architecture import HeadConfig, InceptBaseModel
 from src.components.model_trainer import ModelTrainer
 import torch
 import torch.nn as nn
 from src.components.data_loader import DataConfig
+from src.components.feature_cache import FeatureCache
+from src.components.distributed import cleanup_distributed, init_distributed, main_process_first
+from src.components.checkpointing import CheckpointConfig, CheckpointManager
+
+def parse_hidden_sizes(value):
+    """Parse hidden layer widths such as '1024,32'; 'linear' is a head without hidden layers."""
+    return () if value == "linear" else tuple(int(size) for size in value.split(","))
+
 
 class ModelConfig:
     def __init__(self, model) -> None:
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        # torchrun gives every process on a GPU node its own device
+        self.device = torch.device("cuda", int(os.environ.get("LOCAL_RANK", 0))) if torch.cuda.is_available() else torch.device("cpu")
         self.batch_size = DataConfig().BATCH_SIZE
+        self.eval_batch_size = DataConfig().EVAL_BATCH_SIZE
         self.epochs = 5
         self.model = model
+        self.head_config = HeadConfig()
         self.save_model_path = os.path.join(os.getcwd(), "artifacts", "model")
         self.loss_fn = nn.BCELoss()
-        self.optimizer = torch.optim.Adam(self.model.parameters(), lr=0.0001)
+        self.optimizer = torch.optim.Adam(self.model.parameters(), lr=self.head_config.LEARNING_RATE)
+        self.precision = "fp32"
+        self.channels_last = False
+        self.compile_model = False
+        self.fast_path_tolerance = 0.05
+        self.time_stages = False
+        self.log_interval = 10
+        checkpoint_config = CheckpointConfig()
+        self.checkpoint_dir = checkpoint_config.CHECKPOINT_DIR
+        self.keep_checkpoints = checkpoint_config.KEEP_LAST
+        self.checkpoint_every = checkpoint_config.EVERY_N_BATCHES
 
 
 
 if __name__ == "__main__":
-    data_ingestion = DataIngestion()
-    data_ingestion.initiate_data_ingestion()
+    parser = argparse.ArgumentParser(description="Train the frogery detection model.")
+    parser.add_argument("--head-only", action="store_true",
+                        help="Run the frozen backbone once per image, cache its features and train only the classifier head.")
+    parser.add_argument("--precision", choices=["fp32", "bf16"], default="fp32",
+                        help="Numeric precision of the forward pass; bf16 uses autocast.")
+    parser.add_argument("--channels-last", action="store_true", help="Use the channels_last memory format for inputs and weights.")
+    parser.add_argument("--compile", action="store_true", help="Train a torch.compile'd model, falling back to eager if compilation fails.")
+    parser.add_argument("--time-stages", action="store_true",
+                        help="Time data wait, transfer, forward, backward and optimizer stages and log their share of every epoch.")
+    parser.add_argument("--log-interval", type=int, default=10,
+                        help="Log the training loss every N batches; the loss is only read back from the device then.")
+    parser.add_argument("--resume", nargs="?", const="latest", default=None, metavar="CHECKPOINT",
+                        help="Continue an interrupted run from a checkpoint, by default the latest one of the run that checkpointed last.")
+    parser.add_argument("--checkpoint-every", type=int, default=None, metavar="N",
+                        help="Also checkpoint every N batches within an epoch (default: only at epoch ends).")
+    parser.add_argument("--keep-checkpoints", type=int, default=None, metavar="N",
+                        help="Number of most recent checkpoints kept besides the best one.")
+    parser.add_argument("--sweep", action="store_true",
+                        help="Train one head per combination of the --sweep-* values on a shared backbone pass and keep the best.")
+    parser.add_argument("--sweep-hidden", type=parse_hidden_sizes, nargs="+", default=None, metavar="SIZES",
+                        help="Hidden layer widths of the swept heads, e.g. 1024,32 512 linear.")
+    parser.add_argument("--sweep-dropout", type=float, nargs="+", default=None, help="Dropout of the swept heads.")
+    parser.add_argument("--sweep-lr", type=float, nargs="+", default=None, help="Learning rates of the swept heads.")
+    args = parser.parse_args()
+    if args.sweep and args.resume:
+        parser.error("--resume does not apply to --sweep, sweeps are not checkpointed")
+
+    # Started with torchrun, every process trains on its own shard of the data (gloo backend, CPU friendly)
+    init_distributed("gloo")
+    # Downloads, extraction, pretrained weights and feature caches are fetched or built once, by rank 0
+    with main_process_first():
+        data_ingestion = DataIngestion()
+        data_ingestion.initiate_data_ingestion()
+        model = InceptBaseModel()
     data_loader = DataLoadTransform()
-    train_loader = data_loader.get_train_loader()
-    test_loader = data_loader.get_test_loader()
-    logging.info("Get data loader completed successfully.")
-    model = InceptBaseModel()
     model_config = ModelConfig(model)
+    model_config.precision = args.precision
+    model_config.channels_last = args.channels_last
+    model_config.compile_model = args.compile
+    model_config.time_stages = args.time_stages
+    model_config.log_interval = args.log_interval
+    if args.checkpoint_every is not None:
+        model_config.checkpoint_every = args.checkpoint_every
+    if args.keep_checkpoints is not None:
+        model_config.keep_checkpoints = args.keep_checkpoints
+    checkpoint_manager = CheckpointManager(model_config.checkpoint_dir, model_config.keep_checkpoints)
+    resume_from = checkpoint_manager.latest_checkpoint() if args.resume == "latest" else args.resume
+    if args.resume and resume_from is None:
+        logging.info(f"No checkpoint in '{model_config.checkpoint_dir}', starting a new run.")
+    model.to(model_config.device)
     logging.info("Model configuration completed successfully.")
-    model_trainer = ModelTrainer(model, train_loader, test_loader, model_config.loss_fn, model_config.optimizer, model_config.device, model_config.batch_size)
-    logging.info("Starting model training...")
-    model_trainer.train_model(model_config.epochs, model_config.save_model_path)
+    if args.head_only:
+        feature_cache = FeatureCache(data_loader, model, model_config.device)
+        with main_process_first():
+            train_loader = feature_cache.get_train_loader(model_config.batch_size)
+            test_loader = feature_cache.get_test_loader(model_config.eval_batch_size)
+    else:
+        with main_process_first():
+            train_loader = data_loader.get_train_loader()
+            test_loader = data_loader.get_test_loader()
+    logging.info("Get data loader completed successfully.")
+    model_trainer = ModelTrainer(model, train_loader, test_loader, model_config.loss_fn, model_config.optimizer, model_config.device, model_config.batch_size, head_only=args.head_only,
+                                 precision=model_config.precision, channels_last=model_config.channels_last,
+                                 compile_model=model_config.compile_model, fast_path_tolerance=model_config.fast_path_tolerance,
+                                 time_stages=model_config.time_stages, log_interval=model_config.log_interval,
+                                 checkpoint_manager=checkpoint_manager, checkpoint_every=model_config.checkpoint_every)
+    if args.sweep:
+        default_head = model_config.head_config
+        head_configs = [HeadConfig(HIDDEN_SIZES=hidden, DROPOUT=dropout, LEARNING_RATE=lr) for hidden, dropout, lr in itertools.product(
+            args.sweep_hidden or [default_head.HIDDEN_SIZES], args.sweep_dropout or [default_head.DROPOUT],
+            args.sweep_lr or [default_head.LEARNING_RATE])]
+        logging.info(f"Sweeping {len(head_configs)} heads...")
+        model_trainer.sweep_heads(head_configs, model_config.epochs, model_config.save_model_path)
+    else:
+        logging.info("Starting model training...")
+        model_trainer.train_model(model_config.epochs, model_config.save_model_path, resume_from=resume_from)
+    checkpoint_manager.close()
+    cleanup_distributed()
 
     
\ No newline at end of file
@@ -1,26 +1,65 @@
-from zipfile import ZipFile
+from zipfile import ZipFile, ZipInfo
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from fnmatch import fnmatch
+from typing import List, Optional, Sequence, Tuple
 from src.logger import logging
 from src.exception import CustomException
+from src.components.model_registry import ModelRegistry
 import os
+import hashlib
+import json
+import queue
+import threading
+import zlib
 import paramiko
 import sys
 
-def download_file_sftp(hostname:str, username:str, password:str, remote_file_path:str, local_file_path:str) -> None:
+def _read_remote_digest(sftp: paramiko.SFTPClient, remote_file_path: str) -> Optional[str]:
+    """
+    Reads the SHA-256 digest published next to a remote file as '<file>.sha256', if there is one.
+    """
+    try:
+        with sftp.open(remote_file_path + ".sha256", "r") as f:
+            return f.read().decode().split()[0].lower()
+    except (IOError, IndexError):
+        return None
+
+def _write_json_atomic(file_path: str, data: dict) -> None:
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, file_path)
+
+def download_file_sftp(hostname:str, username:str, password:str, remote_file_path:str, local_file_path:str,
+                       num_connections:int = 4, chunk_size:int = 32 * 1024 * 1024, expected_sha256:Optional[str] = None,
+                       port:int = 22) -> None:
     """
     Downloads a file from an SFTP server to the local file system.
 
+    The file is split into byte ranges of `chunk_size` that are fetched concurrently over `num_connections` SFTP
+    channels of one SSH connection and written in place into '<local_file_path>.part'. Completed ranges are recorded
+    in the sidecar state file '<local_file_path>.part.json', so an interrupted download resumes with the missing
+    ranges only. The result is verified against `expected_sha256`, or against the digest published on the server as
+    '<remote_file_path>.sha256' when there is one, and its digest is written to '<local_file_path>.sha256'.
+    A local file that already matches the remote size and digest is not downloaded again.
+
     Args:
         hostname : The hostname or IP address of the SFTP server.
         username : The username for authentication.
         password : The password for authentication.
         remote_file_path : The path of the file on the SFTP server.
         local_file_path : The path where the file will be downloaded locally.
+        num_connections : The number of SFTP channels fetching ranges at the same time.
+        chunk_size : The size in bytes of the ranges the file is split into.
+        expected_sha256 : The expected SHA-256 hex digest of the file.
+        port : The port of the SFTP server.
     Returns:
         None
     Raises:
-        CustomException: If any error occurs during the download process.
+        CustomException: If any error occurs during the download process or the checksum does not match.
 
     """
+    client = None
     try:
         # Create an SSH client
         client = paramiko.SSHClient()
@@ -29,55 +68,194 @@ def download_file_sftp(hostname:str, username:str, password:str, remote_file_pat
         client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
         # Connect to the SFTP server
-        client.connect(hostname, username=username, password=password)
+        client.connect(hostname, port=port, username=username, password=password)
+        transport = client.get_transport()
+
+        with client.open_sftp() as sftp:
+            remote_size = sftp.stat(remote_file_path).st_size
+            expected_sha256 = (expected_sha256 or _read_remote_digest(sftp, remote_file_path) or "").lower() or None
+
+        digest_path = local_file_path + ".sha256"
+        if os.path.exists(local_file_path) and os.path.getsize(local_file_path) == remote_size and os.path.exists(digest_path):
+            with open(digest_path) as f:
+                local_digest = f.read().strip()
+            if expected_sha256 is None or local_digest == expected_sha256:
+                logging.info(f"File '{local_file_path}' is already downloaded, skipping.")
+                return
 
-        # Create an SFTP client from the SSH client
-        sftp = client.open_sftp()
+        part_path = local_file_path + ".part"
+        state_path = local_file_path + ".part.json"
+        state = {"remote_file_path": remote_file_path, "size": remote_size, "chunk_size": chunk_size, "done": []}
+        if os.path.exists(state_path) and os.path.exists(part_path):
+            with open(state_path) as f:
+                previous_state = json.load(f)
+            if all(previous_state.get(key) == state[key] for key in ("remote_file_path", "size", "chunk_size")):
+                state = previous_state
+        if not state["done"]:
+            with open(part_path, "wb") as f:
+                f.truncate(remote_size)
+        _write_json_atomic(state_path, state)
 
-        # Download the file
-        sftp.get(remote_file_path, local_file_path)
+        done = set(state["done"])
+        ranges = queue.Queue()
+        for offset in range(0, remote_size, chunk_size):
+            if offset not in done:
+                ranges.put((offset, min(chunk_size, remote_size - offset)))
+        logging.info(f"Downloading '{remote_file_path}': {ranges.qsize()} of {-(-remote_size // chunk_size)} ranges left, "
+                     f"{num_connections} connections")
+        state_lock = threading.Lock()
+        block_size = 1024 * 1024
 
-        logging.info(f"File '{remote_file_path}' downloaded successfully.")
+        def fetch_ranges():
+            with paramiko.SFTPClient.from_transport(transport) as channel, channel.open(remote_file_path, "rb") as remote_file:
+                fd = os.open(part_path, os.O_WRONLY)
+                try:
+                    while True:
+                        try:
+                            offset, length = ranges.get_nowait()
+                        except queue.Empty:
+                            return
+                        blocks = [(start, min(block_size, offset + length - start)) for start in range(offset, offset + length, block_size)]
+                        for (start, _), data in zip(blocks, remote_file.readv(blocks)):
+                            os.pwrite(fd, data, start)
+                        os.fsync(fd)
+                        with state_lock:
+                            state["done"].append(offset)
+                            _write_json_atomic(state_path, state)
+                finally:
+                    os.close(fd)
+
+        with ThreadPoolExecutor(max_workers=num_connections) as executor:
+            for future in [executor.submit(fetch_ranges) for _ in range(num_connections)]:
+                future.result()
+
+        local_digest = file_digest(part_path)
+        if expected_sha256 is not None and local_digest != expected_sha256:
+            os.remove(part_path)
+            os.remove(state_path)
+            raise ValueError(f"Checksum mismatch for '{remote_file_path}': expected {expected_sha256}, got {local_digest}")
+        os.replace(part_path, local_file_path)
+        with open(digest_path, "w") as f:
+            f.write(local_digest)
+        os.remove(state_path)
+
+        logging.info(f"File '{remote_file_path}' downloaded successfully (sha256 {local_digest}).")
 
     except Exception as e:
         error_message = str(e)
         raise CustomException(error_message, sys)
     finally:
-        # Close the SFTP session and the SSH connection
-        sftp.close()
-        client.close()
+        # Close the SSH connection and its SFTP channels
+        if client is not None:
+            client.close()
+
+def _is_extracted(info: ZipInfo, destination_path: str) -> bool:
+    """
+    Checks whether a ZIP member already exists at its destination with the same size and CRC-32.
+    """
+    target_path = os.path.join(destination_path, info.filename)
+    if not os.path.isfile(target_path) or os.path.getsize(target_path) != info.file_size:
+        return False
+    crc = 0
+    with open(target_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc == info.CRC
+
+def _extract_members(file_path: str, destination_path: str, names: List[str]) -> Tuple[int, int]:
+    """
+    Extracts the given members of a ZIP file, skipping those already extracted. Runs in a worker process.
+    """
+    extracted, skipped = 0, 0
+    with ZipFile(file_path, 'r') as zip_file:
+        for name in names:
+            info = zip_file.getinfo(name)
+            if _is_extracted(info, destination_path):
+                skipped += 1
+            else:
+                zip_file.extract(info, destination_path)
+                extracted += 1
+    return extracted, skipped
 
-def unzip_file(file_path: str, destination_path:str ) -> None:
+def unzip_file(file_path: str, destination_path:str, include: Optional[Sequence[str]] = None, num_workers: int = 1,
+               remove_archive: bool = True) -> None:
     """
     Unzips a ZIP file to the specified destination path.
 
+    Members can be restricted to those matching `include` glob patterns, and are extracted by `num_workers`
+    processes in parallel. Members that already exist at the destination with the same size and CRC-32 are skipped,
+    so unzipping the same archive again is nearly free.
+
     Args:
         file_path (str): The path of the ZIP file to be extracted.
         destination_path (str): The path where the contents of the ZIP file will be extracted.
+        include (Sequence[str], optional): `fnmatch` patterns of the member names to extract. All members by default.
+        num_workers (int): The number of extraction processes.
+        remove_archive (bool): Whether to delete the ZIP file once it is extracted.
     Returns:
         None
 
     """
     with ZipFile(file_path, 'r') as zip_file:
-        zip_file.extractall(destination_path)
+        members = [info for info in zip_file.infolist() if not info.is_dir()]
+    if include is not None:
+        members = [info for info in members if any(fnmatch(info.filename, pattern) for pattern in include)]
+
+    # Spread the members over the workers by size, largest first, so every worker gets a similar amount of work
+    members.sort(key=lambda info: info.compress_size, reverse=True)
+    num_workers = max(1, min(num_workers, len(members)))
+    shares = [[info.filename for info in members[i::num_workers]] for i in range(num_workers)]
+    if num_workers == 1:
+        counts = [_extract_members(file_path, destination_path, shares[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            counts = list(executor.map(_extract_members, [file_path] * num_workers, [destination_path] * num_workers, shares))
+
+    if remove_archive:
         os.remove(file_path)
-    logging.info(f"File '{file_path}' unzipped successfully.")
+    extracted, skipped = sum(count[0] for count in counts), sum(count[1] for count in counts)
+    logging.info(f"File '{file_path}' unzipped successfully ({extracted} members extracted, {skipped} already up to date).")
+
+def file_digest(file_path: str, algorithm: str = "sha256", chunk_size: int = 1 << 20) -> str:
+    """
+    Computes the hex digest of a file without loading it into memory at once.
+
+    Args:
+        file_path: The path of the file to hash.
+        algorithm: The name of a `hashlib` algorithm.
+        chunk_size: The number of bytes read per iteration.
+
+    Returns:
+        The hex digest of the file contents.
+    """
+    digest = hashlib.new(algorithm)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
 def get_latest_best_model(model_path: str) -> str:
     """
-    Retrieves the path of the latest best model file in the specified directory.
+    Retrieves the path of the current model in the specified directory.
+
+    The model promoted in the directory's registry manifest is returned. Without a manifest, the most recently
+    modified model file is returned; reports, manifests and hidden temporary files are skipped.
 
     Args:
         model_path: The path to the directory containing the model files.
 
     Returns:
-        The path of the latest best model file.
+        The path of the current model file, or None if there is none.
     """
-    model_files = [file for file in os.listdir(model_path) if not file.endswith('.txt')]
-    model_files.sort(reverse=True)
+    registry = ModelRegistry(model_path)
+    if registry.exists():
+        current_path = registry.current_path()
+        if current_path is not None:
+            return current_path
+    model_files = [os.path.join(model_path, file) for file in os.listdir(model_path)
+                   if not file.startswith('.') and not file.endswith(('.txt', '.json'))] if os.path.isdir(model_path) else []
     if model_files:
-        model_path = os.path.join(model_path, model_files[0])
-        return model_path
+        return max(model_files, key=os.path.getmtime)
     else:
-        print("No model files found in the directory.")
-        return None
\ No newline at end of file
+        logging.info(f"No model files found in '{model_path}'.")
+        return None
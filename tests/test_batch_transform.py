@@ -0,0 +1,45 @@
+import pytest
+import torch
+from src.components.data_loader import DataConfig, DataLoadTransform
+from src.components.throughput_benchmark import generate_synthetic_dataset
+
+TRAINING_SIZE = (DataConfig().DATA_RESIZE, DataConfig().DATA_RESIZE)
+
+# Largest mean and max absolute pixel differences (in [0, 1] units) allowed between the batches of the per-sample
+# Rescale + ToTensor path and of ResizeCollate (BATCH_TRANSFORM). Measured on these scans: A4 at 300 dpi
+# 0.012 / 0.048, 1200 x 900 0.0056 / 0.071, upscaled 200 x 150 0.00006 / 0.027. Both are antialiased resizes,
+# skimage's Gaussian prefilter and torch's triangle filter widened by the scale, so they differ at sharp edges only.
+BATCH_TRANSFORM_TOLERANCE = (0.02, 0.1)
+# Scans already at the training size are only converted, identically up to float32 rounding
+SAME_SIZE_TOLERANCE = (1e-6, 1e-6)
+
+
+def _batches(tmp_path, image_size, num_images=3):
+    xml_file_path, image_dir = generate_synthetic_dataset(str(tmp_path), num_images, image_size)
+    batches = {}
+    for batch_transform in (False, True):
+        config = DataConfig(TRAIN_DATA_XML_FILE=xml_file_path, TRAIN_DATA_IMAGE_DIR=image_dir, NUM_WORKERS=0,
+                            BATCH_TRANSFORM=batch_transform)
+        data_loader = DataLoadTransform(config)
+        loader = data_loader.make_loader(data_loader.get_train_dataset(), shuffle=False, distributed=False)
+        batches[batch_transform] = next(iter(loader))
+    return batches[False], batches[True]
+
+
+def _assert_close(baseline, batched, tolerance):
+    assert batched['image'].shape == baseline['image'].shape == (len(baseline['label']), 3) + TRAINING_SIZE
+    assert batched['image'].dtype == baseline['image'].dtype == torch.float32
+    assert torch.equal(batched['label'], baseline['label'])
+    diff = (batched['image'].double() - baseline['image'].double()).abs()
+    mean_tolerance, max_tolerance = tolerance
+    assert diff.mean() < mean_tolerance
+    assert diff.max() < max_tolerance
+
+
+@pytest.mark.parametrize("image_size", [(3508, 2480), (1200, 900), (200, 150)])
+def test_resize_collate_matches_per_sample_transform(tmp_path, image_size):
+    _assert_close(*_batches(tmp_path, image_size), BATCH_TRANSFORM_TOLERANCE)
+
+
+def test_resize_collate_converts_training_size_scans_exactly(tmp_path):
+    _assert_close(*_batches(tmp_path, TRAINING_SIZE), SAME_SIZE_TOLERANCE)
@@ -0,0 +1,65 @@
+import glob
+import os
+import numpy as np
+import pytest
+from src.components.data_loader import DataConfig
+from src.components.image_io import INPUT_SIZE, load_image, open_image, serving_transform
+from src.components.image_transformers import Rescale, ResizeCollate
+from src.components.throughput_benchmark import generate_synthetic_dataset
+
+# A4 scans at 300 dpi, which JPEG draft decoding reads at 1/4 of their resolution for the model input sizes
+SCAN_SIZE = (3508, 2480)
+TRAINING_SIZE = (DataConfig().DATA_RESIZE, DataConfig().DATA_RESIZE)
+
+# Largest mean and max absolute pixel differences (in [0, 1] units) allowed between the model inputs of a full
+# decode and of a draft decode. Measured on these scans: Rescale 0.031 / 0.19, ResizeCollate 0.0053 / 0.043,
+# serving 0.0027 / 0.020. Rescale (skimage) differs the most because its anti-aliasing filter is sized from the
+# resize ratio, which the draft decode changes.
+RESCALE_TOLERANCE = (0.04, 0.25)
+COLLATE_TOLERANCE = (0.01, 0.06)
+SERVING_TOLERANCE = (0.005, 0.03)
+
+
+@pytest.fixture(scope="module")
+def scans(tmp_path_factory):
+    _, image_dir = generate_synthetic_dataset(str(tmp_path_factory.mktemp("scans")), 2, SCAN_SIZE)
+    return sorted(glob.glob(os.path.join(image_dir, "*.jpg")))
+
+
+def _assert_close(full, reduced, tolerance):
+    diff = np.abs(np.asarray(full, dtype=np.float64) - np.asarray(reduced, dtype=np.float64))
+    mean_tolerance, max_tolerance = tolerance
+    assert diff.mean() < mean_tolerance
+    assert diff.max() < max_tolerance
+
+
+def test_draft_decode_reduces_resolution(scans):
+    for scan in scans:
+        full, reduced = load_image(scan), load_image(scan, TRAINING_SIZE)
+        assert full.shape == SCAN_SIZE + (3,)
+        assert reduced.shape[0] < full.shape[0] // 2
+        assert min(reduced.shape[:2]) >= 2 * min(TRAINING_SIZE)
+
+
+def test_training_rescale_parity(scans):
+    rescale = Rescale(TRAINING_SIZE)
+    for scan in scans:
+        full = rescale({'image': load_image(scan), 'label': 0})['image']
+        reduced = rescale({'image': load_image(scan, TRAINING_SIZE), 'label': 0})['image']
+        _assert_close(full, reduced, RESCALE_TOLERANCE)
+
+
+def test_training_collate_parity(scans):
+    collate = ResizeCollate(TRAINING_SIZE)
+    for scan in scans:
+        full = collate([{'image': load_image(scan), 'label': 0}])['image']
+        reduced = collate([{'image': load_image(scan, TRAINING_SIZE), 'label': 0}])['image']
+        _assert_close(full, reduced, COLLATE_TOLERANCE)
+
+
+def test_serving_parity(scans):
+    transform = serving_transform(INPUT_SIZE)
+    for scan in scans:
+        full = transform(open_image(scan))
+        reduced = transform(open_image(scan, INPUT_SIZE))
+        _assert_close(full, reduced, SERVING_TOLERANCE)
@@ -0,0 +1,119 @@
+from datetime import timedelta
+import glob
+import json
+import os
+import socket
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.nn as nn
+from torch.utils.data import Dataset
+from torchvision.models.inception import InceptionOutputs
+from src.components.checkpointing import CheckpointManager
+from src.components.data_loader import DataConfig, DataLoadTransform
+from src.components.distributed import all_gather_object
+from src.components.model_trainer import ModelTrainer
+
+WORLD_SIZE = 2
+NUM_SAMPLES = 20
+BATCH_SIZE = 2
+# Positives are the first samples; with the shuffling of seed 0 the ranks see different numbers of them early on
+POSITIVES = 5
+
+
+class _Samples(Dataset):
+    def __len__(self):
+        return NUM_SAMPLES
+
+    def __getitem__(self, idx):
+        return {'image': torch.full((3, 4, 4), float(idx)), 'label': torch.tensor([float(idx < POSITIVES)])}
+
+
+class _ConstantModel(nn.Module):
+    """Predicts 'modified' for every image and, trained with a learning rate of 0, keeps doing so."""
+    def __init__(self):
+        super().__init__()
+        self.fc = nn.Sequential(nn.Flatten(), nn.Linear(48, 1), nn.Sigmoid())
+        nn.init.zeros_(self.fc[1].weight)
+        nn.init.constant_(self.fc[1].bias, 10.)
+
+    def forward(self, inputs):
+        outputs = self.fc(inputs)
+        return InceptionOutputs(outputs, None) if self.training else outputs
+
+
+def _train(data_loader, checkpoint_dir, save_model_path, resume_from=None):
+    model = _ConstantModel()
+    manager = CheckpointManager(checkpoint_dir, keep_last=NUM_SAMPLES)
+    trainer = ModelTrainer(model, data_loader.make_loader(_Samples(), shuffle=True),
+                           data_loader.make_loader(_Samples(), shuffle=False), nn.BCELoss(),
+                           torch.optim.Adam(model.parameters(), lr=0.), torch.device('cpu'), BATCH_SIZE,
+                           checkpoint_manager=manager, checkpoint_every=1)
+    trainer.train_model(1, save_model_path, resume_from=resume_from)
+    manager.close()
+    dist.barrier()
+    return trainer
+
+
+def _report_accuracy(save_model_path):
+    report_file, = glob.glob(os.path.join(save_model_path, 'report_*.txt'))
+    with open(report_file) as f:
+        return float(f.read().split('Accuracy train ')[1].split()[0])
+
+
+def _worker(rank, port, root):
+    os.environ.update(MASTER_ADDR='127.0.0.1', MASTER_PORT=str(port))
+    # A rank left waiting in a collective fails after the timeout instead of hanging the test
+    dist.init_process_group('gloo', rank=rank, world_size=WORLD_SIZE, timeout=timedelta(seconds=60))
+    try:
+        data_loader = DataLoadTransform(DataConfig(BATCH_SIZE=BATCH_SIZE, EVAL_BATCH_SIZE=BATCH_SIZE, NUM_WORKERS=0,
+                                                   PIN_MEMORY=False, BATCH_TRANSFORM=False))
+        sampler = data_loader.make_loader(_Samples(), shuffle=True).sampler
+        sampler.set_epoch(0)
+        shard = list(sampler)
+        sampler.set_start(3)
+        resumed_shard = list(sampler)
+
+        trainer = _train(data_loader, os.path.join(root, 'checkpoints'), os.path.join(root, 'model'))
+        run_dir = trainer.checkpoint_manager.run_dir()
+        mid_epoch = os.path.join(run_dir, 'checkpoint_e0000_b000002.pt')
+        _train(data_loader, os.path.join(root, 'resumed_checkpoints'), os.path.join(root, 'resumed_model'), mid_epoch)
+
+        shards = all_gather_object(shard)
+        if rank == 0:
+            with open(os.path.join(root, 'results.json'), 'w') as f:
+                json.dump({'shards': shards, 'shard': shard, 'resumed_shard': resumed_shard,
+                           'progress': CheckpointManager.load(mid_epoch)['progress'],
+                           'accuracy': _report_accuracy(os.path.join(root, 'model')),
+                           'resumed_accuracy': _report_accuracy(os.path.join(root, 'resumed_model'))}, f)
+    finally:
+        # Ranks leave together, but the process group is not destroyed: gloo's teardown can hang one rank forever
+        dist.barrier()
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_two_rank_training_shards_data_and_sums_progress(tmp_path):
+    mp.spawn(_worker, args=(_free_port(), str(tmp_path)), nprocs=WORLD_SIZE)
+    with open(tmp_path / 'results.json') as f:
+        results = json.load(f)
+
+    # Every rank trains on its own half of the samples
+    shards = results['shards']
+    assert all(len(shard) == NUM_SAMPLES // WORLD_SIZE for shard in shards)
+    assert sorted(shards[0] + shards[1]) == list(range(NUM_SAMPLES))
+    assert results['resumed_shard'] == results['shard'][3:]
+
+    # The mid-epoch checkpoint after 2 batches counts the samples of both ranks
+    correct = [sum(idx < POSITIVES for idx in shard[:2 * BATCH_SIZE]) for shard in shards]
+    assert correct[0] != correct[1]
+    assert results['progress']['images'] == WORLD_SIZE * 2 * BATCH_SIZE
+    assert results['progress']['correct'] == sum(correct)
+
+    # Resuming from it gives the accuracy of the uninterrupted epoch over the whole dataset
+    assert results['accuracy'] == 100 * POSITIVES / NUM_SAMPLES
+    assert results['resumed_accuracy'] == results['accuracy']
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import socket
+import threading
+import paramiko
+import pytest
+from paramiko import SFTPAttributes, SFTPHandle, SFTPServer, SFTPServerInterface
+from src.exception import CustomException
+from src.utils import download_file_sftp
+
+CHUNK_SIZE = 64 * 1024
+FILE_SIZE = 5 * CHUNK_SIZE + 123
+
+
+class _Server(paramiko.ServerInterface):
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL if password == "secret" else paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+
+def _sftp_interface(root, reads):
+    """SFTP server interface serving the files of `root` read-only, recording the (offset, length) of every read."""
+    class Handle(SFTPHandle):
+        def stat(self):
+            return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+        def read(self, offset, length):
+            reads.append((offset, length))
+            return super().read(offset, length)
+
+    class Interface(SFTPServerInterface):
+        def __path(self, path):
+            return os.path.join(root, path.lstrip("/"))
+
+        def stat(self, path):
+            try:
+                return SFTPAttributes.from_stat(os.stat(self.__path(path)))
+            except OSError as e:
+                return SFTPServer.convert_errno(e.errno)
+
+        lstat = stat
+
+        def open(self, path, flags, attr):
+            try:
+                readfile = open(self.__path(path), "rb")
+            except OSError as e:
+                return SFTPServer.convert_errno(e.errno)
+            handle = Handle(flags)
+            handle.readfile = readfile
+            handle.filename = path
+            return handle
+
+    return Interface
+
+
+@pytest.fixture
+def sftp_server(tmp_path):
+    """A local SFTP server on a free port; yields its port, served directory and the reads it answered."""
+    root = tmp_path / "remote"
+    root.mkdir()
+    reads = []
+    host_key = paramiko.RSAKey.generate(2048)
+    server_socket = socket.socket()
+    server_socket.bind(("127.0.0.1", 0))
+    server_socket.listen(8)
+    transports = []
+
+    def accept():
+        while True:
+            try:
+                connection, _ = server_socket.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(connection)
+            transport.add_server_key(host_key)
+            transport.set_subsystem_handler("sftp", SFTPServer, _sftp_interface(str(root), reads))
+            transport.start_server(server=_Server())
+            transports.append(transport)
+
+    threading.Thread(target=accept, daemon=True).start()
+    yield server_socket.getsockname()[1], root, reads
+    server_socket.close()
+    for transport in transports:
+        transport.close()
+
+
+@pytest.fixture
+def remote_file(sftp_server):
+    """A random file on the server; yields its contents and SHA-256 digest."""
+    _, root, _ = sftp_server
+    data = os.urandom(FILE_SIZE)
+    (root / "data.zip").write_bytes(data)
+    return data, hashlib.sha256(data).hexdigest()
+
+
+def _download(port, local_file, **kwargs):
+    download_file_sftp("127.0.0.1", "user", "secret", "/data.zip", str(local_file), num_connections=3,
+                       chunk_size=CHUNK_SIZE, port=port, **kwargs)
+
+
+def test_download_fetches_every_range(sftp_server, remote_file, tmp_path):
+    port, _, reads = sftp_server
+    data, digest = remote_file
+    local_file = tmp_path / "data.zip"
+
+    _download(port, local_file, expected_sha256=digest)
+
+    assert local_file.read_bytes() == data
+    assert (tmp_path / "data.zip.sha256").read_text() == digest
+    assert not (tmp_path / "data.zip.part").exists()
+    assert not (tmp_path / "data.zip.part.json").exists()
+    assert sum(length for _, length in reads) >= FILE_SIZE
+
+
+def test_download_skips_complete_file(sftp_server, remote_file, tmp_path):
+    port, _, reads = sftp_server
+    data, digest = remote_file
+    local_file = tmp_path / "data.zip"
+    _download(port, local_file, expected_sha256=digest)
+    reads.clear()
+    modified = os.stat(local_file).st_mtime_ns
+
+    _download(port, local_file, expected_sha256=digest)
+
+    assert reads == []
+    assert os.stat(local_file).st_mtime_ns == modified
+    assert local_file.read_bytes() == data
+
+
+def test_download_resumes_partial_file(sftp_server, remote_file, tmp_path):
+    port, _, reads = sftp_server
+    data, digest = remote_file
+    local_file = tmp_path / "data.zip"
+    # An interrupted download: the first two ranges are on disk and recorded in the sidecar, the rest is missing
+    done = [0, CHUNK_SIZE]
+    part = bytearray(FILE_SIZE)
+    part[:2 * CHUNK_SIZE] = data[:2 * CHUNK_SIZE]
+    (tmp_path / "data.zip.part").write_bytes(bytes(part))
+    (tmp_path / "data.zip.part.json").write_text(json.dumps(
+        {"remote_file_path": "/data.zip", "size": FILE_SIZE, "chunk_size": CHUNK_SIZE, "done": done}))
+
+    _download(port, local_file, expected_sha256=digest)
+
+    assert local_file.read_bytes() == data
+    assert reads and min(offset for offset, _ in reads) >= 2 * CHUNK_SIZE
+    assert sum(length for _, length in reads) >= FILE_SIZE - 2 * CHUNK_SIZE
+    assert not (tmp_path / "data.zip.part.json").exists()
+
+
+def test_download_checksum_mismatch_raises(sftp_server, remote_file, tmp_path):
+    port, _, _ = sftp_server
+    local_file = tmp_path / "data.zip"
+
+    with pytest.raises(CustomException, match="Checksum mismatch"):
+        _download(port, local_file, expected_sha256="0" * 64)
+
+    assert not local_file.exists()
+    assert not (tmp_path / "data.zip.sha256").exists()
+    assert not (tmp_path / "data.zip.part").exists()
+    assert not (tmp_path / "data.zip.part.json").exists()